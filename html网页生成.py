@@ -10,9 +10,18 @@ def generate_html_report(nickname, image_base64_dict, series_sections, output_pa
     参数：
     nickname: str - 用户昵称
     image_base64_dict: str - 包含图片base64的字典
-    series_sections: list of tuples - 分段数据列表，格式为 (段落标题, pd.Series)
+    series_sections: list of tuples - 分段数据列表，格式为 (段落标题, pd.Series或pd.DataFrame)
     output_path: str - 生成的HTML文件保存路径
     """
+    html_template = render_html_report(nickname, image_base64_dict, series_sections)
+
+    # 保存HTML文件
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(html_template)
+
+
+def render_html_report(nickname, image_base64_dict, series_sections):
+    """生成数据分析报告的HTML字符串，参数同generate_html_report"""
     buttons = []
     # 修改图片处理逻辑，读取图片并转换为base64
     for desc, image_base64 in image_base64_dict.items():
@@ -44,7 +53,11 @@ def generate_html_report(nickname, image_base64_dict, series_sections, output_pa
     stats_sections = []
     for section_title, series_data in series_sections:
         df = series_data.reset_index()
-        df.columns = ["统计项", "统计值"]
+        if isinstance(series_data, pd.DataFrame):
+            # 带置信区间等附加列的统计表，或以维度为索引的局况统计表
+            df.columns = [name or "统计项" for name in series_data.index.names] + list(series_data.columns)
+        else:
+            df.columns = ["统计项", "统计值"]
         html_table = df.to_html(index=False, classes="stats-table", border=0)
         section_html = f"""
         <div class="stats-section">
@@ -311,10 +324,7 @@ def generate_html_report(nickname, image_base64_dict, series_sections, output_pa
     </script>
 </body>
 </html>"""
-
-    # 保存HTML文件
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(html_template)
+    return html_template
 
 # 使用示例
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 """PT变化分析图生成工具"""
 
 import matplotlib.pyplot as plt
+from matplotlib.collections import PolyCollection
 import pandas as pd
 import numpy as np
 
@@ -65,76 +66,73 @@ def plot_pt_changes(
     fig.subplots_adjust(hspace=0.15)
     
     #=== 智能柱状图系统 ============================================
-    def get_mode_pd(values):
-        """用pandas计算众数，处理多众数和无众数的情况"""
-        if values.empty:
-            return None
-        modes = values.mode()
-        if not modes.empty:
-            # 取第一个众数（可自定义逻辑，例如取平均值：modes.mean()）
-            return modes.iloc[0]
-        return None
-
-    # 分离正负值（排除0）
-    positive_values = plot_df[pt_col][plot_df[pt_col] > 0]
-    negative_values = plot_df[pt_col][plot_df[pt_col] < 0]
-
-    # 计算众数（若无众数则回退到中位数）
-    pos_mode = get_mode_pd(positive_values) or positive_values.median()
-    neg_mode = get_mode_pd(negative_values) or negative_values.median()
+    values = plot_df[pt_col].to_numpy(dtype=float)
+    n = len(values)
+
+    def get_mode_np(values):
+        """一次np.unique同时求正负两侧众数，多众数时取最小值（与pandas.mode一致）"""
+        uniq, counts = np.unique(values[values != 0], return_counts=True)
+        pos, neg = uniq > 0, uniq < 0
+        pos_mode = uniq[pos][np.argmax(counts[pos])] if pos.any() else None
+        neg_mode = uniq[neg][np.argmax(counts[neg])] if neg.any() else None
+        return pos_mode, neg_mode
+
+    # 计算众数（若无众数则回退到极值）
+    pos_mode, neg_mode = get_mode_np(values)
 
     # 设置归一化范围
-    vmin = neg_mode if not negative_values.empty else plot_df[pt_col].min()
-    vmax = pos_mode if not positive_values.empty else plot_df[pt_col].max()
+    vmin = neg_mode if neg_mode is not None else values.min()
+    vmax = pos_mode if pos_mode is not None else values.max()
 
     color_norm = plt.Normalize(vmin=vmin, vmax=vmax)
-    colors = plt.cm.RdYlGn(color_norm(plot_df[pt_col]))
-    
+    colors = plt.cm.RdYlGn(color_norm(values))
+
     # 柱体参数配置
-    dense = len(plot_df) > 200
-    bar_config = {
-        'width': 1.0 if dense else 0.8,
-        'alpha': 0.7 if dense else 0.8,
-        'edgecolor': 'none' if dense else 'k',
-        'linewidth': 0 if dense else 0.5,
-        'color': colors,
-    }
-    
-    bars = ax1.bar('order', plot_df[pt_col].replace(0,5), data=plot_df, **bar_config)
-    # bars = ax1.bar('order', plot_df[pt_col], data=plot_df, **bar_config)
-    
-    # 标注系统
-    label_interval = max(1, len(plot_df) // max_bar_labels)
-    seen_values = set()
-    for idx, bar in enumerate(bars):
-        if idx % label_interval != 0: continue
-        current_value = plot_df.at[idx, pt_col]
-        if current_value in seen_values:
-            continue
-        
-        # 动态位置计算
-        if current_value > 0:
-            y_pos = bar.get_height() - abs(bar.get_height())*0.15
-            va = 'top'
-        else:
-            y_pos = bar.get_height() + abs(bar.get_height())*0.15
-            va = 'bottom'
-        
-        # 边界保护
-        y_min, y_max = ax1.get_ylim()
-        safe_range = 0.05 * (y_max - y_min)
-        y_pos = np.clip(y_pos, y_min + safe_range, y_max - safe_range)
-
-        # 添加标注
-        ax1.text(
-            bar.get_x() + bar.get_width()/2, y_pos,
-            f'{int(current_value)}',
-            ha='center', va=va,
-            bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.9),
-            fontsize=max(8, min(14, 72 * figsize[0] / (len(plot_df)*0.6))),
-            color='black'
-        )
-        seen_values.add(current_value)
+    dense = n > 200
+    width = 1.0 if dense else 0.8
+    heights = np.where(values == 0, 5, values)  # 0值柱体给最小高度，保证可见
+
+    # 一次性构造全部柱体顶点 (n, 4, 2)，用单个PolyCollection绘制，避免逐个创建Rectangle
+    left = np.arange(n) - width / 2
+    verts = np.empty((n, 4, 2))
+    verts[:, 0, 0] = verts[:, 1, 0] = left
+    verts[:, 2, 0] = verts[:, 3, 0] = left + width
+    verts[:, 0, 1] = verts[:, 3, 1] = 0
+    verts[:, 1, 1] = verts[:, 2, 1] = heights
+    bars = PolyCollection(
+        verts,
+        facecolors=colors,
+        alpha=0.7 if dense else 0.8,
+        edgecolors='none' if dense else 'k',
+        linewidths=0 if dense else 0.5,
+    )
+    ax1.add_collection(bars)
+    ax1.autoscale_view()
+
+    # 标注系统：抽样、去重、位置与边界保护一次性向量化计算
+    label_interval = max(1, n // max_bar_labels)
+    sampled = np.arange(0, n, label_interval)
+    _, first = np.unique(values[sampled], return_index=True)  # 相同数值只标注第一次出现
+    label_idx = sampled[np.sort(first)]
+    label_values = values[label_idx]
+    label_heights = heights[label_idx]
+
+    is_positive = label_values > 0
+    y_pos = np.where(is_positive,
+                     label_heights - np.abs(label_heights) * 0.15,
+                     label_heights + np.abs(label_heights) * 0.15)
+    y_min, y_max = ax1.get_ylim()
+    safe_range = 0.05 * (y_max - y_min)
+    y_pos = np.clip(y_pos, y_min + safe_range, y_max - safe_range)
+
+    # 添加标注（标注数量受max_bar_labels约束，共用一套文本样式）
+    text_style = dict(
+        ha='center', color='black', zorder=3,
+        bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.9),
+        fontsize=max(8, min(14, 72 * figsize[0] / (n*0.6))),
+    )
+    for x, y, v, up in zip(label_idx, y_pos, label_values, is_positive):
+        ax1.text(x, y, f'{int(v)}', va='top' if up else 'bottom', **text_style)
 
     #=== 图表装饰 =================================================
     ax1.set(title=f'PT变动分析（共{len(plot_df)}局）', ylabel='PT变动值')
@@ -168,7 +166,7 @@ def plot_pt_changes(
         if n <= 1:
             return
         indices = np.linspace(0, n-1, num_ticks, dtype=int)
-        labels = [plot_df.at[i, 'date_label'] for i in indices]
+        labels = plot_df['date_label'].to_numpy()[indices]
         ax.set_xticks(indices)
         ax.set_xticklabels(labels, rotation=45, ha='right')
         ax.tick_params(axis='x', labelsize=max(8, base_font - 2))
@@ -178,10 +176,34 @@ def plot_pt_changes(
     plt.tight_layout()
     return fig
 
+def benchmark_render(sizes=(1000, 10000, 50000), dpi=150):
+    """渲染耗时微基准：生成随机数据，分别计时绘图与PNG栅格化"""
+    import time
+    from io import BytesIO
+    rng = np.random.default_rng(42)
+    results = []
+    for size in sizes:
+        df = pd.DataFrame({
+            '对局时间': pd.date_range('2023-01-01', periods=size, freq='h'),
+            'pt变动': rng.integers(-50, 100, size)
+        })
+        start = time.perf_counter()
+        fig = plot_pt_changes(df)
+        plot_time = time.perf_counter() - start
+        fig.savefig(BytesIO(), format='png', dpi=dpi)
+        total_time = time.perf_counter() - start
+        plt.close(fig)
+        results.append({'games': size, 'plot_s': round(plot_time, 3), 'total_s': round(total_time, 3)})
+        print(f"{size:>6}局  绘图 {plot_time:.3f}s  含栅格化 {total_time:.3f}s")
+    return results
+
+
 if __name__ == '__main__':
+    benchmark_render()
+
     np.random.seed(42)
     test_df = pd.DataFrame({
-        '对局时间': pd.date_range('2023-01-01', periods=1000, freq='H'),
+        '对局时间': pd.date_range('2023-01-01', periods=1000, freq='h'),
         'pt变动': np.random.randint(-50, 100, 1000)
     })
     
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 各模块为仓库根目录下的脚本，测试时直接导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,43 @@
+"""手牌指标：立直待牌数等由回放得到的小局列"""
+
+import pytest
+import 向听计算
+from 天凤牌谱数据统计 import hand_metrics, seat_hand_metrics
+
+OTHER_HANDS = [
+    [11, 11, 12, 12, 13, 13, 21, 21, 22, 22, 23, 23, 42],
+    [17, 17, 18, 18, 19, 19, 24, 24, 25, 25, 26, 26, 43],
+    [35, 35, 36, 36, 37, 37, 38, 38, 39, 44, 44, 45, 45],
+]
+
+
+@pytest.fixture(scope='module', autouse=True)
+def tables(tmp_path_factory):
+    # 向听数表默认生成在运行脚本旁，测试时放到临时目录
+    return 向听计算.load_tables(tmp_path_factory.mktemp('cache'))
+
+
+def riichi_paipu(hand, draw, discard):
+    """亲家配牌hand，摸draw后打出discard立直，其余三家不行动的单局牌谱"""
+    game = [[0, 0, 0], [25000] * 4, [47], [], hand, [draw], [f'r{discard}']]
+    for other in OTHER_HANDS:
+        game += [other, [], []]
+    game.append(['流局', [0, 0, 0, 0]])
+    return {'name': ['A', 'B', 'C', 'D'], 'log': [game]}
+
+
+def test_riichi_wait_count():
+    # 123m 456m 789p 東東 + 2s3s4s，摸3s打4s立直，听1s-4s两面：1s剩4张，4s打出1张剩3张
+    paipu = riichi_paipu([11, 12, 13, 14, 15, 16, 27, 28, 29, 41, 41, 32, 34], 33, 34)
+    assert hand_metrics(paipu, 0)[0][3] == 7
+
+
+def test_riichi_wait_count_not_tenpai():
+    # 立直后的手牌未听牌（回放有误等）时不计算
+    paipu = riichi_paipu([11, 12, 13, 14, 15, 16, 27, 28, 29, 41, 43, 32, 34], 33, 34)
+    assert hand_metrics(paipu, 0)[0][3] is None
+
+
+def test_all_seats_in_one_pass():
+    paipu = riichi_paipu([11, 12, 13, 14, 15, 16, 27, 28, 29, 41, 41, 32, 34], 33, 34)
+    assert seat_hand_metrics(paipu, range(4)) == {seat: hand_metrics(paipu, seat) for seat in range(4)}
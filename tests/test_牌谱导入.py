@@ -0,0 +1,56 @@
+"""牌谱导入：mjlog XML与mjlog2json格式的对照"""
+
+from 牌谱导入 import convert_mjlog
+from 天凤牌谱数据统计 import process_hanchan_results
+
+# 按天凤mjlog原样的单位书写：INIT的ten、AGARI的sc与owari中的点数均为百点单位，pt为一位小数
+MJLOG = b'''<mjloggm ver="2.3"><SHUFFLE seed="mt19937ar-sha512-n288-base64,AAAA" ref=""/>\
+<GO type="169" lobby="0"/>\
+<UN n0="%41" n1="%42" n2="%43" n3="%44" dan="16,15,14,13" rate="2100.00,2000.00,1900.00,1800.00" sx="M,M,F,M"/>\
+<TAIKYOKU oya="0"/>\
+<INIT seed="0,0,0,3,2,53" ten="250,250,250,250" oya="0" \
+hai0="0,4,8,12,17,20,24,28,32,36,40,44,108" \
+hai1="48,49,50,72,76,80,84,89,92,96,100,104,110" \
+hai2="5,9,13,18,21,25,29,33,37,41,45,54,111" \
+hai3="56,60,64,68,73,77,81,85,93,97,101,105,112"/>\
+<T109/><D109/>\
+<AGARI ba="0,0" hai="48,49,50,72,76,80,84,89,92,96,100,104,109,110" machi="109" ten="40,2600,0" \
+yaku="24,2" doraHai="53" who="1" fromWho="0" sc="250,-26,250,26,250,0,250,0" \
+owari="224,-37.6,276,47.6,250,5.0,250,-15.0"/>\
+</mjloggm>'''
+
+# 同一牌谱在mjlog2json中的对应内容
+EXPECTED = {
+    'name': ['A', 'B', 'C', 'D'],
+    'rule': {'disp': '鳳南喰赤', 'aka53': 1, 'aka52': 1, 'aka51': 1},
+    'dan': ['七段', '六段', '五段', '四段'],
+    'rate': [2100.0, 2000.0, 1900.0, 1800.0],
+    'sx': ['M', 'M', 'F', 'M'],
+    'sc': [22400, -37.6, 27600, 47.6, 25000, 5.0, 25000, -15.0],
+    'log': [[
+        [0, 0, 0], [25000, 25000, 25000, 25000], [25], [],
+        [11, 12, 13, 14, 15, 16, 17, 18, 19, 21, 22, 23, 41], [41], [60],
+        [24, 24, 24, 31, 32, 33, 34, 35, 36, 37, 38, 39, 41], [], [],
+        [12, 13, 14, 15, 16, 17, 18, 19, 21, 22, 23, 25, 41], [], [],
+        [26, 27, 28, 29, 31, 32, 33, 34, 36, 37, 38, 39, 42], [], [],
+        ['和了', [-2600, 2600, 0, 0], [1, 0, 1, '40符2飜2600点', '一気通貫(2飜)']],
+    ]],
+}
+
+
+def test_convert_matches_mjlog2json():
+    paipu = convert_mjlog(MJLOG, ref='2024010100gm-00a9-0000-00000000')
+    for key, value in EXPECTED.items():
+        assert paipu[key] == value, key
+    assert paipu['ref'] == '2024010100gm-00a9-0000-00000000'
+
+
+def test_final_scores_in_points():
+    paipu = convert_mjlog(MJLOG)
+    results = process_hanchan_results(paipu)
+    assert [result['score'] for result in results] == [22400, 27600, 25000, 25000]
+    assert [result['rank'] for result in results] == [4, 1, 2, 3]
+    assert not any(result['is_negative'] for result in results)
+    # 最后一局的收支（终局点数 - 开局点数）与该局的点数变动一致
+    start, deltas = paipu['log'][-1][1], paipu['log'][-1][-1][1]
+    assert [results[seat]['score'] - start[seat] for seat in range(4)] == deltas
@@ -0,0 +1,209 @@
+"""小局数据列式存储工具"""
+
+import numpy as np
+import pandas as pd
+
+# 牌谱级信息列，每个牌谱只存一份，行内以牌谱序号引用
+INFO_COLUMNS = ['牌谱', '牌桌', '对局时间', '玩家昵称', '玩家位置', '玩家段位', '玩家rate']
+# 小局数据列，append传入的元组按此顺序排列
+VALUE_COLUMNS = ['场次', '四家点数', '和了', '放铳', '立直', '默听', '和了打点', '和了巡目', '放铳打点',
+                 '流局时听牌', '流局时得点', '立直先制', '立直巡目', '副露巡目', '放铳巡目', '追立', '自摸',
+                 '流局', '副露', '副露类型', '杠数', '摸切数', '配牌向听', '听牌巡目', '副露时向听', '立直待牌数', '收支']
+
+# 布尔列打包进一个uint16，可为None的列另占一个"有值"位
+FLAG_COLUMNS = ['和了', '放铳', '立直', '默听', '流局时听牌', '立直先制', '追立', '自摸', '流局', '副露']
+NULLABLE_FLAGS = ['默听', '流局时听牌', '立直先制']
+# 整数列及其类型，可为None的列用该类型最小值表示缺失
+INT_COLUMNS = {
+    '和了打点': np.int32, '和了巡目': np.int16, '放铳打点': np.int32, '流局时得点': np.int32,
+    '立直巡目': np.int16, '副露巡目': np.int16, '放铳巡目': np.int16,
+    '杠数': np.int8, '摸切数': np.int16, '配牌向听': np.int8, '听牌巡目': np.int16, '副露时向听': np.int8,
+    '立直待牌数': np.int8, '收支': np.int32,
+}
+NULLABLE_INTS = ['和了打点', '和了巡目', '放铳打点', '流局时得点', '立直巡目', '副露巡目', '放铳巡目',
+                 '配牌向听', '听牌巡目', '副露时向听', '立直待牌数']
+CALL_CATEGORIES = ['吃', '碰', '明杠', '加杠']
+
+_VALUE_INDEX = {name: i for i, name in enumerate(VALUE_COLUMNS)}
+_FLAG_BITS = [(_VALUE_INDEX[name], 1 << bit) for bit, name in enumerate(FLAG_COLUMNS)]
+_VALID_BITS = [(_VALUE_INDEX[name], 1 << (len(FLAG_COLUMNS) + bit)) for bit, name in enumerate(NULLABLE_FLAGS)]
+_INT_FIELDS = [(name, _VALUE_INDEX[name], np.iinfo(dtype).min if name in NULLABLE_INTS else None)
+               for name, dtype in INT_COLUMNS.items()]
+_CALL_CODES = {name: code for code, name in enumerate(CALL_CATEGORIES)}
+
+
+class KyokuStore:
+    """
+    小局数据列式存储
+
+    预分配NumPy列数组，容量不足时按2倍扩容；每行约60字节。
+    牌谱级信息（牌谱、牌桌、玩家等）每个牌谱只保存一次。
+    """
+
+    def __init__(self, capacity=4096):
+        self.size = 0
+        self.files = []  # 每个牌谱的INFO_COLUMNS元组
+        self.capacity = 0
+        self.columns = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        specs = {
+            'file': (np.int32, ()),
+            '场次': (np.int16, (3,)),
+            '四家点数': (np.int32, (4,)),
+            'flags': (np.uint16, ()),
+            '副露类型': (np.int8, ()),
+        }
+        specs.update({name: (dtype, ()) for name, dtype in INT_COLUMNS.items()})
+        columns = {}
+        for name, (dtype, shape) in specs.items():
+            columns[name] = np.zeros((capacity,) + shape, dtype=dtype)
+            if name in self.columns:
+                columns[name][:self.size] = self.columns[name][:self.size]
+        self.columns = columns
+        self.capacity = capacity
+
+    def add_file(self, info):
+        """登记一个牌谱的信息元组，返回牌谱序号"""
+        self.files.append(tuple(info))
+        return len(self.files) - 1
+
+    def append(self, file_index, row):
+        """写入一行小局数据，row按VALUE_COLUMNS顺序排列"""
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.size
+        columns = self.columns
+
+        columns['file'][i] = file_index
+        columns['场次'][i] = row[0]
+        scores = row[1]
+        columns['四家点数'][i, :len(scores)] = scores
+
+        flags = 0
+        for index, bit in _FLAG_BITS:
+            if row[index]:
+                flags |= bit
+        for index, bit in _VALID_BITS:
+            if row[index] is not None:
+                flags |= bit
+        columns['flags'][i] = flags
+
+        for name, index, missing in _INT_FIELDS:
+            value = row[index]
+            columns[name][i] = missing if value is None else value
+        call_type = row[_VALUE_INDEX['副露类型']]
+        columns['副露类型'][i] = -1 if call_type is None else _CALL_CODES[call_type]
+        self.size += 1
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """已用行占用的字节数（不含牌谱级信息）"""
+        return sum(column[:self.size].nbytes for column in self.columns.values())
+
+    def batch(self, start=0, stop=None):
+        """返回[start, stop)行的结构化数组（紧凑类型，不解包）"""
+        stop = self.size if stop is None else stop
+        dtype = [(name, column.dtype, column.shape[1:]) for name, column in self.columns.items()]
+        batch = np.empty(stop - start, dtype=dtype)
+        for name, column in self.columns.items():
+            batch[name] = column[start:stop]
+        return batch
+
+    def _flag(self, name):
+        bit = 1 << FLAG_COLUMNS.index(name)
+        return (self.columns['flags'][:self.size] & bit) != 0
+
+    def _flag_valid(self, name):
+        bit = 1 << (len(FLAG_COLUMNS) + NULLABLE_FLAGS.index(name))
+        return (self.columns['flags'][:self.size] & bit) != 0
+
+    def to_frame(self, compat=True):
+        """
+        生成小局DataFrame
+
+        compat=True：与process_paipu逐牌谱生成的列和取值一致
+            （缺失整数为NaN浮点，可为None的布尔列为object，场次、四家点数为列表）
+        compat=False：紧凑类型，整数与布尔列直接引用存储数组（可空列为pandas可空类型），
+            字符串列为category，场次、四家点数拆为局数/本场/供托与点数0-3列
+        """
+        n = self.size
+        columns = self.columns
+        file_index = columns['file'][:n]
+        data = {}
+
+        for i, name in enumerate(INFO_COLUMNS):
+            values = [info[i] for info in self.files]
+            if compat or name in ('玩家位置', '玩家rate'):
+                data[name] = np.asarray(values)[file_index] if values else np.array([])
+            else:
+                codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+                data[name] = pd.Categorical.from_codes(codes[file_index], uniques)
+
+        if compat:
+            data['场次'] = columns['场次'][:n].tolist()
+            data['四家点数'] = columns['四家点数'][:n].tolist()
+        else:
+            for j, name in enumerate(['局数', '本场', '供托']):
+                data[name] = columns['场次'][:n, j]
+            for j in range(4):
+                data[f'点数{j}'] = columns['四家点数'][:n, j]
+
+        for name in VALUE_COLUMNS[2:]:
+            if name in FLAG_COLUMNS:
+                values = self._flag(name)
+                if name in NULLABLE_FLAGS:
+                    valid = self._flag_valid(name)
+                    if compat:
+                        values = np.where(valid, values, None)
+                    else:
+                        values = pd.arrays.BooleanArray(values, ~valid)
+                data[name] = values
+            elif name == '副露类型':
+                codes = columns['副露类型'][:n]
+                if compat:
+                    data[name] = np.where(codes >= 0, np.array(CALL_CATEGORIES, dtype=object)[codes], None)
+                else:
+                    data[name] = pd.Categorical.from_codes(codes, CALL_CATEGORIES)
+            else:
+                values = columns[name][:n]
+                if name in NULLABLE_INTS:
+                    missing = values == np.iinfo(values.dtype).min
+                    if compat:
+                        values = np.where(missing, np.nan, values)
+                    else:
+                        values = pd.arrays.IntegerArray(values, missing)
+                elif compat:
+                    values = values.astype(np.int64)
+                data[name] = values
+
+        return pd.DataFrame(data, copy=False)
+
+
+def compat_frame(frame):
+    """
+    把to_frame(compat=False)的紧凑小局表转换为compat=True的列和取值
+
+    多出的列（如牌谱查询缓存的场风、亲家）去掉；字符串列的取值保持原样。
+    """
+    data = {}
+    for name in INFO_COLUMNS:
+        column = frame[name]
+        data[name] = column.to_numpy(dtype=object) if isinstance(column.dtype, pd.CategoricalDtype) else column.to_numpy()
+    data['场次'] = frame[['局数', '本场', '供托']].to_numpy(dtype=np.int64).tolist()
+    data['四家点数'] = frame[[f'点数{j}' for j in range(4)]].to_numpy(dtype=np.int64).tolist()
+    for name in VALUE_COLUMNS[2:]:
+        column = frame[name]
+        if name in NULLABLE_FLAGS or name == '副露类型':
+            data[name] = column.to_numpy(dtype=object, na_value=None)
+        elif name in FLAG_COLUMNS:
+            data[name] = column.to_numpy(dtype=bool)
+        elif name in NULLABLE_INTS:
+            data[name] = column.to_numpy(dtype=float, na_value=np.nan)
+        else:
+            data[name] = column.to_numpy(dtype=np.int64)
+    return pd.DataFrame(data, index=frame.index)
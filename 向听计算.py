@@ -0,0 +1,242 @@
+"""查表法向听数与进张计算，输入为34种牌的张数向量（牌种序号同牌谱回放.TILE_KIND）"""
+
+import operator
+import sys
+import time
+from pathlib import Path
+import numpy as np  # pip install numpy
+
+TABLE_VERSION = 1
+TABLE_DIR = Path('paipu_data') / 'cache'
+INF = 60  # 不可能的组合，四门相加仍不超过uint8范围
+TERMINALS = [0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33]  # 幺九牌
+
+# 一门牌的查表键：各牌张数的5进制数
+SUIT_POWERS = 5 ** np.arange(9, dtype=np.int32)
+HONOR_POWERS = 5 ** np.arange(7, dtype=np.int32)
+
+
+def build_table(length, sequences):
+    """
+    生成一门牌的距离表
+
+    表的第key行第k*2+h列：把该门牌补成恰好k组面子（h=1时另加一个雀头）最少还需要摸进的张数。
+    按牌位逐位动态规划，状态为(已用面子数, 是否已有雀头, 上一位起始的顺子数, 上上位起始的顺子数)，
+    所有键同时向量化计算。
+    """
+    values = {(0, 0, 0, 0): np.zeros(1, dtype=np.uint8)}
+    for i in range(length):
+        allow_sequence = sequences and i <= length - 3
+        new_values = {}
+        for (k, head, a, b), array in values.items():
+            for triplet in (0, 1):
+                for pair in ((0, 1) if head == 0 else (0,)):
+                    for s in range(5 if allow_sequence else 1):
+                        new_k = k + triplet + s
+                        need = 3*triplet + 2*pair + s + a + b  # 这一位需要的张数
+                        if new_k > 4 or need > 4:
+                            break
+                        # 新键的第i位为该牌实际张数h，缺少的张数为max(need-h, 0)
+                        candidate = np.concatenate([array + max(need - h, 0) for h in range(5)])
+                        state = (new_k, head + pair, s, a)
+                        if state in new_values:
+                            np.minimum(new_values[state], candidate, out=new_values[state])
+                        else:
+                            new_values[state] = candidate
+        values = new_values
+
+    table = np.full((5 ** length, 10), INF, dtype=np.uint8)
+    for (k, head, a, b), array in values.items():
+        if a == 0 and b == 0:
+            column = k*2 + head
+            np.minimum(table[:, column], array, out=table[:, column])
+    return table
+
+
+def _default_table_dir():
+    # 与天凤牌谱数据统计.resource_path相同，相对运行脚本所在目录
+    return Path(sys.argv[0]).resolve().parent / TABLE_DIR
+
+
+_tables = None
+
+
+def load_tables(table_dir=None):
+    """加载（首次使用时生成）数牌与字牌距离表，以内存映射方式读取"""
+    global _tables
+    if _tables is not None and table_dir is None:
+        return _tables
+    table_dir = Path(table_dir) if table_dir else _default_table_dir()
+    table_dir.mkdir(parents=True, exist_ok=True)
+    tables = []
+    for name, length, sequences in (('suit', 9, True), ('honor', 7, False)):
+        path = table_dir / f'shanten_{name}_v{TABLE_VERSION}.npy'
+        if not path.exists():
+            print(f"生成向听数表: {path}")
+            np.save(path, build_table(length, sequences))
+        tables.append(np.load(path, mmap_mode='r'))
+    _tables = tuple(tables)
+    return _tables
+
+
+def _combine(left, right, columns=range(10)):
+    """
+    两门牌距离向量的min-plus卷积，输入输出均为(10, N)
+
+    输出第k*2+h列为两门合计恰好k组面子、h个雀头的最少张数；columns只计算需要的列。
+    """
+    result = np.full_like(left, INF)
+    for column in columns:
+        k, head = divmod(column, 2)
+        best = result[column]
+        for k1 in range(k + 1):
+            for h1 in range(head + 1):
+                np.minimum(best, left[k1*2 + h1] + right[(k - k1)*2 + head - h1], out=best)
+    return result
+
+
+def _regular_distance(hands, melds, tables):
+    """一般形（4组面子1雀头）还需摸进的最少张数"""
+    suit_table, honor_table = tables
+    rows = [suit_table[hands[:, 9*s:9*s + 9] @ SUIT_POWERS].T for s in range(3)]
+    rows.append(honor_table[hands[:, 27:] @ HONOR_POWERS].T)
+    columns = (4 - melds) * 2 + 1
+    needed = np.unique(columns)
+    combined = _combine(_combine(rows[0], rows[1]), _combine(rows[2], rows[3]), needed)
+    if len(needed) == 1:
+        return combined[needed[0]]
+    return combined[columns, np.arange(len(hands))]
+
+
+def shanten_batch(hands, melds=0, tables=None, chunk_size=65536):
+    """
+    批量计算向听数
+
+    hands: (N, 34)张数数组，每行为3n+1或3n+2张（已扣除副露）；melds: 副露数（标量或长度N的数组）
+    返回int8数组，和了为-1、听牌为0；无副露时同时考虑七对子与国士无双。
+    """
+    tables = tables or load_tables()
+    hands = np.asarray(hands, dtype=np.int32).reshape(-1, 34)
+    melds = np.broadcast_to(np.asarray(melds, dtype=np.intp), (len(hands),))
+    result = np.empty(len(hands), dtype=np.int8)
+    for start in range(0, len(hands), chunk_size):
+        block = hands[start:start + chunk_size]
+        block_melds = melds[start:start + chunk_size]
+        shanten = _regular_distance(block, block_melds, tables).astype(np.int8) - 1
+
+        # 七对子、国士无双
+        closed = block_melds == 0
+        if closed.any():
+            pairs = (block >= 2).sum(axis=1)
+            kinds = (block >= 1).sum(axis=1)
+            chiitoi = 6 - pairs + np.maximum(0, 7 - kinds)
+            terminals = block[:, TERMINALS]
+            kokushi = 13 - (terminals >= 1).sum(axis=1) - (terminals >= 2).any(axis=1)
+            special = np.minimum(chiitoi, kokushi).astype(np.int8)
+            shanten = np.where(closed, np.minimum(shanten, special), shanten)
+        result[start:start + chunk_size] = shanten
+    return result
+
+
+def shanten(hand, melds=0):
+    """单手牌的向听数"""
+    return int(shanten_batch([hand], melds)[0])
+
+
+def ukeire_batch(hands, melds=0, visible=None):
+    """
+    批量计算进张：摸进后向听数减少的牌种及剩余张数
+
+    hands: (N, 34)张数数组，每行3n+1张；visible: 可见牌张数（默认只扣除自己手牌）
+    返回 (待牌掩码(N, 34), 剩余张数(N,))
+    """
+    hands = np.asarray(hands, dtype=np.int32).reshape(-1, 34)
+    n = len(hands)
+    melds = np.broadcast_to(np.asarray(melds, dtype=np.intp), (n,))
+    visible = hands if visible is None else np.asarray(visible, dtype=np.int32).reshape(-1, 34)
+
+    base = shanten_batch(hands, melds)
+    # 每手牌分别加入34种牌中的一张（已有4张的牌种不可能再摸到）
+    drawn = np.repeat(hands, 34, axis=0).reshape(n, 34, 34)
+    drawn[:, np.arange(34), np.arange(34)] += hands < 4
+    after = shanten_batch(drawn.reshape(-1, 34), np.repeat(melds, 34)).reshape(n, 34)
+    waits = (after < base[:, None]) & (hands < 4)
+    remaining = np.where(waits, np.maximum(4 - visible, 0), 0).sum(axis=1)
+    return waits, remaining
+
+
+_POWERS = [5 ** i for i in range(9)]
+# min-plus卷积中每列的组合：第k*2+h列 <- (左列, 右列) 的列表
+_PLUS_PAIRS = [[(k1*2 + h1, (column // 2 - k1)*2 + column % 2 - h1)
+                for k1 in range(column // 2 + 1) for h1 in range(column % 2 + 1)] for column in range(10)]
+
+
+def _min_plus(left, right):
+    """两门牌距离列表（长度10）的min-plus卷积，_combine的单手牌版本"""
+    return [min([left[a] + right[b] for a, b in pairs]) for pairs in _PLUS_PAIRS]
+
+
+def winning_kinds(hand, melds=0, tables=None):
+    """
+    单手3n+1张牌（已扣除副露）的和了牌种序号列表，未听牌时为空
+
+    逐门查表，不经过批量计算，适合逐巡调用（如合成牌谱）；已有4张的牌种不计入。
+    无副露时同时检查七对子与国士无双。
+    """
+    # 内存映射数组逐行索引较慢，转为普通数组视图
+    suit_table, honor_table = (np.asarray(table) for table in tables or load_tables())
+    keys = [sum(map(operator.mul, hand[9*s:9*s + 9], _POWERS)) for s in range(3)]
+    keys.append(sum(map(operator.mul, hand[27:], _POWERS)))
+    rows = [suit_table[key].tolist() for key in keys[:3]] + [honor_table[keys[3]].tolist()]
+    front, back = _min_plus(rows[0], rows[1]), _min_plus(rows[2], rows[3])
+    pairs = _PLUS_PAIRS[(4 - melds)*2 + 1]
+    if min([front[a] + back[b] for a, b in pairs]) == 1:
+        # 一般形听牌：其余三门的合计距离，和了时两部分都为0，只需检查其余三门为0的列对应的本门列
+        others = [_min_plus(rows[1], back), _min_plus(rows[0], back),
+                  _min_plus(front, rows[3]), _min_plus(front, rows[2])]
+        columns = [[a for a, b in pairs if rest[b] == 0] for rest in others]
+    else:
+        columns = [[]] * 4
+
+    special = set()
+    if melds == 0:
+        if sum(count >= 2 for count in hand) == 6 and max(hand) <= 2:
+            special.add(hand.index(1))  # 七对子单骑
+        present = [kind for kind in TERMINALS if hand[kind]]
+        if sum(hand[kind] for kind in TERMINALS) == 13 and len(present) >= 12:
+            # 国士无双：十三种各一张时十三面，否则听缺的一种
+            special.update(TERMINALS if len(present) == 13 else set(TERMINALS) - set(present))
+    result = []
+    for s, (table, start, length) in enumerate([(suit_table, 0, 9), (suit_table, 9, 9), (suit_table, 18, 9),
+                                                (honor_table, 27, 7)]):
+        kinds = [kind for kind in range(start, start + length)
+                 if hand[kind] < 4 and (columns[s] or kind in special)]
+        if not kinds:
+            continue
+        # 本门摸进各牌种后的距离，一次取出
+        rows = table[[keys[s] + 5 ** (kind - start) for kind in kinds]].tolist()
+        for kind, row in zip(kinds, rows):
+            if kind in special or any(row[column] == 0 for column in columns[s]):
+                result.append(kind)
+    return result
+
+
+def benchmark(n=1_000_000, seed=0):
+    """随机14张手牌批量计算向听数的速度"""
+    rng = np.random.default_rng(seed)
+    load_tables()
+    wall = np.repeat(np.arange(34), 4)
+    hands = np.zeros((n, 34), dtype=np.int32)
+    for start in range(0, n, 100_000):
+        size = min(100_000, n - start)
+        picks = wall[rng.random((size, 136)).argsort(axis=1)[:, :14]]
+        np.add.at(hands[start:start + size], (np.arange(size)[:, None], picks), 1)
+    start = time.perf_counter()
+    result = shanten_batch(hands)
+    elapsed = time.perf_counter() - start
+    print(f"{n} 手牌，用时 {elapsed:.2f} 秒，{n / elapsed / 1e6:.2f} 百万次/秒")
+    print("向听数分布:", dict(zip(*np.unique(result, return_counts=True))))
+
+
+if __name__ == "__main__":
+    benchmark()
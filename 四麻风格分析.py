@@ -1,13 +1,39 @@
 # 首先确保已经安装了必要的库
+import json
+from datetime import datetime
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
+from PIL import Image
+import pandas as pd
 from io import BytesIO
 import base64
 
 
 # 定义MahjongAnalyzer类（与之前相同）
 class MahjongAnalyzer:
-    def __init__(self):
+    # 静态背景缓存：{缓存键: (figure, axes, 背景像素)}，所有实例共享
+    _background_cache = {}
+    # 风格模型参数文件格式版本
+    MODEL_VERSION = 1
+    # 参数与generate_statistics综合统计项的对应关系：(统计项, 倍率)
+    STATS_KEYS = {
+        'horyu_rate': ('和了率', 100),
+        'houju_rate': ('放铳率', 100),
+        'furo_rate': ('副露率', 100),
+        'riichi_rate': ('立直率', 100),
+        'dama_rate': ('默听率', 100),
+        'average_score': ('平均和了打点', 1),
+        'avg_horyu_turn': ('平均和了巡目', 1),
+        'avg_houju_score': ('平均放铳打点', 1),
+        'ryukyoku_rate': ('流局听牌率', 100),
+        'riichi_turn': ('平均立直巡目', 1),
+        'riichi_first_rate': ('立直先制率', 100),
+        'riichi_chase_rate': ('追立率', 100),
+    }
+
+    def __init__(self, model_path=None):
         self.parameters = {
             'horyu_rate': 0,
             'houju_rate': 0,
@@ -44,6 +70,35 @@ class MahjongAnalyzer:
             {"label": "副露速度型", "x": -25, "y": -4},
             {"label": "全局参与型", "x": -15, "y": 22},
         ]
+        # 以百分数传入、计算前需除以100的参数
+        self.percent_keys = {'horyu_rate', 'houju_rate', 'furo_rate', 'riichi_rate', 'dama_rate',
+                             'ryukyoku_rate', 'riichi_first_rate', 'riichi_chase_rate'}
+        # 标准化参数，顺序与self.parameters一致
+        self.means = np.array([
+            0.229400816, 0.11106952, 0.331713127, 0.182824374, 0.128029668, 6454.787778,
+            12.12006667, 5387.771667, 0.421591309, 9.298394589, 0.828159779, 0.171840221,
+        ])
+        self.stds = np.array([
+            0.01018886, 0.009595166, 0.037372193, 0.018407074, 0.029703506, 235.6563516,
+            0.11553016, 141.1658779, 0.04623791, 0.193397116, 0.021060104, 0.021060104,
+        ])
+        # 12×2投影矩阵，第0列为X轴权重，第1列为Y轴权重
+        self.weights = np.array([
+            [-1.166081274, 0.22551386],
+            [-0.202381694, 0.889258806],
+            [-1.258740534, -0.453560713],
+            [-0.013917045, 0.451204072],
+            [0.708071254, -1.48123253],
+            [1.249496931, -0.194681556],
+            [0.73499073, 0.531014201],
+            [-0.231466343, 0.202878547],
+            [-0.585817047, 0.81983416],
+            [0.831715773, 0.644693651],
+            [-0.612817769, -2.393675857],
+            [0.546947012, 0.75875334],
+        ])
+        if model_path:
+            self.load_model(model_path)
         plt.rcdefaults()  # 恢复所有配置到默认值
         plt.rcParams['font.family'] = 'SimHei'
         plt.rcParams['axes.unicode_minus'] = False  # 是否显示负号
@@ -54,38 +109,16 @@ class MahjongAnalyzer:
     def calculate_X(self, horyu_rate, houju_rate, furo_rate, riichi_rate, dama_rate,
                    average_score, avg_horyu_turn, avg_houju_score, ryuku_rate,
                    riichi_turn, riichi_first_rate, riichi_chase_rate):
-        return (
-            horyu_rate * -1.166081274 +
-            houju_rate * -0.202381694 +
-            furo_rate * -1.258740534 +
-            riichi_rate * -0.013917045 +
-            dama_rate * 0.708071254 +
-            average_score * 1.249496931 +
-            avg_horyu_turn * 0.73499073 +
-            avg_houju_score * -0.231466343 +
-            ryuku_rate * -0.585817047 +
-            riichi_turn * 0.831715773 +
-            riichi_first_rate * -0.612817769 +
-            riichi_chase_rate * 0.546947012
-        )
+        return float(np.dot([horyu_rate, houju_rate, furo_rate, riichi_rate, dama_rate,
+                             average_score, avg_horyu_turn, avg_houju_score, ryuku_rate,
+                             riichi_turn, riichi_first_rate, riichi_chase_rate], self.weights[:, 0]))
 
     def calculate_Y(self, horyu_rate, houju_rate, furo_rate, riichi_rate, dama_rate,
                    average_score, avg_horyu_turn, avg_houju_score, ryuku_rate,
                    riichi_turn, riichi_first_rate, riichi_chase_rate):
-        return (
-            horyu_rate * 0.22551386 +
-            houju_rate * 0.889258806 +
-            furo_rate * -0.453560713 +
-            riichi_rate * 0.451204072 +
-            dama_rate * -1.48123253 +
-            average_score * -0.194681556 +
-            avg_horyu_turn * 0.531014201 +
-            avg_houju_score * 0.202878547 +
-            ryuku_rate * 0.81983416 +
-            riichi_turn * 0.644693651 +
-            riichi_first_rate * -2.393675857 +
-            riichi_chase_rate * 0.75875334
-        )
+        return float(np.dot([horyu_rate, houju_rate, furo_rate, riichi_rate, dama_rate,
+                             average_score, avg_horyu_turn, avg_houju_score, ryuku_rate,
+                             riichi_turn, riichi_first_rate, riichi_chase_rate], self.weights[:, 1]))
 
     def get_style(self, X, Y):
         S = (X**2 + Y**2)**0.5
@@ -119,55 +152,87 @@ class MahjongAnalyzer:
                 U = "全局参与型"
         return f"{T}{U}"
 
-    def plot_result(self, X, Y, output_filename, style):
-        plt.figure(figsize=(10, 10))
-        origin_x = 0
-        origin_y = 0
-        scale = 1
+    def get_styles(self, X, Y):
+        """get_style的向量化版本，X、Y为等长数组"""
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+        S = np.hypot(X, Y)
+        T = np.select([S > 12.71, S > 8.89, S > 3.2, S > 1.47],
+                      ["超重度", "重度", "中度", "轻度"], default="中庸")
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            A = np.where(X != 0, Y / np.where(X != 0, X, 1), 0)
+        positive = X > 0
+        U = np.select(
+            [A > 1, A > -0.35],
+            [np.where(positive, "后手反击型", "先手躱手型"),
+             np.where(positive, "门前打点型", "副露速度型")],
+            default=np.where(positive, "铁壁地藏型", "全局参与型"),
+        )
+        return np.char.add(T, U)
+
+    def _get_background(self, dpi=300):
+        """绘制并缓存静态背景（坐标轴、辅助线、参考点与风格标签），只在首次使用时栅格化"""
+        key = (dpi, repr(self.bluedata_points), repr(self.blackdata_points))
+        if key in self._background_cache:
+            return self._background_cache[key]
+
+        # 不经过pyplot创建，避免被其他图表的plt.close('all')关闭
+        fig = Figure(figsize=(10, 10), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
 
         x = np.linspace(-30, 30, 100)
         y = x * 0
-        plt.plot(x, y, color='black', linewidth=1)
-        plt.plot(y, x, color='black', linewidth=1)
+        ax.plot(x, y, color='black', linewidth=1)
+        ax.plot(y, x, color='black', linewidth=1)
 
-        plt.plot(x, x, color='green', linestyle='--')
-        plt.plot(x, -0.35 * x, color='green', linestyle='--')
-        plt.plot(x * 0, x, color='green', linestyle='--')
+        ax.plot(x, x, color='green', linestyle='--')
+        ax.plot(x, -0.35 * x, color='green', linestyle='--')
+        ax.plot(x * 0, x, color='green', linestyle='--')
 
+        ax.scatter([p['x'] for p in self.bluedata_points], [p['y'] for p in self.bluedata_points],
+                   color='blue', s=50)
         for point in self.bluedata_points:
-            plt.scatter(point['x'], point['y'], color='blue', s=50)
-            plt.annotate(point['label'], (point['x'], point['y']), 
-                        xytext=(point['x'] + 0.1, point['y'] + 0.1), 
+            ax.annotate(point['label'], (point['x'], point['y']),
+                        xytext=(point['x'] + 0.1, point['y'] + 0.1),
                         fontsize=8)
 
         for point in self.blackdata_points:
-            # plt.scatter(point['x'], point['y'], color='black', s=100)
-            plt.annotate(point['label'], (point['x'], point['y']), 
+            ax.annotate(point['label'], (point['x'], point['y']),
                         xytext=(point['x'] + 0.1, point['y'] - 0.1),
                         fontsize=15, fontweight='bold')
 
-        # 绘制当前点
-        plt.scatter(X, Y, color='red', s=100, zorder=3)
-        plt.text(-20, 28, f'坐标: ({X:.1f}, {Y:.1f})\n风格: {style}',
-                    ha='left', va='bottom',
-                    fontsize=12, color='red',
-                  )
-
-        plt.xlim(-27, 27)
-        plt.ylim(-27, 27)
-        plt.xticks(range(-25, 26, 5))
-        plt.yticks(range(-25, 26, 5))
-        plt.gca().grid(True, which="both", linestyle='--', alpha=0.5)
-        plt.xlabel('X')
-        plt.ylabel('Y')
-        plt.title('麻将风格分析')
-        # if output_filename:
-        #     plt.savefig(output_filename, dpi=300)
-        # plt.show()
-        # 保存到内存缓冲区
+        ax.set_xlim(-27, 27)
+        ax.set_ylim(-27, 27)
+        ax.set_xticks(range(-25, 26, 5))
+        ax.set_yticks(range(-25, 26, 5))
+        ax.grid(True, which="both", linestyle='--', alpha=0.5)
+        ax.set_xlabel('X')
+        ax.set_ylabel('Y')
+        ax.set_title('麻将风格分析')
+
+        fig.canvas.draw()
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        self._background_cache[key] = (fig, ax, background)
+        return self._background_cache[key]
+
+    def _render_overlay(self, draw_overlay, output_filename, dpi=300):
+        """在缓存背景上叠加动态图层（blit），返回PNG二进制和Base64数据"""
+        fig, ax, background = self._get_background(dpi)
+        fig.canvas.restore_region(background)
+
+        artists = draw_overlay(ax)
+        for artist in artists:
+            artist.set_animated(True)
+            ax.draw_artist(artist)
+        for artist in artists:
+            artist.remove()  # 动态图层不保留在缓存的背景图上
+
+        # 保存到内存缓冲区（背景不透明，去掉alpha通道可显著加快PNG编码）
         img_buffer = BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300)
-        plt.close()  # 关闭图像，防止内存泄漏
+        rgb = np.asarray(fig.canvas.buffer_rgba())[..., :3]
+        Image.fromarray(rgb).save(img_buffer, format='png', dpi=(dpi, dpi))
 
         # 获取二进制数据
         img_bytes = img_buffer.getvalue()
@@ -181,6 +246,137 @@ class MahjongAnalyzer:
 
         return img_bytes, img_base64  # 返回二进制和Base64数据
 
+    def plot_result(self, X, Y, output_filename, style):
+        def draw_overlay(ax):
+            # 绘制当前点
+            return [
+                ax.scatter(X, Y, color='red', s=100, zorder=3),
+                ax.text(-20, 28, f'坐标: ({X:.1f}, {Y:.1f})\n风格: {style}',
+                        ha='left', va='bottom',
+                        fontsize=12, color='red'),
+            ]
+
+        return self._render_overlay(draw_overlay, output_filename)
+
+    def plot_results(self, X, Y, labels=None, output_filename=None, trajectory=False):
+        """
+        在同一张风格分析图上绘制多个玩家，或按顺序连线绘制风格变化轨迹
+
+        参数：
+        X, Y: 等长数组 - 各点坐标（可直接使用analyze_batch的结果列）
+        labels: list - 各点标注文字，为None时不标注
+        output_filename: str - 输出文件名，为None时不保存文件
+        trajectory: bool - 是否按顺序连线并突出显示终点
+        """
+        X = np.asarray(X, dtype=float)
+        Y = np.asarray(Y, dtype=float)
+
+        def draw_overlay(ax):
+            artists = []
+            if trajectory and len(X) > 1:
+                artists.extend(ax.plot(X, Y, color='red', linewidth=1.5, alpha=0.5, zorder=2))
+            artists.append(ax.scatter(X, Y, color='red', s=30 if trajectory else 60, alpha=0.8, zorder=3))
+            if trajectory and len(X):
+                artists.append(ax.scatter(X[-1], Y[-1], color='red', s=100, zorder=3))
+            if labels is not None:
+                for x, y, label in zip(X, Y, labels):
+                    artists.append(ax.annotate(str(label), (x, y), xytext=(x + 0.3, y + 0.3),
+                                               fontsize=8, color='red'))
+            return artists
+
+        return self._render_overlay(draw_overlay, output_filename)
+
+
+    @classmethod
+    def stats_to_parameters(cls, stats):
+        """将generate_statistics的综合统计（Series，或每行一个玩家的DataFrame）转换为分析参数"""
+        if isinstance(stats, pd.DataFrame):
+            return pd.DataFrame({key: stats[name] * factor for key, (name, factor) in cls.STATS_KEYS.items()},
+                                index=stats.index)
+        return {key: stats[name] * factor for key, (name, factor) in cls.STATS_KEYS.items()}
+
+    def fit(self, df, align=True):
+        """
+        用大量玩家的指标向量重新拟合标准化参数与投影轴（PCA）
+
+        参数：
+        df: pd.DataFrame - 每行一个玩家，列为self.parameters（比率类为百分数）或综合统计项名
+        align: bool - 是否将前两个主成分旋转对齐到当前X、Y轴，保持风格象限的含义
+
+        返回：
+        dict - 模型参数，可用save_model保存
+        """
+        if not all(key in df.columns for key in self.parameters):
+            df = self.stats_to_parameters(df)
+        scale = np.array([100 if key in self.percent_keys else 1 for key in self.parameters])
+        values = df[list(self.parameters)].to_numpy(dtype=float) / scale
+        values = values[np.isfinite(values).all(axis=1)]  # 丢弃缺少指标（如从未立直）的样本
+        if len(values) < len(self.parameters) + 1:
+            raise ValueError(f"有效样本数不足: {len(values)}")
+
+        means = values.mean(axis=0)
+        stds = values.std(axis=0, ddof=1)
+        stds[stds == 0] = 1
+        standardized = (values - means) / stds
+
+        # 标准化后的协方差即相关矩阵，特征分解取前两个主成分
+        eigvals, eigvecs = np.linalg.eigh(standardized.T @ standardized / (len(values) - 1))
+        order = np.argsort(eigvals)[::-1]
+        eigvals, components = eigvals[order], eigvecs[:, order[:2]]
+
+        # 各轴长度保持与当前模型一致，使风格强度阈值仍然适用
+        norms = np.linalg.norm(self.weights, axis=0)
+        if align:
+            # 正交Procrustes：在主成分平面内旋转，使新轴最接近当前轴方向
+            u, _, vt = np.linalg.svd(components.T @ (self.weights / norms))
+            components = components @ (u @ vt)
+        weights = components * norms
+
+        self.means, self.stds, self.weights = means, stds, weights
+        self._update_reference_points()
+        return self.model_params(
+            n_samples=int(len(values)),
+            explained_variance_ratio=(eigvals[:2] / eigvals.sum()).tolist(),
+        )
+
+    def _update_reference_points(self):
+        """按投影权重重新计算各指标方向的参考点（最大坐标缩放到±20）"""
+        for point, (wx, wy) in zip(self.bluedata_points, self.weights):
+            factor = 20 / max(abs(wx), abs(wy))
+            point['x'] = round(float(wx * factor), 1)
+            point['y'] = round(float(wy * factor), 1)
+
+    def model_params(self, **extra):
+        """导出当前模型参数"""
+        params = {
+            'version': self.MODEL_VERSION,
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'parameters': list(self.parameters),
+            'means': self.means.tolist(),
+            'stds': self.stds.tolist(),
+            'weights': self.weights.tolist(),
+        }
+        params.update(extra)
+        return params
+
+    def save_model(self, path, **extra):
+        """保存模型参数文件（JSON）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.model_params(**extra), f, ensure_ascii=False, indent=2)
+
+    def load_model(self, path):
+        """加载模型参数文件，替换内置的标准化参数与投影权重"""
+        with open(path, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+        if params.get('version') != self.MODEL_VERSION:
+            raise ValueError(f"不支持的风格模型版本: {params.get('version')}")
+        if params.get('parameters') != list(self.parameters):
+            raise ValueError("风格模型参数项与当前版本不一致")
+        self.means = np.array(params['means'], dtype=float)
+        self.stds = np.array(params['stds'], dtype=float)
+        self.weights = np.array(params['weights'], dtype=float)
+        self._update_reference_points()
+        return params
 
     def analyze(self, **kwargs):
         data = kwargs.get('data', None)
@@ -193,40 +389,40 @@ class MahjongAnalyzer:
             if key not in data:
                 raise ValueError(f"缺少参数: {key}")
 
-        horyu_rate = data['horyu_rate'] / 100
-        houju_rate = data['houju_rate'] / 100
-        furo_rate = data['furo_rate'] / 100
-        riichi_rate = data['riichi_rate'] / 100
-        dama_rate = data['dama_rate'] / 100
-        ryuku_rate = data['ryukyoku_rate'] / 100
-        riichi_first_rate = data['riichi_first_rate'] / 100
-        riichi_chase_rate = data['riichi_chase_rate'] / 100
-
-        std_horyu = self.standardize(horyu_rate, 0.229400816, 0.01018886)
-        std_houju = self.standardize(houju_rate, 0.11106952, 0.009595166)
-        std_furo = self.standardize(furo_rate, 0.331713127, 0.037372193)
-        std_riichi = self.standardize(riichi_rate, 0.182824374, 0.018407074)
-        std_dama = self.standardize(dama_rate, 0.128029668, 0.029703506)
-        std_average = self.standardize(data['average_score'], 6454.787778, 235.6563516)
-        std_horyu_turn = self.standardize(data['avg_horyu_turn'], 12.12006667, 0.11553016)
-        std_houju_score = self.standardize(data['avg_houju_score'], 5387.771667, 141.1658779)
-        std_ryuku = self.standardize(ryuku_rate, 0.421591309, 0.04623791)
-        std_riichi_turn = self.standardize(data['riichi_turn'], 9.298394589, 0.193397116)
-        std_riichi_first = self.standardize(riichi_first_rate, 0.828159779, 0.021060104)
-        std_riich_chase = self.standardize(riichi_chase_rate, 0.171840221, 0.021060104)
-
-        X = self.calculate_X(std_horyu, std_houju, std_furo, std_riichi, std_dama,
-                            std_average, std_horyu_turn, std_houju_score, std_ryuku,
-                            std_riichi_turn, std_riichi_first, std_riich_chase)
-        Y = self.calculate_Y(std_horyu, std_houju, std_furo, std_riichi, std_dama,
-                            std_average, std_horyu_turn, std_houju_score, std_ryuku,
-                            std_riichi_turn, std_riichi_first, std_riich_chase)
+        values = np.array([data[key] for key in self.parameters], dtype=float)
+        X, Y = map(float, self.project(values))
 
         style = self.get_style(X, Y)
         img_bytes, img_base64 = self.plot_result(X, Y, output_filename, style)
         return X, Y, style, img_bytes, img_base64
 
 
+    def project(self, values):
+        """将原始指标（一维12项或二维n×12，顺序同self.parameters）标准化后投影为X、Y"""
+        values = np.array(values, dtype=float)
+        scale = np.array([100 if key in self.percent_keys else 1 for key in self.parameters])
+        standardized = (values / scale - self.means) / self.stds
+        XY = standardized @ self.weights
+        return XY[..., 0], XY[..., 1]
+
+    def analyze_batch(self, df):
+        """
+        批量风格分析，不绘图
+
+        参数：
+        df: pd.DataFrame - 每行一个玩家或时间窗口，列名同self.parameters（比率类为百分数）
+
+        返回：
+        pd.DataFrame - 与df同索引，包含X、Y、风格三列
+        """
+        missing = [key for key in self.parameters if key not in df.columns]
+        if missing:
+            raise ValueError(f"缺少参数: {', '.join(missing)}")
+
+        X, Y = self.project(df[list(self.parameters)].to_numpy(dtype=float))
+        return pd.DataFrame({'X': X, 'Y': Y, '风格': self.get_styles(X, Y)}, index=df.index)
+
+
 if __name__ == '__main__':
     # 使用示例：
     mahjong_analyzer = MahjongAnalyzer()
@@ -246,7 +442,14 @@ if __name__ == '__main__':
         'riichi_chase_rate': 27.7
     }
 
-    X, Y, style = mahjong_analyzer.analyze(data=data)
+    X, Y, style, img_bytes, img_base64 = mahjong_analyzer.analyze(data=data)
 
     print(f"X: {X:.2f}, Y: {Y:.2f}")
     print(f"风格分析结果：{style}")
+
+    # 批量分析示例：多个时间窗口的风格轨迹
+    windows = pd.DataFrame([data, {**data, 'furo_rate': 30.1, 'riichi_rate': 24.5}], index=['窗口1', '窗口2'])
+    windows = mahjong_analyzer.analyze_batch(windows)
+    print(windows)
+    mahjong_analyzer.plot_results(windows['X'], windows['Y'], labels=windows.index,
+                                  output_filename="风格轨迹图.png", trajectory=True)
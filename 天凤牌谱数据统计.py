@@ -1,4 +1,5 @@
 import json
+import hashlib
 import sys
 import time
 import base64
@@ -7,6 +8,8 @@ import webbrowser
 from pathlib import Path
 from datetime import datetime
 import concurrent.futures
+from collections import namedtuple
+from typing import TypedDict
 from urllib.parse import parse_qs, urlparse
 import pandas as pd  # pip install pandas
 from tqdm import tqdm  # pip install tqdm
@@ -17,10 +20,30 @@ import matplotlib.pyplot as plt  # pip install matplotlib
 import numpy as np  # pip install numpy
 import seaborn as sns
 import scipy
+from scipy.stats import kendalltau, rankdata
 from 四麻风格分析 import MahjongAnalyzer
 from pt变化图生成 import plot_pt_changes
 from rate变化图生成 import plot_rate_changes
 from html网页生成 import generate_html_report
+from 列式存储 import KyokuStore, INFO_COLUMNS as KYOKU_INFO_COLUMNS, VALUE_COLUMNS as KYOKU_VALUE_COLUMNS
+from 牌谱回放 import iter_kyoku_states, TILE_KIND
+from 向听计算 import shanten_batch, ukeire_batch
+from 运行记录 import PROFILE
+from 数据导出 import export_frame, ExcelExport, CHUNK_ROWS
+from 牌谱仓库 import PaipuStore, STORE_DIR, migrate_directory
+from 置信区间 import bootstrap_intervals, format_interval, RESAMPLES, CONFIDENCE
+from 局况统计 import SituationCube, situation_sections
+from 顺位预测 import load_or_fit, MODEL_PATH as PLACEMENT_MODEL_PATH
+
+# 可选的JSON解码加速库，未安装时回退到标准库json
+try:
+    import msgspec  # pip install msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson  # pip install orjson
+except ImportError:
+    orjson = None
 
 
 # 在pyinstaller打包环境下返回资源地址
@@ -41,6 +64,36 @@ def build_download_url(original_url):
         return None
     return f"https://tenhou.net/5/mjlog2json.cgi?{log_id}"
 
+class PaipuSchema(TypedDict, total=False):
+    """mjlog2json牌谱中分析用到的字段，msgspec解码时只生成这些字段"""
+    name: list
+    dan: list
+    rate: list
+    sc: list
+    rule: dict
+    log: list
+    ref: str
+
+
+def _build_json_decoders():
+    decoders = {}
+    if msgspec is not None:
+        decoders['msgspec'] = msgspec.json.Decoder(PaipuSchema).decode
+    if orjson is not None:
+        decoders['orjson'] = orjson.loads
+    decoders['json'] = json.loads
+    return decoders
+
+
+JSON_DECODERS = _build_json_decoders()
+JSON_BACKEND = next(iter(JSON_DECODERS))  # 默认使用已安装的最快后端
+
+
+def decode_paipu(raw, backend=None):
+    """解码牌谱JSON（bytes或str），backend为None时使用JSON_BACKEND"""
+    return JSON_DECODERS[backend or JSON_BACKEND](raw)
+
+
 def get_headers(referer):
     return {
         'Accept': '*/*',
@@ -58,63 +111,88 @@ def get_headers(referer):
         'sec-ch-ua-platform': '"Windows"'
     }
 
-def download_paipu(original_url, save_dir="paipu_data"):
-    save_dir_path = Path(save_dir)
-    save_dir_path.mkdir(parents=True, exist_ok=True)
-    
+def download_paipu(original_url, save_dir="paipu_data", retries=2, store=None):
+    """下载牌谱到save_dir；指定store（牌谱仓库）时保存到仓库，任何玩家已下载过的牌谱都不再下载"""
     download_url = build_download_url(original_url)
     if not download_url:
         print(f"无效URL: {original_url}")
         return None
     
     log_id = extract_log_id(original_url)
-    save_path = save_dir_path.joinpath(f"{log_id}.json")
+    if store is not None:
+        save_path = store.path(log_id)
+        exists = log_id in store
+    else:
+        save_dir_path = Path(save_dir)
+        save_dir_path.mkdir(parents=True, exist_ok=True)
+        save_path = save_dir_path.joinpath(f"{log_id}.json")
+        exists = save_path.exists()
     
-    if save_path.exists():
+    if exists:
         print(f"该牌谱已存在，跳过下载: {original_url}")
+        PROFILE.count('已存在跳过数')
         return save_path
 
-    try:
-        response = requests.get(
-            download_url,
-            headers=get_headers(original_url),
-            timeout=10
-        )
-        response.raise_for_status()
-        response.json()
-        
-        with open(save_path, 'w', encoding='utf-8') as f:
-            json.dump(response.json(), f)
-        print(f"下载成功: {original_url}")
-        return save_path
-    except Exception as e:
-        print(f"下载失败 {original_url}: {str(e)}")
-        return None
+    # 失败时最多重试retries次，间隔1、2、4...秒
+    for attempt in range(retries + 1):
+        try:
+            response = requests.get(
+                download_url,
+                headers=get_headers(original_url),
+                timeout=10
+            )
+            response.raise_for_status()
+            paipu = decode_paipu(response.content)  # 校验内容为合法牌谱JSON
 
-def process_paipu_file(txt_path, target_player, download_threads):
-    print("开始读取URL列表...")
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        urls = [line.strip() for line in f if line.strip()]
-    print(f"读取完成，总共有{len(urls)}个URL")
-    
-    success_count = 0
+            # 直接保存原始字节，避免重复解码再编码
+            if store is not None:
+                store.add(log_id, response.content, paipu.get('name', []))
+            else:
+                with open(save_path, 'wb') as f:
+                    f.write(response.content)
+            print(f"下载成功: {original_url}")
+            PROFILE.count('下载成功数')
+            PROFILE.count('下载字节数', len(response.content))
+            return save_path
+        except Exception as e:
+            if attempt == retries:
+                print(f"下载失败 {original_url}: {str(e)}")
+                PROFILE.count('下载失败数')
+                return None
+            PROFILE.count('HTTP重试次数')
+            time.sleep(2 ** attempt)
+
+def download_urls(urls, save_dir, download_threads, retries=2, store=None):
+    """多线程下载牌谱，返回 (成功保存或已存在的文件路径列表, 失败数)；指定store时保存到牌谱仓库"""
+    saved = []
     failure_count = 0
-    
-    print(f"并发数{download_threads}开始下载...")
     with concurrent.futures.ThreadPoolExecutor(max_workers=download_threads) as executor:
-        futures = {executor.submit(download_paipu, url, f"paipu_data/{target_player}"): url for url in urls}
+        futures = {executor.submit(download_paipu, url, save_dir, retries, store): url for url in urls}
         
         for future in concurrent.futures.as_completed(futures):
             url = futures[future]
             try:
                 result = future.result()
                 if result:
-                    success_count +=1
+                    saved.append(result)
                 else:
                     failure_count +=1
             except Exception as e:
                 print(f"下载失败：{url}，错误：{str(e)}")
                 failure_count +=1
+    return saved, failure_count
+
+def process_paipu_file(txt_path, target_player, download_threads, retries=2, store=None):
+    """下载URL列表中的牌谱：指定store时保存到牌谱仓库，否则保存到paipu_data/<target_player>"""
+    print("开始读取URL列表...")
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        urls = [line.strip() for line in f if line.strip()]
+    print(f"读取完成，总共有{len(urls)}个URL")
+    
+    print(f"并发数{download_threads}开始下载...")
+    with PROFILE.span('下载牌谱'):
+        saved, failure_count = download_urls(urls, f"paipu_data/{target_player}", download_threads, retries, store)
+    success_count = len(saved)
                 
     print("\n下载统计结果:")
     print(f"成功下载数量：{success_count}")
@@ -155,23 +233,144 @@ def load_config(config_path="config.toml"):
         return None
     
 
-def process_paipu(file_path, target_player, config):
-    """处理单个牌谱文件"""
+# 单个玩家在一个小局中的事件记录（巡目从1开始，无对应事件时为None）
+SeatEvents = namedtuple('SeatEvents', ['riichi_turn', 'call_turn', 'call_type', 'kan_count', 'tsumogiri_count', 'discard_count'])
+CALL_TYPES = {'c': '吃', 'p': '碰', 'm': '明杠', 'k': '加杠'}
+
+
+def scan_kyoku(game, seats=4):
+    """逐家只遍历一次摸牌、出牌数组，记录立直、首次副露、杠、摸切等事件"""
+    events = []
+    for player_seat in range(seats):
+        draw_actions = game[5 + 3*player_seat]  # 摸牌
+        discard_actions = game[6 + 3*player_seat]  # 出牌
+
+        # 数组中绝大多数是整数牌，只对字符串动作（副露、立直、杠）逐个判断
+        call_turn = call_type = None
+        kan_count = 0
+        for turn_idx, action in [(i, a) for i, a in enumerate(draw_actions) if a.__class__ is str]:
+            if 'm' in action:
+                kan_count += 1
+            if call_turn is None:
+                call_type = next((op for op in action if op in CALL_TYPES), None)
+                if call_type:
+                    call_turn = turn_idx + 1
+
+        riichi_turn = None
+        for turn_idx, action in [(i, a) for i, a in enumerate(discard_actions) if a.__class__ is str]:
+            if action[0] == 'r':
+                if riichi_turn is None:
+                    riichi_turn = turn_idx + 1  # 只记录第一次立直
+            elif 'a' in action or 'k' in action:
+                kan_count += 1
+
+        tsumogiri_count = discard_actions.count(60) + discard_actions.count('r60')
+        events.append(SeatEvents(riichi_turn, call_turn, call_type, kan_count, tsumogiri_count, len(discard_actions)))
+    return events
+
+
+def hand_metrics(paipu, seat):
+    """
+    回放牌谱，计算目标玩家每个小局的手牌指标
+
+    返回列表，每小局一个 (配牌向听, 听牌巡目, 副露时向听, 立直待牌数)，无对应事件时为None。
+    听牌巡目为打牌后首次听牌的巡目；副露时向听为首次副露后打牌时的向听；
+    立直待牌数为立直宣言牌打出后待牌的剩余张数（扣除自己手牌与牌河中可见的牌），
+    只在该手牌听牌时计算（回放不完整等原因未听牌时为None，ukeire_batch此时数的是进张而非待牌）。
+    """
+    return seat_hand_metrics(paipu, [seat])[seat]
+
+
+def seat_hand_metrics(paipu, seats):
+    """
+    一次回放计算多个座位的手牌指标，返回 座位 -> hand_metrics的结果
+
+    回放本身记录全部座位的手牌，只收集seats中座位的手牌；整个牌谱的手牌收集后一次批量查表计算。
+    """
+    players = len(paipu['name'])
+    seats = list(seats)
+    hands, melds, owners = [], [], []  # 需要计算向听的手牌，owners记录(座位, 小局, 巡目, 是否首次副露后)
+    riichi_positions, riichi_visible = [], []  # 立直宣言后手牌在hands中的位置
+    for kyoku, game in enumerate(paipu['log']):
+        for seat in seats:
+            start_hand = [0] * 34
+            for tile in game[4 + 3*seat]:
+                start_hand[TILE_KIND[tile]] += 1
+            hands.append(start_hand)
+            melds.append(0)
+            owners.append((seat, kyoku, 0, False))
+
+        after_call = dict.fromkeys(seats)
+        for state in iter_kyoku_states(game, players, kyoku):
+            seat = state.seat
+            if seat not in after_call:
+                continue
+            if state.action in ('吃', '碰', '明杠') and after_call[seat] is None:
+                after_call[seat] = True
+            elif state.action in ('打牌', '立直'):
+                hand = state.hands[seat][:]
+                hands.append(hand)
+                melds.append(state.melds[seat])
+                owners.append((seat, kyoku, state.turn, after_call[seat] is True))
+                if after_call[seat]:
+                    after_call[seat] = False
+                if state.action == '立直':
+                    visible = hand[:]
+                    for river in state.rivers:
+                        for kind in river:
+                            visible[kind] += 1
+                    riichi_positions.append(len(hands) - 1)
+                    riichi_visible.append(visible)
+
+    metrics = {seat: [[None, None, None, None] for _ in paipu['log']] for seat in seats}
+    shanten_values = shanten_batch(hands, melds)
+    for (seat, kyoku, turn, first_call), value in zip(owners, shanten_values.tolist()):
+        row = metrics[seat][kyoku]
+        if turn == 0:
+            row[0] = value
+        elif value <= 0 and row[1] is None:
+            row[1] = turn
+        if first_call:
+            row[2] = value
+    tenpai = [(position, visible) for position, visible in zip(riichi_positions, riichi_visible)
+              if shanten_values[position] == 0]
+    if tenpai:
+        _, remaining = ukeire_batch([hands[position] for position, _ in tenpai],
+                                    [melds[position] for position, _ in tenpai],
+                                    [visible for _, visible in tenpai])
+        for (position, _), value in zip(tenpai, remaining.tolist()):
+            seat, kyoku = owners[position][:2]
+            metrics[seat][kyoku][3] = value
+    return {seat: [tuple(row) for row in rows] for seat, rows in metrics.items()}
+
+
+def read_paipu(file_path, target_player, config):
+    """
+    读取并过滤单个牌谱
+
+    返回 (paipu, seat, 牌谱级信息元组, 半庄结果)，不符合过滤条件或解析失败时返回None
+    """
     try:
-        with open(resource_path(file_path), 'r', encoding='utf-8') as f:
-            raw = f.read()
-            paipu = json.loads(raw)
+        with PROFILE.span('读取文件'):
+            with open(resource_path(file_path), 'rb') as f:
+                raw = f.read()
+        PROFILE.count('读取文件数')
+        PROFILE.count('解码字节数', len(raw))
+        with PROFILE.span('解码JSON'):
+            paipu = decode_paipu(raw)
     except Exception as e:
         print(f"解析错误 {file_path}: {str(e)}")
-        return pd.DataFrame(), pd.DataFrame()
+        PROFILE.count('解析失败文件数')
+        return None
     
     # 基础过滤
     if not config:
-        return pd.DataFrame(), pd.DataFrame()
+        return None
     
     # 1. 玩家过滤
     if target_player not in paipu.get('name', []):
-        return pd.DataFrame(), pd.DataFrame()
+        PROFILE.count('跳过：不含目标玩家')
+        return None
     
     seat = paipu['name'].index(target_player)
     dan = paipu['dan'][seat]
@@ -185,7 +384,8 @@ def process_paipu(file_path, target_player, config):
     # 2. 牌桌级别过滤
     if config['filter']['levels']:
         if rule_disp not in config['filter']['levels']:
-            return pd.DataFrame(), pd.DataFrame()
+            PROFILE.count('跳过：牌桌级别')
+            return None
         else:
             ...
     else:
@@ -193,183 +393,86 @@ def process_paipu(file_path, target_player, config):
         ...
         
     # 3. 时间过滤
-    game_time = datetime.strptime(parse_ref_time(ref), "%Y-%m-%d %H:%M:%S")
+    game_time_str = parse_ref_time(ref)
+    game_time = datetime.strptime(game_time_str, "%Y-%m-%d %H:%M:%S")
     if not (config['filter']['timeafter'] <= game_time <= config['filter']['timebefore']):
-        return pd.DataFrame(), pd.DataFrame()
+        PROFILE.count('跳过：对局时间')
+        return None
 
-    records = []
-    
+    # 基础信息，顺序同KYOKU_INFO_COLUMNS
+    info = (ref, rule_disp, game_time_str, target_player, seat, dan, rate)
+    # 半庄终局结果每个牌谱只计算一次，末局收支与半庄数据共用
+    hanchan_results = process_hanchan_results(paipu)
+    return paipu, seat, info, hanchan_results
+
+
+def iter_kyoku_rows(paipu, seat, hanchan_results, metrics=None):
+    """逐小局产出目标玩家的数据元组，顺序同KYOKU_VALUE_COLUMNS；metrics为hand_metrics的结果"""
     for game_idx, game in enumerate(paipu['log']):
         # 过滤特殊流局 九种九牌 四风连打等 ['九種九牌'] or game[16] == ['四風連打']
         # if len(game[16]) == 1 :
         #     print(f"特殊流局，跳过该小局：{game[16]}")
         #     continue
 
-        # 基础信息
-        game_info = {
-            '牌谱': ref,
-            '牌桌': rule_disp,
-            '对局时间': parse_ref_time(ref),
-            '玩家昵称': target_player,
-            '玩家位置': seat,
-            '玩家段位': dan,
-            '玩家rate': rate,
-            '场次': game[0],
-            '四家点数': game[1]
-        }
-        
-        # 收集各玩家立直信息
-        riichi_turns = []
-        for player_seat in range(4):
-            discard_actions = game[6 + 3*player_seat]
-            riichi_turn = None
-            for turn_idx, action in enumerate(discard_actions):
-                if isinstance(action, str) and action.startswith('r'):
-                    riichi_turn = turn_idx+1
-                    break  # 只记录第一次立直
-            riichi_turns.append(riichi_turn)
-    
+        # 单次遍历收集各玩家事件
+        seat_events = scan_kyoku(game)
+        riichi_turns = [events.riichi_turn for events in seat_events]
+        own = seat_events[seat]
+        has_riichi = own.riichi_turn is not None
+        first_call_turn = own.call_turn
 
-        # # 遍历玩家副露
-        # calls = []
-        # for a in game[6 + 3*seat - 1]:  # 玩家摸牌
-        #     if isinstance(a, str) and any(op in a for op in ['c', 'p', 'm', 'k'])  :  # 包含吃/碰/明杠/加杠标识
-        #         calls.append(a)
-        # 立直巡目
-        discard_actions = game[6 + 3*seat]  # 玩家出牌
-        # target_turn = next(i+1 for i, a in enumerate(discard_actions) 
-        #             if isinstance(a, str) and a.startswith('r'))
-        has_riichi = any(isinstance(a, str) and a.startswith('r') for a in discard_actions)
-        # 计算第一次副露的巡目
-        first_call_turn = None
-        for i, action in enumerate(game[6 + 3*seat - 1]):
-            if isinstance(action, str) and any(op in action for op in ['c', 'p', 'm', 'k']):
-                first_call_turn = i + 1  # 巡目从1开始
-                break    
-
-        game_info.update({
-            '和了': False,
-            '放铳': False,
-            '立直': has_riichi,
-            '默听': None,
-            '和了打点': None,
-            '和了巡目': None,
-            '放铳打点': None,
-            '流局时听牌': None,
-            '流局时得点': None,
-            '立直先制': None,
-            '立直巡目': None,
-            '副露巡目': None,
-            '放铳巡目': None,
-            '追立': False,
-            '自摸': False,
-            '流局': False,
-            '副露': True if first_call_turn else False,
-            '副露巡目': first_call_turn,
-        })
+        和了 = 放铳 = 追立 = 自摸 = 流局 = False
+        默听 = 和了打点 = 和了巡目 = 放铳打点 = 流局时听牌 = 流局时得点 = 立直先制 = 立直巡目 = 放铳巡目 = None
+        副露 = True if first_call_turn else False
 
         # 局收支
         if game_idx <= len(paipu['log']) - 2:
             收支 = paipu['log'][game_idx + 1][1][seat] - paipu['log'][game_idx][1][seat]
         elif game_idx == len(paipu['log']) - 1:
-            收支 = process_hanchan_stats(paipu, target_player)['score'] - paipu['log'][game_idx][1][seat]
-        game_info.update({
-            '收支': 收支
-        })
+            收支 = hanchan_results[seat]['score'] - paipu['log'][game_idx][1][seat]
 
         # 结果解析
         result = game[16]
 
         # 处理结果类型
         if result[0] == '和了':
-            for i, v in enumerate(result[1]):
-                if i == seat:
-                    if v > 0:
-                        game_info.update({
-                            '和了': True,
-                            '和了巡目': len(discard_actions)+1,
-                            '和了打点': result[1][seat] - 1000 if has_riichi else result[1][seat],
-                            '默听': has_riichi is False and game_info['副露'] is False,
-                            '自摸': True if 0 not in result[1] else False,
-                            # '收支': result[1][seat] - 1000 if has_riichi else result[1][seat],
-                        })
-                    elif v < 0:
-                        if 0 not in result[1]:  # 被自摸，不算放铳
-                            game_info.update({
-                                '放铳': False,
-                                '放铳打点': None,
-                                # '收支': result[1][seat] - 1000 if has_riichi else result[1][seat],
-                            })
-                        else:
-                            game_info.update({
-                                '放铳': True,
-                                '放铳打点': result[1][seat],
-                                '放铳巡目': len(discard_actions)+1,
-                                # '收支': result[1][seat] - 1000 if has_riichi else result[1][seat],
-                            })    
-                    elif v == 0: 
-                        pass
-                        # if has_riichi:
-                        #     game_info.update({
-                        #         '收支': result[1][seat] - 1000 if has_riichi else result[1][seat]
-                        #     })
-                    else:
-                        raise ValueError(f'Unexpected result value: {result}')             
+            v = result[1][seat]
+            if v > 0:
+                和了 = True
+                和了巡目 = own.discard_count+1
+                和了打点 = v - 1000 if has_riichi else v
+                默听 = has_riichi is False and 副露 is False
+                自摸 = True if 0 not in result[1] else False
+            elif v < 0:
+                if 0 not in result[1]:  # 被自摸，不算放铳
+                    pass
+                else:
+                    放铳 = True
+                    放铳打点 = v
+                    放铳巡目 = own.discard_count+1
 
         # 修正后代码
         elif result[0] == '流局':
             delta = result[1][seat]
-            game_info.update({
-                '流局时听牌': delta > 0,
-                '流局时得点': delta-1000 if has_riichi else delta,
-                '放铳': False,
-                '放铳打点': None,
-                '流局': True,
-                # '收支': delta-1000 if has_riichi else delta,
-            })
-        elif result[0] == '九種九牌' or result[0] == '四風連打':
-            game_info.update({
-                '流局时听牌': False,
-                '流局时得点': 0,
-                '放铳': False,
-                '放铳打点': None,
-                '流局': True,
-            })
-        elif result[0] == '全員不聴':
-            game_info.update({
-                '流局时听牌': False,
-                '流局时得点': 0,
-                '放铳': False,
-                '放铳打点': None,
-                '流局': True,
-            })
+            流局时听牌 = delta > 0
+            流局时得点 = delta-1000 if has_riichi else delta
+            流局 = True
         elif result[0] == '全員聴牌':
-            game_info.update({
-                '流局时听牌': True,
-                '流局时得点': 0,
-                '放铳': False,
-                '放铳打点': None,
-                '流局': True,
-            })
-        elif len(result) == 1:
-            game_info.update({
-                '流局时听牌': False,
-                '流局时得点': 0,
-                '放铳': False,
-                '放铳打点': None,
-                '流局': True,
-            })
+            流局时听牌 = True
+            流局时得点 = 0
+            流局 = True
+        elif result[0] in ('九種九牌', '四風連打', '全員不聴') or len(result) == 1:
+            流局时听牌 = False
+            流局时得点 = 0
+            流局 = True
         else:
             print(f'ValueError:\n    Unexpected result: {result}')
             continue
             # raise ValueError(f'Unexpected result: {result}')
-        # if len(game[16]) == 0:
-        #     print('存在game[16]为空')
 
         # 处理立直类型
         if has_riichi:
-            target_turn = next(i+1 for i, a in enumerate(discard_actions) 
-                             if isinstance(a, str) and a.startswith('r'))
+            target_turn = own.riichi_turn
             is_senzu = True
             
             for other_seat, other_turn in enumerate(riichi_turns):
@@ -382,29 +485,76 @@ def process_paipu(file_path, target_player, config):
                     is_senzu = False
                     break
             
-            game_info.update({
-                '立直先制': is_senzu,
-                '追立': not is_senzu,
-                '立直巡目': target_turn,
+            立直先制 = is_senzu
+            追立 = not is_senzu
+            立直巡目 = target_turn
 
-            })
-        
-        records.append(game_info)
+        yield (game[0], game[1], 和了, 放铳, has_riichi, 默听, 和了打点, 和了巡目, 放铳打点,
+               流局时听牌, 流局时得点, 立直先制, 立直巡目, first_call_turn, 放铳巡目, 追立, 自摸,
+               流局, 副露, CALL_TYPES.get(own.call_type), own.kan_count, own.tsumogiri_count,
+               *(metrics[game_idx] if metrics else (None, None, None, None)), 收支)
+
+
+def load_hand_metrics(paipu, seat, config):
+    """按配置计算手牌指标，关闭或回放失败时返回None（对应列留空）"""
+    return load_seat_hand_metrics(paipu, [seat], config)[seat]
+
+
+def load_seat_hand_metrics(paipu, seats, config):
+    """同load_hand_metrics，一次回放计算多个座位，返回 座位 -> 手牌指标或None"""
+    if not config.get('analysis', {}).get('hand_metrics', True):
+        return dict.fromkeys(seats)
+    try:
+        with PROFILE.span('手牌回放'):
+            return seat_hand_metrics(paipu, seats)
+    except ValueError as e:
+        print(f"牌谱回放失败 {paipu.get('ref')}: {str(e)}")
+        return dict.fromkeys(seats)
+
+
+def process_paipu(file_path, target_player, config):
+    """处理单个牌谱文件"""
+    parsed = read_paipu(file_path, target_player, config)
+    if parsed is None:
+        return pd.DataFrame(), pd.DataFrame()
+    paipu, seat, info, hanchan_results = parsed
+    metrics = load_hand_metrics(paipu, seat, config)
+
+    with PROFILE.span('小局数据'):
+        records = [info + row for row in iter_kyoku_rows(paipu, seat, hanchan_results, metrics)]
+    PROFILE.count('解析小局数', len(records))
 
-    
     # 新增半庄数据
-    hanchan_data = {
-        '牌谱': ref,
-        '牌桌': rule_disp,
-        '对局时间': parse_ref_time(ref),
-        '玩家昵称': target_player,
-        '玩家位置': seat,
-        '玩家段位': dan,
-        '玩家rate': rate,
-    }
-    hanchan_data.update(process_hanchan_stats(paipu, target_player))
+    hanchan_data = dict(zip(KYOKU_INFO_COLUMNS, info))
+    hanchan_data.update(hanchan_results[seat])
         
-    return pd.DataFrame(records), pd.DataFrame([hanchan_data])
+    return (pd.DataFrame.from_records(records, columns=KYOKU_INFO_COLUMNS + KYOKU_VALUE_COLUMNS),
+            pd.DataFrame([hanchan_data]))
+
+
+def process_paipu_columnar(file_path, target_player, config, kyoku_store, hanchan_rows):
+    """
+    列式后端处理单个牌谱：小局直接写入kyoku_store，半庄数据追加到hanchan_rows
+
+    返回本牌谱小局在kyoku_store中的行范围 (start, stop)，可用kyoku_store.batch取出；不符合条件时返回None
+    """
+    parsed = read_paipu(file_path, target_player, config)
+    if parsed is None:
+        return None
+    paipu, seat, info, hanchan_results = parsed
+    metrics = load_hand_metrics(paipu, seat, config)
+
+    start = len(kyoku_store)
+    file_index = kyoku_store.add_file(info)
+    with PROFILE.span('小局数据'):
+        for row in iter_kyoku_rows(paipu, seat, hanchan_results, metrics):
+            kyoku_store.append(file_index, row)
+    PROFILE.count('解析小局数', len(kyoku_store) - start)
+
+    hanchan_data = dict(zip(KYOKU_INFO_COLUMNS, info))
+    hanchan_data.update(hanchan_results[seat])
+    hanchan_rows.append(hanchan_data)
+    return start, len(kyoku_store)
 
 
 # 计算pt变动
@@ -476,13 +626,41 @@ def calculate_pt_change(row):
     return 0
 
 
-def analyze_directory(directory, target_player, config):
-    """分析整个目录的牌谱"""
+def analyze_directory(directory, target_player, config, backend='columnar'):
+    """
+    分析整个目录的牌谱；directory为牌谱仓库（PaipuStore）时按玩家索引取该玩家的牌谱
+
+    backend='columnar'：小局写入列式存储，最后一次性生成DataFrame（默认，内存占用小）
+    backend='dataframe'：逐牌谱生成DataFrame后合并
+    """
+    with PROFILE.span('分析牌谱', profile=True):
+        return _analyze_directory(directory, target_player, config, backend)
+
+
+def _analyze_directory(directory, target_player, config, backend):
+    if isinstance(directory, PaipuStore):
+        files = directory.files(target_player)
+    else:
+        path = Path(resource_path(directory))
+        files = list(path.glob('*.json')) + list(path.glob('*.txt'))
+
+    if backend == 'columnar':
+        kyoku_store = KyokuStore()
+        hanchan_rows = []
+        for file_path in tqdm(files, desc='Processing'):
+            try:
+                process_paipu_columnar(file_path, target_player, config, kyoku_store, hanchan_rows)
+            except Exception as e:
+                print(f"处理错误 {file_path}: {str(e)}")
+        if not len(kyoku_store) or not hanchan_rows:
+            return pd.DataFrame(), pd.DataFrame()
+        with PROFILE.span('生成DataFrame'):
+            return kyoku_store.to_frame(), pd.DataFrame(hanchan_rows)
+
     all_kyoku_dfs = []
     all_hanchan_dfs = []
-    path = Path(resource_path(directory))
     
-    for file_path in tqdm(list(path.glob('*.json')) + list(path.glob('*.txt')), desc='Processing'):
+    for file_path in tqdm(files, desc='Processing'):
         try:
             kyoku_df, hanchan_df = process_paipu(file_path, target_player, config)
             if not kyoku_df.empty:
@@ -497,8 +675,9 @@ def analyze_directory(directory, target_player, config):
     if not all_hanchan_dfs:
         return pd.DataFrame(), pd.DataFrame()
     
-    final_kyoku_df = pd.concat(all_kyoku_dfs, ignore_index=True)
-    final_hanchan_df = pd.concat(all_hanchan_dfs, ignore_index=True)
+    with PROFILE.span('生成DataFrame'):
+        final_kyoku_df = pd.concat(all_kyoku_dfs, ignore_index=True)
+        final_hanchan_df = pd.concat(all_hanchan_dfs, ignore_index=True)
     return final_kyoku_df, final_hanchan_df
 
 
@@ -567,20 +746,87 @@ def insight_tags(
  
     return tags
 
-def generate_statistics(final_kyoku_df, final_hanchan_df, config):
-    """生成统计报告"""
-    if final_kyoku_df.empty:
-        print("无有效数据可生成报告")
-        return pd.DataFrame()
-    
-    target_player = config['filter']['players']
-    save_dir_path = Path(resource_path(f"./{target_player}_统计报告/"))
-    # save_dir_path.mkdir(parents=True, exist_ok=True)
+def correlation_matrices(filtered_df, methods, max_rows=0, cache_dir=None):
+    """
+    计算多种相关系数矩阵
+
+    列只转换一次数值类型、只做一次秩变换，spearman与kendall共用；
+    kendall使用O(n log n)算法。超过max_rows行时固定种子抽样（0为不抽样）。
+    cache_dir不为空时，结果按输入数据哈希缓存到该目录。
+    返回 {method: pd.DataFrame}
+    """
+    numeric = filtered_df.astype(float)
+    if max_rows and len(numeric) > max_rows:
+        numeric = numeric.sample(n=max_rows, random_state=0)
+
+    digest = hashlib.sha1(pd.util.hash_pandas_object(numeric, index=False).values.tobytes())
+    digest.update(','.join(numeric.columns).encode('utf-8'))
+    digest = digest.hexdigest()[:16]
+
+    results = {}
+    pending = []
+    for method in methods:
+        cache_file = Path(cache_dir).joinpath(f"corr_{method}_{digest}.pkl") if cache_dir else None
+        if cache_file and cache_file.exists():
+            results[method] = pd.read_pickle(cache_file)
+        else:
+            pending.append((method, cache_file))
+    if not pending:
+        return results
+
+    columns = numeric.columns
+    values = numeric.to_numpy()
+    valid = ~np.isnan(values)
+    ranks = numeric.rank().to_numpy()  # 平均秩，NaN保持不变
+
+    def rank_corr(i, j, method):
+        mask = valid[:, i] & valid[:, j]
+        if mask.sum() < 2:
+            return np.nan
+        a, b = ranks[mask, i], ranks[mask, j]
+        if method == 'kendall':
+            # kendall只依赖次序，全局秩可直接使用
+            return kendalltau(a, b).statistic
+        # spearman需要在成对有效的样本内重新求秩
+        if not np.array_equal(mask, valid[:, i]):
+            a = rankdata(a)
+        if not np.array_equal(mask, valid[:, j]):
+            b = rankdata(b)
+        if a.std() == 0 or b.std() == 0:
+            return np.nan
+        return np.corrcoef(a, b)[0, 1]
+
+    for method, cache_file in pending:
+        if method == 'pearson':
+            matrix = numeric.corr(method='pearson')
+        elif method in ('spearman', 'kendall'):
+            n = len(columns)
+            matrix = np.full((n, n), np.nan)
+            for i in range(n):
+                for j in range(i, n):
+                    matrix[i, j] = matrix[j, i] = rank_corr(i, j, method)
+            matrix = pd.DataFrame(matrix, index=columns, columns=columns)
+        else:
+            raise ValueError(f"不支持的相关系数方法: {method}")
 
-    # 按对局时间排序（确保时间顺序正确）
-    final_hanchan_df = final_hanchan_df.sort_values('对局时间').reset_index(drop=True)
-    # 计算pt变动
-    final_hanchan_df['pt变动'] = final_hanchan_df.apply(calculate_pt_change, axis=1)
+        if cache_file:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            matrix.to_pickle(cache_file)
+        results[method] = matrix
+    return results
+
+
+def compute_statistics(final_kyoku_df, final_hanchan_df):
+    """
+    计算综合统计指标（不生成文件与图表）
+
+    返回 (按时间排序并补充pt变动、rate变动的半庄数据, 全部统计指标, 小局统计指标)
+    """
+    # 按对局时间排序（确保时间顺序正确），同一小时内的对局按牌谱ID排序，结果与输入顺序无关
+    final_hanchan_df = final_hanchan_df.sort_values(['对局时间', '牌谱'], kind='stable').reset_index(drop=True)
+    # 计算pt变动（预先计算过的半庄表直接沿用）
+    if 'pt变动' not in final_hanchan_df:
+        final_hanchan_df['pt变动'] = final_hanchan_df.apply(calculate_pt_change, axis=1)
     # 计算rate变动（当前行与上一行的差值）
     final_hanchan_df['rate变动'] = final_hanchan_df['玩家rate'].diff()
     # 如果需要将首行的NaN填充为0，可以追加：
@@ -649,6 +895,10 @@ def generate_statistics(final_kyoku_df, final_hanchan_df, config):
                     (final_kyoku_df['副露'] == False), 
                     '流局时听牌'
                 ].mean(),
+        '平均配牌向听': final_kyoku_df['配牌向听'].mean(),
+        '平均听牌巡目': final_kyoku_df['听牌巡目'].mean(),
+        '副露时平均向听': final_kyoku_df.loc[final_kyoku_df['副露'], '副露时向听'].mean(),
+        '立直平均待牌数': final_kyoku_df.loc[final_kyoku_df['立直'], '立直待牌数'].mean(),
         '总收支': final_kyoku_df['收支'].sum(),
         '局收支': final_kyoku_df['收支'].mean(),
     }
@@ -668,28 +918,160 @@ def generate_statistics(final_kyoku_df, final_hanchan_df, config):
             hanchan_stats['局收支'],
         ))
     })
+    return final_hanchan_df, hanchan_stats, kyoku_stats
+
+
+def figure_base64(fig):
+    """把图表保存为PNG并返回base64字符串"""
+    img_buffer = BytesIO()
+    with PROFILE.span('PNG编码'):
+        fig.savefig(img_buffer, format='png', dpi=300)
+    plt.close(fig)  # 关闭图像，防止内存泄漏
+    return base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+
+
+def analyze_style(kyoku_stats, config):
+    """按[save]开关做四麻风格分析，返回 (风格, 风格分析图base64)，未开启时为 (None, None)"""
+    if not config['save'].get("mahjong_analyzer", False):
+        return None, None
+    model_path = config['save'].get('mahjong_analyzer_model', '')
+    mahjong_analyzer = MahjongAnalyzer(resource_path(model_path) if model_path else None)
+    data = MahjongAnalyzer.stats_to_parameters(kyoku_stats)
+    # X, Y, style = mahjong_analyzer.analyze(data=data, output_filename=resource_path(f"./{target_player}_统计报告/{target_player}_风格分析.png"))
+    X, Y, style, 风格分析图_bytes, 风格分析图_base64 = mahjong_analyzer.analyze(data=data)
+    return style, 风格分析图_base64
+
+
+# 相关性热力图使用的小局数据列
+CORRELATION_COLUMNS = ['和了', '放铳', '副露', '立直', '默听', "和了打点", "和了巡目", "放铳打点","流局时听牌","流局时得点","立直先制","立直巡目","追立","自摸","流局"]
+
+
+def plot_correlation_heatmap(correlation, method):
+    """绘制相关系数热力图，返回Figure"""
+    fig = plt.figure(figsize=(10, 8))
+    sns.heatmap(correlation, annot=True, cmap='coolwarm', fmt=".2f")
+    plt.title(f'{method}相关系数热力图')
+    plt.tight_layout()
+    return fig
+
+
+def render_charts(final_kyoku_df, final_hanchan_df, config, target_player):
+    """
+    按[save]开关生成pt变化图、rate变化图与相关系数热力图
+
+    final_hanchan_df需为compute_statistics返回的半庄数据；
+    返回 {图名: base64}，热力图的图名为"<method>相关系数热力图"
+    """
+    images = {}
+    # pt变化柱状图和折线图（可选）
+    if config['save'].get("pt_change", True):
+        with PROFILE.span('pt变化图'):
+            fig = plot_pt_changes(final_hanchan_df)
+            # fig.savefig(resource_path(f"./{target_player}_统计报告/{target_player}_pt变化图.png"), dpi=300, bbox_inches='tight')  # 保存图表
+            images['pt变化图'] = figure_base64(fig)
+        print(f"成功生成pt变化图：{target_player}_pt变化图.png")
+
+    # rate变化柱状图和折线图（可选）
+    if config['save'].get("rate_change", True):
+        first_rate = final_hanchan_df.iloc[0]['玩家rate']
+        with PROFILE.span('rate变化图'):
+            fig = plot_rate_changes(final_hanchan_df, first_rate = first_rate)
+            images['rate变化图'] = figure_base64(fig)
+        print(f"成功生成rate变化图：{target_player}_rate变化图.png")
+
+    # 相关性热力图（可选）
+    plt.rcdefaults()  # 恢复所有配置到默认值 
+    plt.rcParams['font.family'] = 'SimHei'
+    plt.rcParams['axes.unicode_minus'] = False  # 是否显示负号
+    filtered_df = final_kyoku_df[CORRELATION_COLUMNS]
+    methods = config['save'].get('statistics_methods', [])
+    try:
+        with PROFILE.span('相关系数'):
+            correlations = correlation_matrices(
+                filtered_df, methods,
+                max_rows=config['save'].get('statistics_max_rows', 0),
+                cache_dir=resource_path("paipu_data/cache"),
+            )
+    except Exception as e:
+        print(f"计算相关系数失败：{str(e)}")
+        correlations = {}
+    for method, correlation in correlations.items():
+        try:
+            with PROFILE.span('热力图'):
+                images[f'{method}相关系数热力图'] = figure_base64(plot_correlation_heatmap(correlation, method))
+            print(f"成功生成{method}相关系数热力图：{target_player}_{method}相关系数热力图.png")
+        except Exception as e:
+            plt.close()
+            print(f"生成{method}相关系数热力图失败：{str(e)}")
+    return images
+
+
+def report_images(images, style_image=None):
+    """把render_charts的结果整理为html报告的按钮顺序：pt、rate、风格分析、热力图"""
+    heatmaps = {name: image for name, image in images.items() if name.endswith('相关系数热力图')}
+    report = {name: images[name] for name in ('pt变化图', 'rate变化图') if name in images}
+    if style_image is not None:
+        report['风格分析图'] = style_image
+    # 只有一种相关系数方法时沿用原按钮名，多种方法时每种一个按钮
+    if len(heatmaps) == 1:
+        report['相关性热力图'] = next(iter(heatmaps.values()))
+    else:
+        report.update({name.replace('相关系数', '相关性'): image for name, image in heatmaps.items()})
+    return report
 
-    # 四麻风格分析（可选）
-    if config['save'].get("mahjong_analyzer", False):
-        mahjong_analyzer = MahjongAnalyzer()
-        data = {
-            'horyu_rate': kyoku_stats['和了率']*100,
-            'houju_rate': kyoku_stats['放铳率']*100,
-            'furo_rate': kyoku_stats['副露率']*100,
-            'riichi_rate': kyoku_stats['立直率']*100,
-            'dama_rate': kyoku_stats['默听率']*100,
-            'average_score': kyoku_stats['平均和了打点'],
-            'avg_horyu_turn': kyoku_stats['平均和了巡目'],
-            'avg_houju_score': kyoku_stats['平均放铳打点'],
-            'ryukyoku_rate': kyoku_stats['流局听牌率']*100,
-            'riichi_turn': kyoku_stats['平均立直巡目'],
-            'riichi_first_rate': kyoku_stats['立直先制率']*100,
-            'riichi_chase_rate': kyoku_stats['追立率']*100,
-        }
 
-        # 风格分析
-        # X, Y, style = mahjong_analyzer.analyze(data=data, output_filename=resource_path(f"./{target_player}_统计报告/{target_player}_风格分析.png"))
-        X, Y, style, 风格分析图_bytes, 风格分析图_base64= mahjong_analyzer.analyze(data=data)
+def report_sections(formatted_stats, intervals=None):
+    """
+    html报告各分段的 (标题, 统计项)，缺少的统计项（如未开启风格分析）跳过
+
+    传入intervals（bootstrap_intervals的结果）时每段为DataFrame，另有一列置信区间文字
+    """
+    sections = [
+        ("基础统计", ['有效牌谱数', '有效小局数', '平均顺位', '总pt变动', '总rate变动', '一位率', '二位率', '三位率', '四位率', '连对率', '被飞率', '和了率', '放铳率', '副露率', '立直率', '默听率', '局收支', 'tags', '风格分析结果']),
+        ("和牌数据", ['和了率', '平均和了打点', '平均和了巡目', '和牌时立直率', '和牌时副露率', '和牌自摸率']),
+        ("立直数据", ['立直率', '平均立直巡目', '立直和牌巡目', '立直先制率', '追立率', '立直后和牌率', '立直后自摸率', '立直和牌打点', '立直后放铳率', '立直后放铳打点', '立直后流局率']),
+        ("副露数据", ['副露率', '平均副露巡目', '副露和牌巡目', '副露和牌打点', '副露后放铳率', '副露后放铳打点', '副露后流局率']),
+        ("放铳数据", ['放铳率', '平均放铳巡目', '平均放铳打点', '放铳时立直率', '放铳时副露率', '放铳时门清率']),
+        ("流局数据", ['流局率', '流局听牌率', '流局平均得点', '立直流局时听牌率', '副露流局时听牌率', '门清流局时听牌率']),
+        ("手牌数据", ['平均配牌向听', '平均听牌巡目', '副露时平均向听', '立直平均待牌数']),
+        # 添加更多分段...
+    ]
+    result = []
+    for title, keys in sections:
+        values = formatted_stats[[key for key in keys if key in formatted_stats.index]]
+        if intervals is not None:
+            bounds = intervals.reindex(values.index)
+            values = values.to_frame('统计值')
+            values['置信区间'] = [format_interval(low, high) for low, high in zip(bounds['置信下限'], bounds['置信上限'])]
+        result.append((title, values))
+    return result
+
+
+def generate_statistics(final_kyoku_df, final_hanchan_df, config):
+    """生成统计报告"""
+    if final_kyoku_df.empty:
+        print("无有效数据可生成报告")
+        return pd.DataFrame()
+    
+    target_player = config['filter']['players']
+    save_dir_path = Path(resource_path(f"./{target_player}_统计报告/"))
+
+    with PROFILE.span('统计指标'):
+        final_hanchan_df, hanchan_stats, kyoku_stats = compute_statistics(final_kyoku_df, final_hanchan_df)
+
+    # 由开局时的点数状况估计终局顺位，为每个小局加上期望pt变动（可选）
+    analysis_config = config.get('analysis', {})
+    if analysis_config.get('expected_pt', True):
+        model_path = analysis_config.get('placement_model', str(PLACEMENT_MODEL_PATH))
+        with PROFILE.span('顺位预测'):
+            model = load_or_fit(resource_path(model_path) if model_path else None, final_kyoku_df, final_hanchan_df)
+            final_kyoku_df = final_kyoku_df.assign(
+                期望pt变动=model.expected_pt_changes(final_kyoku_df, final_hanchan_df, calculate_pt_change))
+
+    # 四麻风格分析（可选）
+    with PROFILE.span('风格分析'):
+        style, 风格分析图_base64 = analyze_style(kyoku_stats, config)
+    if style is not None:
         print(f"成功生成风格分析图：{target_player}_风格分析图.png")
         hanchan_stats.update({
             '风格分析结果': style,
@@ -701,140 +1083,91 @@ def generate_statistics(final_kyoku_df, final_hanchan_df, config):
         lambda x: round(x, 4) if isinstance(x, float) else x
     )
 
+    # 按半庄重抽样计算各指标的置信区间（可选）
+    intervals = None
+    resamples = analysis_config.get('bootstrap_resamples', RESAMPLES)
+    if resamples:
+        with PROFILE.span('置信区间'):
+            intervals = bootstrap_intervals(final_kyoku_df, final_hanchan_df, resamples,
+                                            analysis_config.get('confidence', CONFIDENCE))
+    # 综合统计表：有置信区间时另加 置信下限、置信上限 两列
+    stats_table = formatted_stats.to_frame('统计值')
+    if intervals is not None:
+        stats_table = stats_table.join(intervals.round(4))
+
     # try:
     if True:
-        # 生成csv文件
-        if config['save']['csv'].get('formatted_stats', False):
-            csv_file_name = resource_path(f"./{target_player}_统计报告/{target_player}_综合统计.csv")
-            formatted_stats.to_csv(csv_file_name, index=True, header=True)
-            print(f"成功生成综合统计：{target_player}_综合统计.csv")
-        if config['save']['csv'].get('final_kyoku_df', False):
-            csv_file_name = resource_path(f"./{target_player}_统计报告/{target_player}_小局原始数据.csv")
-            final_kyoku_df.to_csv(csv_file_name, index=True, header=True)
-            print(f"成功生成小局原始数据：{target_player}_小局原始数据.csv")
-        if config['save']['csv'].get('final_hanchan_df', False):
-            csv_file_name = resource_path(f"./{target_player}_统计报告/{target_player}_半庄原始数据.csv")
-            final_hanchan_df.to_csv(csv_file_name, index=True, header=True)
-            print(f"成功生成半庄原始数据：{target_player}_半庄原始数据.csv")
-
-        # 生成Excel文件
-        if config['save']['excel'].get('formatted_stats', False) \
-            or config['save']['excel'].get('final_kyoku_df', False) \
-            or config['save']['excel'].get('final_hanchan_df', False):
-            file_name = resource_path(f"./{target_player}_统计报告/{target_player}_统计报告.xlsx")
-            with pd.ExcelWriter(file_name, engine='openpyxl') as writer:
-                # 主统计表
-                if config['save']['excel'].get("formatted_stats", True):
-                    formatted_stats.to_excel(
-                        writer, 
-                        sheet_name='综合统计',
-                        index=True,
-                        header=['统计值'],
-                        index_label='统计指标'
-                    )
-                
-                # 原始数据表（可选）
-                if config['save']['excel'].get("final_kyoku_df", False):
-                    final_kyoku_df.to_excel(
-                        writer,
-                        sheet_name='小局原始数据',
-                        index=False
-                    )
-
-                # 原始数据表（可选）
-                if config['save']['excel'].get("final_hanchan_df", False):
-                    final_hanchan_df.to_excel(
-                        writer,
-                        sheet_name='半庄原始数据',
-                        index=False
-                    )
-                
-            print(f"成功生成统计报告：{target_player}_统计报告.xlsx")
+        with PROFILE.span('导出文件'):
+            if any(any(config['save'].get(fmt, {}).values()) for fmt in ('excel', 'csv', 'json', 'parquet')):
+                save_dir_path.mkdir(parents=True, exist_ok=True)
 
+            # 生成csv、json文件
+            if config['save']['csv'].get('formatted_stats', False):
+                csv_file_name = resource_path(f"./{target_player}_统计报告/{target_player}_综合统计.csv")
+                stats_table.to_csv(csv_file_name, index=True, header=True)
+                print(f"成功生成综合统计：{target_player}_综合统计.csv")
+            if config['save'].get('json', {}).get('formatted_stats', False):
+                json_file_name = resource_path(f"./{target_player}_统计报告/{target_player}_综合统计.json")
+                formatted_stats.to_json(json_file_name, force_ascii=False, indent=2)
+                print(f"成功生成综合统计：{target_player}_综合统计.json")
 
+            # 原始数据分块导出为csv、JSON Lines、Parquet
+            compression = config['save'].get('compression', '')
+            chunk_rows = config['save'].get('export_chunk_rows', CHUNK_ROWS)
+            for key, name, frame in [('final_kyoku_df', '小局原始数据', final_kyoku_df),
+                                     ('final_hanchan_df', '半庄原始数据', final_hanchan_df)]:
+                for fmt in ('csv', 'json', 'parquet'):
+                    if not config['save'].get(fmt, {}).get(key, False):
+                        continue
+                    try:
+                        with PROFILE.span(f'{name}.{fmt}'):
+                            file_path = export_frame(frame, save_dir_path / f"{target_player}_{name}", fmt,
+                                                     compression, chunk_rows)
+                    except ImportError as e:
+                        print(f"{name}导出失败：{str(e)}")
+                        continue
+                    PROFILE.count('导出行数', len(frame))
+                    print(f"成功生成{name}：{file_path.name}")
 
-        # pt变化柱状图和折线图（可选）
-        if config['save'].get("pt_change", True):
-            fig = plot_pt_changes(final_hanchan_df)
-            # fig.savefig(resource_path(f"./{target_player}_统计报告/{target_player}_pt变化图.png"), dpi=300, bbox_inches='tight')  # 保存图表
-            img_buffer = BytesIO()
-            fig.savefig(img_buffer, format='png', dpi=300)
-            img_bytes = img_buffer.getvalue()
-            pt变化图_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            print(f"成功生成pt变化图：{target_player}_pt变化图.png")
-
-        # rate变化柱状图和折线图（可选）
-        if config['save'].get("rate_change", True):
-            first_rate = final_hanchan_df.iloc[0]['玩家rate']
-            fig = plot_rate_changes(final_hanchan_df, first_rate = first_rate)
-            # fig.savefig(resource_path(f"./{target_player}_统计报告/{target_player}_rate变化图.png"), dpi=300, bbox_inches='tight')  # 保存图表
-            img_buffer = BytesIO()
-            fig.savefig(img_buffer, format='png', dpi=300)
-            img_bytes = img_buffer.getvalue()
-            rate变化图_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            print(f"成功生成rate变化图：{target_player}_rate变化图.png")
-
-        # 相关性热力图（可选）
-        plt.rcdefaults()  # 恢复所有配置到默认值 
-        plt.rcParams['font.family'] = 'SimHei'
-        plt.rcParams['axes.unicode_minus'] = False  # 是否显示负号
-        filtered_df = final_kyoku_df[['和了', '放铳', '副露', '立直', '默听', "和了打点", "和了巡目", "放铳打点","流局时听牌","流局时得点","立直先制","立直巡目","追立","自摸","流局"]]
-        methods = config['save'].get('statistics_methods', [])
-        for method in methods:
-            try:
-                # 计算相关系数
-                correlation = filtered_df.corr(method=method)
-                # 绘制热力图
-                plt.figure(figsize=(10, 8))
-                sns.heatmap(correlation, annot=True, cmap='coolwarm', fmt=".2f")
-                plt.title(f'{method}相关系数热力图')
-                # 保存图片
-                plt.tight_layout()
-                # save_path = resource_path(f"./{target_player}_统计报告/{target_player}_{method}相关系数热力图.png")
-                # plt.savefig(save_path, dpi=300, bbox_inches="tight")
-                img_buffer = BytesIO()
-                plt.savefig(img_buffer, format='png', dpi=300)
-                plt.close()  # 关闭图像，防止内存泄漏
-                img_bytes = img_buffer.getvalue()
-                相关系数热力图_base64 = base64.b64encode(img_bytes).decode('utf-8')
-                
-                print(f"成功生成{method}相关系数热力图：{target_player}_{method}相关系数热力图.png")
-            except Exception as e:
-                print(f"生成{method}相关系数热力图失败：{str(e)}")
+            # 生成Excel文件
+            if config['save']['excel'].get('formatted_stats', False) \
+                or config['save']['excel'].get('final_kyoku_df', False) \
+                or config['save']['excel'].get('final_hanchan_df', False):
+                file_name = resource_path(f"./{target_player}_统计报告/{target_player}_统计报告.xlsx")
+                workbook = ExcelExport(file_name)
+                with PROFILE.span('Excel'):
+                    # 主统计表
+                    if config['save']['excel'].get("formatted_stats", True):
+                        workbook.write_frame('综合统计', stats_table.rename_axis('统计指标').reset_index())
+
+                    # 原始数据表（可选），超过Excel行数上限时分为多个工作表
+                    if config['save']['excel'].get("final_kyoku_df", False):
+                        workbook.write_frame('小局原始数据', final_kyoku_df, chunk_rows)
+                    if config['save']['excel'].get("final_hanchan_df", False):
+                        workbook.write_frame('半庄原始数据', final_hanchan_df, chunk_rows)
+                    workbook.close()
+
+                print(f"成功生成统计报告：{target_player}_统计报告.xlsx")
+
+
+
+        # pt、rate变化图与相关性热力图
+        images = render_charts(final_kyoku_df, final_hanchan_df, config, target_player)
 
         # 生成html报告
         if config['save'].get('html', True):
-            basic_stats = formatted_stats[['有效牌谱数', '有效小局数', '平均顺位', '总pt变动', '总rate变动', '一位率', '二位率', '三位率', '四位率', '连对率', '被飞率', '和了率', '放铳率', '副露率', '立直率', '默听率', '局收支', 'tags', '风格分析结果']]
-            hand_stats = formatted_stats[['和了率', '平均和了打点', '平均和了巡目', '和牌时立直率', '和牌时副露率', '和牌自摸率']]
-            lichi_stats = formatted_stats[['立直率', '平均立直巡目', '立直和牌巡目', '立直先制率', '追立率', '立直后和牌率', '立直后自摸率', '立直和牌打点', '立直后放铳率', '立直后放铳打点', '立直后流局率']]
-            # 副露数据
-            furo_stats = formatted_stats[['副露率', '平均副露巡目', '副露和牌巡目', '副露和牌打点', '副露后放铳率', '副露后放铳打点', '副露后流局率']]
-            # 放铳数据
-            houju_stats = formatted_stats[['放铳率', '平均放铳巡目', '平均放铳打点', '放铳时立直率', '放铳时副露率', '放铳时门清率']]
-            # 流局数据
-            ryukyoku_stats = formatted_stats[['流局率', '流局听牌率', '流局平均得点', '立直流局时听牌率', '副露流局时听牌率', '门清流局时听牌率']]
-            
-            series_sections = [
-                ("基础统计", basic_stats),
-                ("和牌数据", hand_stats),
-                ("立直数据", lichi_stats),
-                ("副露数据", furo_stats),
-                ("放铳数据", houju_stats),
-                ("流局数据", ryukyoku_stats),
-                # 添加更多分段...
-            ]            
-
-            generate_html_report(
-                target_player,
-                {
-                    'pt变化图': pt变化图_base64,
-                    'rate变化图': rate变化图_base64,
-                    '风格分析图': 风格分析图_base64,
-                    '相关性热力图': 相关系数热力图_base64,
-                },  
-                series_sections,
-                resource_path(f'./{target_player}_统计报告.html')
-            )
+            sections = report_sections(formatted_stats, intervals)
+            # 按亲家、场风、本场、开局顺位、点差分组的局况统计（可选）
+            if config.get('analysis', {}).get('situation_cube', True):
+                with PROFILE.span('局况统计'):
+                    sections += situation_sections(SituationCube.from_kyoku(final_kyoku_df))
+            with PROFILE.span('html报告'):
+                generate_html_report(
+                    target_player,
+                    report_images(images, 风格分析图_base64),
+                    sections,
+                    resource_path(f'./{target_player}_统计报告.html')
+                )
             print(f"成功生成统计报告：{target_player}_统计报告.html")
 
     # except Exception as e:
@@ -843,42 +1176,53 @@ def generate_statistics(final_kyoku_df, final_hanchan_df, config):
     return formatted_stats
 
 
-def process_hanchan_stats(json_data, target_player):
-    """处理单个半庄的统计数据"""
+def process_hanchan_results(json_data):
+    """一次计算半庄全部座位的终局结果，顺位同分时按座位顺序（起家优先）"""
+    seats = len(json_data['name'])
+    sc = json_data['sc']
+    # 提取终局点数 (sc数组中的偶数索引) 与得点 (sc数组中的奇数索引)
+    scores = sc[0:2*seats:2]
+    order = sorted(range(seats), key=lambda s: (-scores[s], s))
+
+    results = [None] * seats
+    for rank, player_index in enumerate(order, start=1):  # 顺位从1开始
+        results[player_index] = {
+            'rank': rank,
+            'score': scores[player_index],
+            'delta': sc[player_index*2+1],
+            'is_negative': scores[player_index] < 0
+        }
+    return results
+
+
+def process_hanchan_stats(json_data, target_player, results=None):
+    """处理单个半庄的统计数据，可传入已计算好的process_hanchan_results结果复用"""
     # 找到目标玩家的索引
     try:
         player_index = json_data['name'].index(target_player)
     except ValueError:
         return None
 
-    # 提取终局点数 (sc数组中的偶数索引)
-    scores = json_data['sc'][::2]  # [玩家0点数, 玩家1点数, 玩家2点数, 玩家3点数]
-    target_score = scores[player_index]
-
-    # 计算顺位
-    sorted_scores = sorted(scores, reverse=True)
-    rank = sorted_scores.index(target_score) + 1  # 顺位从1开始
-
-    # 计算得点 (sc数组中的奇数索引)
-    delta = json_data['sc'][player_index*2+1]
-
-    return {
-        'rank': rank,
-        'score': target_score,
-        'delta': delta,
-        'is_negative': target_score < 0
-    }
+    if results is None:
+        results = process_hanchan_results(json_data)
+    return results[player_index]
 
 
 if __name__ == "__main__":
     # 加载配置文件
     config = load_config()
+    profile_config = config.get('profile', {})
+    PROFILE.configure(profile_config.get('enabled', False), profile_config.get('memory', False),
+                      profile_config.get('cprofile', False), resource_path('paipu_data/profile'))
 
-    # 下载牌谱
-    process_paipu_file(config["filter"]["paipu_txt"], config["filter"]["players"], config['download'].get('download_threads', 5))
+    # 下载牌谱到所有玩家共用的牌谱仓库（旧版按玩家保存的目录先移入仓库）
+    store = PaipuStore(resource_path(STORE_DIR))
+    migrate_directory(store, resource_path(f'paipu_data/{config["filter"]["players"]}'))
+    process_paipu_file(config["filter"]["paipu_txt"], config["filter"]["players"], config['download'].get('download_threads', 5),
+                       config['download'].get('retries', 2), store)
 
-    # 分析所有牌谱
-    final_kyoku_df, final_hanchan_df = analyze_directory(f'./paipu_data/{config["filter"]["players"]}', config["filter"]["players"], config)
+    # 分析该玩家的所有牌谱
+    final_kyoku_df, final_hanchan_df = analyze_directory(store, config["filter"]["players"], config)
     
     # 生成统计报告
     if not final_kyoku_df.empty:
@@ -887,6 +1231,7 @@ if __name__ == "__main__":
         # print(report)
     else:
         print("未找到符合条件的牌谱数据")
+    PROFILE.finish()
 
     # print(f'统计报告已生成，点击 {config["filter"]["players"]}_统计报告.html 查看')
     webbrowser.open(resource_path(f'{config["filter"]["players"]}_统计报告.html'))
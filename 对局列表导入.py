@@ -0,0 +1,208 @@
+"""对局列表导入：读取天凤每日对局列表存档（sccYYYYMMDD.html.gz），按玩家、日期、牌桌索引牌谱ID并生成下载任务"""
+
+import argparse
+import gzip
+import html
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+from tqdm import tqdm  # pip install tqdm
+from 天凤牌谱数据统计 import resource_path, extract_log_id, load_config
+from 牌谱查询 import TableIndex
+from 牌谱仓库 import PaipuStore, STORE_DIR
+
+INDEX_VERSION = 1
+INDEX_PATH = Path('paipu_data') / 'cache' / f'scc_index_v{INDEX_VERSION}.pkl'
+COLUMNS = ['牌谱', '对局时间', '牌桌', '玩家昵称', '顺位', 'pt']
+# 例：00:08 | 18 | 四鳳南喰赤－ | <a href="http://tenhou.net/0/?log=2023010100gm-00a9-0000-d5bfc8c1">牌譜</a> | A(+54.0) B(+8.0) C(-19.0) D(-43.0)<br>
+GAME_LINE = re.compile(r'(\d{1,2}):(\d{2}) \|[^|]*\| *(\S+?)－* *\| *<a href="[^"]*[?&]log=([\w-]+)[^"]*"[^>]*>[^<]*</a> *\| *(.*?)(?:<br>)?\s*$')
+PLAYER_SCORE = re.compile(r'(\S+)\(([-+]?\d+(?:\.\d+)?)\)')
+FILE_DATE = re.compile(r'(\d{8})')
+
+
+def parse_game_line(line, date):
+    """解析对局列表的一行，返回 (牌谱ID, 对局时间, 牌桌, [(昵称, pt), ...]按顺位排列)，不是对局行时返回None"""
+    match = GAME_LINE.search(line)
+    if not match:
+        return None
+    hour, minute, table, ref, players = match.groups()
+    start = date + timedelta(hours=int(hour), minutes=int(minute))
+    scores = [(html.unescape(name), float(pt)) for name, pt in PLAYER_SCORE.findall(players)]
+    return ref, start, table, scores
+
+
+def iter_games(file_path):
+    """逐行读取一个对局列表文件（.html.gz或.html），产出parse_game_line的结果"""
+    file_path = Path(file_path)
+    date_match = FILE_DATE.search(file_path.name)
+    if not date_match:
+        raise ValueError(f'文件名中没有日期: {file_path.name}')
+    date = datetime.strptime(date_match.group(1), '%Y%m%d')
+    opener = gzip.open if file_path.suffix == '.gz' else open
+    with opener(file_path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if 'log=' not in line:
+                continue
+            game = parse_game_line(line, date)
+            if game:
+                yield game
+
+
+def list_files(paths):
+    """paths中的对局列表文件；目录中查找scc*.html与scc*.html.gz"""
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files += sorted(p for p in path.rglob('scc*') if p.name.endswith(('.html', '.html.gz')))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+class GameListIndex:
+    """
+    对局列表中每局每名玩家一行，按(玩家昵称, 对局时间)排序并用牌谱查询.TableIndex建立索引
+
+    缓存记录已读取的文件（文件名 -> (大小, 修改时间)），update只读取新文件。
+    """
+
+    def __init__(self, frame=None, files=None):
+        self.files = dict(files or {})
+        self.frame = frame if frame is not None else pd.DataFrame(columns=COLUMNS)
+        self.index = TableIndex(self.frame, ['牌桌']) if not self.frame.empty else None
+
+    @classmethod
+    def load(cls, path=None):
+        """读取缓存文件，不存在或版本不符时返回空的GameListIndex"""
+        path = Path(path) if path else resource_path(INDEX_PATH)
+        if not path.exists():
+            return cls()
+        data = pd.read_pickle(path)
+        if data.get('version') != INDEX_VERSION:
+            print(f"缓存版本不符，重新读取: {path}")
+            return cls()
+        return cls(data['frame'], data['files'])
+
+    def save(self, path=None):
+        path = Path(path) if path else resource_path(INDEX_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle({'version': INDEX_VERSION, 'files': self.files, 'frame': self.frame}, path)
+
+    def update(self, paths):
+        """读取尚未索引（或有改动）的对局列表文件，返回新增对局数"""
+        new_files = []
+        for file_path in list_files(paths):
+            stat = file_path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.files.get(file_path.name) != signature:
+                new_files.append((file_path, signature))
+        if not new_files:
+            return 0
+
+        frame = self.frame
+        changed = {file_path.name for file_path, _ in new_files if file_path.name in self.files}
+        if changed:
+            # 文件有改动时去掉该日期原有的行再重新读取
+            dates = {pd.Timestamp(FILE_DATE.search(name).group(1)) for name in changed}
+            frame = frame[~pd.to_datetime(frame['对局时间']).dt.normalize().isin(dates)]
+
+        refs, times, tables, names, ranks, pts = [], [], [], [], [], []
+        games = 0
+        for file_path, signature in tqdm(new_files, desc='Indexing'):
+            try:
+                for ref, start, table, scores in iter_games(file_path):
+                    for rank, (name, pt) in enumerate(scores, 1):
+                        refs.append(ref)
+                        times.append(start)
+                        tables.append(table)
+                        names.append(name)
+                        ranks.append(rank)
+                        pts.append(pt)
+                    games += 1
+            except Exception as e:
+                print(f"读取错误 {file_path}: {str(e)}")
+                continue
+            self.files[file_path.name] = signature
+
+        new_frame = pd.DataFrame({
+            '牌谱': refs,
+            '对局时间': np.array(times, dtype='datetime64[s]'),
+            '牌桌': tables,
+            '玩家昵称': names,
+            '顺位': np.array(ranks, dtype=np.int8),
+            'pt': np.array(pts, dtype=np.float32),
+        }, columns=COLUMNS)
+        frame = pd.concat([frame, new_frame], ignore_index=True) if not frame.empty else new_frame
+        for column in ['牌谱', '牌桌', '玩家昵称']:
+            frame[column] = frame[column].astype(str).astype('category')
+        order = np.lexsort((frame['牌谱'].cat.codes, frame['对局时间'].to_numpy(),
+                            pd.factorize(frame['玩家昵称'].astype(str), sort=True)[0]))
+        self.frame = frame.take(order).reset_index(drop=True)
+        self.index = TableIndex(self.frame, ['牌桌'])
+        return games
+
+    @classmethod
+    def open(cls, paths, path=None):
+        """读取缓存并加入新文件，有新增时写回缓存"""
+        index = cls.load(path)
+        if index.update(paths):
+            index.save(path)
+        return index
+
+    def select(self, player=None, table=None, after=None, before=None):
+        """按条件筛选，返回符合条件的行；table可为列表"""
+        if self.index is None:
+            return self.frame.iloc[:0]
+        return self.frame.iloc[self.index.select(player, after, before, 牌桌=table)]
+
+
+def job_urls(refs):
+    return [f"http://tenhou.net/0/?log={ref}" for ref in refs]
+
+
+def write_jobs(refs, txt_path, downloaded=()):
+    """把尚未在txt_path中、也不在downloaded（已下载的牌谱ID）中的牌谱URL追加到txt_path，返回追加数"""
+    txt_path = Path(txt_path)
+    known = set(downloaded)
+    if txt_path.exists():
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            known |= {extract_log_id(line.strip()) for line in f if line.strip()}
+    urls = job_urls(ref for ref in dict.fromkeys(refs) if ref not in known)
+    if urls:
+        needs_newline = txt_path.exists() and txt_path.stat().st_size > 0 and not txt_path.read_bytes().endswith(b'\n')
+        with open(txt_path, 'a', encoding='utf-8') as f:
+            f.write(('\n' if needs_newline else '') + '\n'.join(urls) + '\n')
+    return len(urls)
+
+
+def main(argv=None):
+    config = load_config()
+    parser = argparse.ArgumentParser(description='读取天凤对局列表存档（sccYYYYMMDD.html.gz），为目标玩家生成牌谱下载任务')
+    parser.add_argument('paths', nargs='+', help='对局列表文件或目录')
+    parser.add_argument('--player', default=config['filter']['players'], help='玩家昵称，默认为config.toml中的玩家')
+    parser.add_argument('--table', nargs='*', default=config['filter']['levels'], help='牌桌，如 四鳳南喰赤，默认为config.toml中的levels')
+    parser.add_argument('--after', default=config['filter']['timeafter'], help='起始时间，如 2024-06')
+    parser.add_argument('--before', default=config['filter']['timebefore'], help='截止时间')
+    parser.add_argument('--output', default=config['filter']['paipu_txt'], help='追加牌谱URL的文件')
+    parser.add_argument('--dry-run', action='store_true', help='只显示符合条件的对局数，不写入文件')
+    args = parser.parse_args(argv)
+
+    index = GameListIndex.open(args.paths)
+    start = time.perf_counter()
+    rows = index.select(args.player, args.table or None, args.after, args.before)
+    print(f"索引共 {index.frame['牌谱'].nunique()} 局，{args.player} 符合条件的有 {len(rows)} 局"
+          f"（查询用时 {(time.perf_counter() - start) * 1000:.1f} 毫秒）")
+    if rows.empty or args.dry_run:
+        return
+    downloaded = set(PaipuStore(resource_path(STORE_DIR)).names)
+    downloaded |= {file_path.stem for file_path in resource_path(f"paipu_data/{args.player}").glob('*.json')}
+    added = write_jobs(rows['牌谱'].astype(str), resource_path(args.output), downloaded)
+    print(f"已向 {args.output} 追加 {added} 个牌谱URL，运行 天凤牌谱数据统计.py 即可下载并分析")
+
+
+if __name__ == "__main__":
+    main()
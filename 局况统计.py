@@ -0,0 +1,179 @@
+"""局况统计：按亲家、场风、局、本场、开局顺位与点差把小局指标汇总为多维统计表，可任意切片与汇总"""
+
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+
+WINDS = ['東', '南', '西', '北']
+HONBA_LABELS = ['0', '1', '2', '3+']
+# 与相邻名次的点差：一位为领先二位的点数，其余为落后上一名的点数；区间左闭右开
+GAP_EDGES = [1000, 2000, 4000, 8000, 16000]
+GAP_LABELS = ['0-1000', '1000-2000', '2000-4000', '4000-8000', '8000-16000', '16000+']
+DIMENSIONS = {
+    '场风': WINDS,
+    '局': [1, 2, 3, 4],
+    '亲家': [False, True],
+    '本场': HONBA_LABELS,
+    '开局顺位': [1, 2, 3, 4],
+    '点差': GAP_LABELS,
+}
+# 每格累计的量：小局数与各事件的次数、打点与收支之和
+ACCUMULATORS = ['小局数', '和了', '放铳', '立直', '副露', '流局', '和了打点', '放铳打点', '收支']
+# 汇总后的指标：指标名 -> (分子, 分母)
+METRICS = {
+    '小局数': ('小局数', None),
+    '和了率': ('和了', '小局数'),
+    '放铳率': ('放铳', '小局数'),
+    '立直率': ('立直', '小局数'),
+    '副露率': ('副露', '小局数'),
+    '流局率': ('流局', '小局数'),
+    '平均和了打点': ('和了打点', '和了'),
+    '平均放铳打点': ('放铳打点', '放铳'),
+    '局收支': ('收支', '小局数'),
+}
+# html报告中的局况统计表：(标题, 分组维度, 切片条件)
+REPORT_SECTIONS = [
+    ('亲家/子家', ['亲家'], {}),
+    ('场风', ['场风'], {}),
+    ('本场', ['本场'], {}),
+    ('开局顺位', ['开局顺位'], {}),
+    ('与相邻名次点差', ['点差'], {}),
+    ('南4局开局顺位', ['开局顺位'], {'场风': '南', '局': 4}),
+]
+
+
+def kyoku_states(final_kyoku_df):
+    """取出 (局数, 本场, 四家点数矩阵)，兼容场次/四家点数为列表的小局表与KyokuStore的紧凑格式"""
+    if '场次' in final_kyoku_df:
+        rounds = np.array(final_kyoku_df['场次'].tolist(), dtype=np.int64).reshape(-1, 3)
+        kyoku, honba = rounds[:, 0], rounds[:, 1]
+        # 三麻的四家点数只有3个（逐牌谱生成）或第4个为0（列式存储），统一补为4列
+        scores = final_kyoku_df['四家点数'].tolist()
+        try:
+            scores = np.array(scores, dtype=float).reshape(len(scores), -1)
+        except ValueError:  # 三麻、四麻混合时长度不一
+            scores = pd.DataFrame(scores).to_numpy(dtype=float)
+        if scores.shape[1] < 4:
+            scores = np.hstack([scores, np.full((len(scores), 4 - scores.shape[1]), np.nan)])
+    else:
+        kyoku = final_kyoku_df['局数'].to_numpy(dtype=np.int64)
+        honba = final_kyoku_df['本场'].to_numpy(dtype=np.int64)
+        scores = final_kyoku_df[[f'点数{i}' for i in range(4)]].to_numpy(dtype=float, copy=True)
+    three_player = final_kyoku_df['牌桌'].astype(str).str.startswith('三').to_numpy()
+    scores[three_player, 3] = np.nan
+    return kyoku, honba, scores
+
+
+def neighbour_gaps(scores, seats):
+    """
+    各行座位seats在开局时的顺位、落后上一名与领先下一名的点数（向量化），没有上一名/下一名时为inf
+
+    同分时座位序号小（起家优先）的名次在前，与终局顺位的规则相同；缺席的座位（三麻）点数为NaN。
+    """
+    rows = np.arange(len(scores))
+    present = ~np.isnan(scores)
+    scores = np.where(present, scores, -np.inf)
+    own = scores[rows, seats]
+    seat_ids = np.arange(scores.shape[1])
+    above = (scores > own[:, None]) | ((scores == own[:, None]) & (seat_ids < seats[:, None]))
+    below = present & ~above
+    below[rows, seats] = False
+    rank = above.sum(axis=1) + 1
+    behind = np.where(above, scores, np.inf).min(axis=1) - own
+    ahead = own - np.where(below, scores, -np.inf).max(axis=1)
+    return rank, behind, ahead
+
+
+def score_positions(scores, seats):
+    """各行座位seats在开局时的顺位与与相邻名次的点差：一位为领先二位的点数，其余为落后上一名的点数"""
+    rank, behind, ahead = neighbour_gaps(scores, seats)
+    return rank, np.where(rank == 1, ahead, behind)
+
+
+class SituationCube:
+    """
+    局况统计表：每个非空格（DIMENSIONS各维度的一种组合）一行，记录ACCUMULATORS的累计值
+
+    维度列为category，累计值为整数，最多3072行，与小局数无关。
+    select按条件切片，rollup按指定维度汇总并计算METRICS。
+    """
+
+    def __init__(self, cells):
+        self.cells = cells
+
+    @classmethod
+    def from_kyoku(cls, final_kyoku_df):
+        """一次分组遍历生成局况统计表：各行算出所在格的编号后，每个累计量一次bincount"""
+        if final_kyoku_df.empty:
+            return cls(pd.DataFrame(columns=list(DIMENSIONS) + ACCUMULATORS))
+        kyoku, honba, scores = kyoku_states(final_kyoku_df)
+        seats = final_kyoku_df['玩家位置'].to_numpy(dtype=np.int64)
+        rank, gap = score_positions(scores, seats)
+        codes = [
+            np.minimum(kyoku // 4, len(WINDS) - 1),
+            kyoku % 4,
+            (kyoku % 4 == seats).astype(np.int64),
+            np.minimum(honba, len(HONBA_LABELS) - 1),
+            rank - 1,
+            np.searchsorted(GAP_EDGES, gap, side='right'),
+        ]
+        shape = tuple(len(values) for values in DIMENSIONS.values())
+        cell = np.ravel_multi_index(codes, shape)
+        size = int(np.prod(shape))
+
+        def flag(name):
+            return final_kyoku_df[name].to_numpy(dtype=float, na_value=0)
+
+        weights = {
+            '和了': flag('和了'), '放铳': flag('放铳'), '立直': flag('立直'), '副露': flag('副露'), '流局': flag('流局'),
+            '和了打点': flag('和了打点'), '放铳打点': np.abs(flag('放铳打点')), '收支': flag('收支'),
+        }
+        totals = {'小局数': np.bincount(cell, minlength=size)}
+        for name, values in weights.items():
+            totals[name] = np.bincount(cell, weights=values, minlength=size)
+        filled = np.flatnonzero(totals['小局数'])
+
+        data = {}
+        for (name, labels), index in zip(DIMENSIONS.items(), np.unravel_index(filled, shape)):
+            data[name] = pd.Categorical.from_codes(index, labels)
+        for name in ACCUMULATORS:
+            data[name] = totals[name][filled].astype(np.int64)
+        return cls(pd.DataFrame(data))
+
+    def select(self, **conditions):
+        """按维度切片，如 select(场风='南', 局=4, 开局顺位=4)；条件可为列表"""
+        cells = self.cells
+        for name, value in conditions.items():
+            if name not in DIMENSIONS:
+                raise KeyError(f'没有该维度: {name}')
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            cells = cells[cells[name].isin(values)]
+        return SituationCube(cells)
+
+    def rollup(self, by=(), **conditions):
+        """切片后按by中的维度汇总，返回各组的METRICS（DataFrame）；by为空时返回全部合计的Series"""
+        cells = self.select(**conditions).cells if conditions else self.cells
+        by = list(by)
+        if by:
+            totals = cells.groupby(by, observed=True)[ACCUMULATORS].sum()
+        else:
+            totals = cells[ACCUMULATORS].sum().to_frame().T
+        result = pd.DataFrame(index=totals.index)
+        for name, (numerator, denominator) in METRICS.items():
+            if denominator is None:
+                result[name] = totals[numerator]
+            else:
+                result[name] = totals[numerator] / totals[denominator].where(totals[denominator] > 0)
+        return result if by else result.iloc[0]
+
+
+def situation_sections(cube, sections=REPORT_SECTIONS):
+    """html报告的局况统计分段 (标题, DataFrame)，没有数据的分段跳过"""
+    result = []
+    for title, by, conditions in sections:
+        table = cube.rollup(by, **conditions)
+        if table.empty:
+            continue
+        if '亲家' in by:
+            table = table.rename(index={True: '亲家', False: '子家'}, level='亲家')
+        result.append((f'局况：{title}', table.round(4)))
+    return result
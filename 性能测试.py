@@ -0,0 +1,193 @@
+"""性能测试：用合成牌谱分别测量各处理阶段的耗时，结果保存为JSON，可与基准结果比较"""
+
+import argparse
+import copy
+import json
+import logging
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import matplotlib.pyplot as plt  # pip install matplotlib
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+from 天凤牌谱数据统计 import (resource_path, load_config, process_paipu, analyze_directory, generate_statistics,
+                       compute_statistics, correlation_matrices, figure_base64, plot_correlation_heatmap,
+                       report_sections, calculate_pt_change, CORRELATION_COLUMNS, JSON_BACKEND)
+from pt变化图生成 import plot_pt_changes
+from rate变化图生成 import plot_rate_changes
+from 四麻风格分析 import MahjongAnalyzer
+from html网页生成 import generate_html_report
+from 牌谱生成 import generate_logs
+from 置信区间 import bootstrap_intervals
+from 顺位预测 import PlacementModel
+
+BENCH_PLAYER = 'player1'
+DATA_DIR = Path('benchmark_data')  # 不放在paipu_data中，以免合成牌谱混入排行榜、牌谱查询等的扫描
+NOISE_FLOOR = 0.01  # 比较基准时忽略绝对差值小于该秒数的变化
+
+
+def bench_config(config):
+    """性能测试用配置：目标玩家为合成牌谱中的BENCH_PLAYER，不限牌桌与时间，不写出任何文件"""
+    config = copy.deepcopy(config)
+    config['filter'].update(players=BENCH_PLAYER, levels=[],
+                            timeafter=datetime(1970, 1, 1), timebefore=datetime(2099, 12, 31))
+    save = config['save']
+    for key in ('mahjong_analyzer', 'pt_change', 'rate_change', 'html'):
+        save[key] = False
+    save['statistics_methods'] = []
+    for output in ('excel', 'csv', 'json', 'parquet'):
+        save[output] = {key: False for key in save.get(output, {})}
+    return config
+
+
+def timed(func, repeat=1):
+    """运行repeat次，返回 (最后一次的结果, 各次耗时)"""
+    result = None
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def record(times, items):
+    """一个阶段的结果：最短耗时、中位数耗时、处理量与每秒处理量"""
+    best = min(times)
+    return {'seconds': round(best, 6), 'median': round(statistics.median(times), 6), 'runs': len(times),
+            'items': items, 'per_second': round(items / best, 2) if best > 0 else None}
+
+
+def run_benchmark(size, config, seed=0, repeat=3, sample=1000):
+    """
+    生成（或复用）size个合成牌谱并测量各阶段，返回 {阶段名: 结果}
+
+    process_paipu只处理前sample个牌谱；process_paipu与analyze_directory本身已覆盖大量牌谱，只运行一次，
+    其余阶段运行repeat次取最短耗时。
+    """
+    directory = resource_path(DATA_DIR / f'{size}_{seed}')
+    start = time.perf_counter()
+    files = generate_logs(directory, size, seed=seed, player=BENCH_PLAYER)
+    print(f"合成牌谱 {size} 个：{directory}（{time.perf_counter() - start:.1f} 秒）")
+    config = bench_config(config)
+    results = {}
+
+    sample_files = files[:sample]
+    _, times = timed(lambda: [process_paipu(file_path, BENCH_PLAYER, config) for file_path in sample_files])
+    results['process_paipu'] = record(times, len(sample_files))
+
+    (kyoku_df, hanchan_df), times = timed(lambda: analyze_directory(directory, BENCH_PLAYER, config))
+    results['analyze_directory'] = record(times, size)
+
+    _, times = timed(lambda: generate_statistics(kyoku_df, hanchan_df, config), repeat)
+    results['generate_statistics'] = record(times, len(kyoku_df))
+    hanchan_df, hanchan_stats, kyoku_stats = compute_statistics(kyoku_df, hanchan_df)
+    _, times = timed(lambda: bootstrap_intervals(kyoku_df, hanchan_df), repeat)
+    results['bootstrap_intervals'] = record(times, len(hanchan_df))
+    model = PlacementModel()
+    _, times = timed(lambda: model.fit(kyoku_df, hanchan_df), repeat)
+    results['PlacementModel.fit'] = record(times, len(kyoku_df))
+    _, times = timed(lambda: model.expected_pt_changes(kyoku_df, hanchan_df, calculate_pt_change), repeat)
+    results['expected_pt_changes'] = record(times, len(kyoku_df))
+
+    images = {}
+    images['pt变化图'], times = timed(lambda: figure_base64(plot_pt_changes(hanchan_df)), repeat)
+    results['plot_pt_changes'] = record(times, len(hanchan_df))
+    first_rate = hanchan_df.iloc[0]['玩家rate']
+    images['rate变化图'], times = timed(lambda: figure_base64(plot_rate_changes(hanchan_df, first_rate=first_rate)), repeat)
+    results['plot_rate_changes'] = record(times, len(hanchan_df))
+
+    methods = ['pearson', 'spearman', 'kendall']
+    correlations, times = timed(lambda: correlation_matrices(kyoku_df[CORRELATION_COLUMNS], methods), repeat)
+    results['correlation_matrices'] = record(times, len(kyoku_df))
+    images['相关性热力图'], times = timed(lambda: figure_base64(plot_correlation_heatmap(correlations['spearman'], 'spearman')), repeat)
+    results['plot_correlation_heatmap'] = record(times, 1)
+
+    analyzer = MahjongAnalyzer()
+    data = MahjongAnalyzer.stats_to_parameters(kyoku_stats)
+    result, times = timed(lambda: analyzer.analyze(data=data), repeat)
+    images['风格分析图'] = result[-1]
+    hanchan_stats['风格分析结果'] = result[2]
+    results['MahjongAnalyzer.analyze'] = record(times, 1)
+
+    formatted_stats = pd.Series(hanchan_stats).apply(lambda x: round(x, 4) if isinstance(x, float) else x)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp) / 'report.html'
+        _, times = timed(lambda: generate_html_report(BENCH_PLAYER, images, report_sections(formatted_stats), output_path), repeat)
+    results['generate_html_report'] = record(times, 1)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """与基准结果比较，返回退步的 (规模, 阶段, 基准耗时, 当前耗时) 列表"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, current in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            before, after = base['seconds'], current['seconds']
+            change = after / before - 1 if before > 0 else 0
+            flag = ''
+            if change > tolerance and after - before > NOISE_FLOOR:
+                regressions.append((size, stage, before, after))
+                flag = '  <- 退步'
+            print(f"{size:>8} {stage:<26} {before:>10.4f} -> {after:>10.4f} 秒 ({change:+.1%}){flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='性能测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='合成牌谱数，如 1000 10000 100000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='较快的阶段重复运行次数，取最短耗时')
+    parser.add_argument('--sample', type=int, default=1000, help='process_paipu测量的牌谱数')
+    parser.add_argument('--output', default='benchmark.json', help='结果JSON文件')
+    parser.add_argument('--baseline', help='基准结果JSON文件，有阶段退步时返回非0')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的耗时增加比例')
+    args = parser.parse_args(argv)
+
+    plt.switch_backend('Agg')
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    config = load_config()
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run_benchmark(size, config, args.seed, args.repeat, args.sample)
+        for stage, result in results[str(size)].items():
+            print(f"{size:>8} {stage:<26} {result['seconds']:>10.4f} 秒  {result['per_second'] or 0:>12.1f} /秒")
+
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'json_backend': JSON_BACKEND,
+            'hand_metrics': config.get('analysis', {}).get('hand_metrics', True),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output_path = resource_path(args.output)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output_path}")
+
+    if args.baseline:
+        with open(resource_path(args.baseline), 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} 个阶段耗时增加超过 {args.tolerance:.0%}")
+            sys.exit(1)
+        print("没有阶段退步")
+
+
+if __name__ == "__main__":
+    main()
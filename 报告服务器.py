@@ -0,0 +1,338 @@
+"""统计报告服务器：在浏览器中按玩家、牌桌、时间等条件查看统计报告，数据来自牌谱查询的缓存"""
+
+import argparse
+import hashlib
+import html
+import json
+import threading
+import time
+import webbrowser
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+import pandas as pd  # pip install pandas
+from 天凤牌谱数据统计 import (load_config, compute_statistics, analyze_style, render_charts, report_images,
+                       report_sections)
+from 置信区间 import bootstrap_intervals, RESAMPLES, CONFIDENCE
+from 局况统计 import SituationCube, situation_sections
+from html网页生成 import render_html_report
+from 牌谱查询 import PaipuArchive, WINDS
+
+# 查询参数，顺序即缓存键的顺序；取值含义同PaipuArchive.select
+FILTER_KEYS = ['player', 'table', 'after', 'before', 'seat', 'wind', 'dealer']
+
+
+class LRUCache:
+    """线程安全的LRU缓存"""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def parse_filters(query):
+    """
+    把查询字符串转换为PaipuArchive.select的参数，返回 (参数字典, 缓存键)
+
+    时间统一为pd.Timestamp的字符串形式，写法不同的同一条件（如2024-06与2024-06-01）共用缓存；
+    参数不合法时抛出ValueError。
+    """
+    params = parse_qs(query)
+    filters = {}
+    for key in FILTER_KEYS:
+        value = params.get(key, [''])[0].strip()
+        if not value:
+            continue
+        if key == 'seat':
+            value = int(value)
+            if not 0 <= value <= 3:
+                raise ValueError(f"玩家位置应为0-3: {value}")
+        elif key == 'dealer':
+            value = value.lower() in ('1', 'true', 'yes', '是')
+        elif key == 'wind' and value not in WINDS:
+            raise ValueError(f"场风应为{'/'.join(WINDS)}: {value}")
+        elif key in ('after', 'before'):
+            value = str(pd.Timestamp(value))
+        filters[key] = value
+    return filters, tuple(filters.get(key) for key in FILTER_KEYS)
+
+
+class ReportService:
+    """
+    按筛选条件计算统计、渲染图表与报告，并缓存结果
+
+    综合统计与图表以 (数据版本, 筛选条件) 为键放入LRU缓存。加入新牌谱后，涉及的玩家与
+    不指定玩家的查询数据版本加1，对应的旧缓存不再命中（由LRU自然淘汰），ETag随之改变；
+    其他玩家的缓存不受影响。matplotlib不是线程安全的，渲染在锁内串行进行。
+    """
+
+    def __init__(self, archive, config, cache_size=32, directory='paipu_data'):
+        self.archive = archive
+        self.config = config
+        self.directory = directory
+        self.started = time.time_ns()  # 重启后旧ETag全部失效
+        self.generation = 0  # 不指定玩家的查询的数据版本
+        self.versions = {}  # 玩家昵称 -> 该玩家的数据版本
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.RLock()
+
+    def refresh(self, files=None):
+        """
+        加入新牌谱（files为None时扫描目录），有新增时写回缓存
+
+        返回新牌谱涉及的玩家昵称集合
+        """
+        with self.lock:
+            known = set(self.archive.refs)
+            if not self.archive.update(self.directory, self.config, files):
+                return set()
+            self.archive.save()
+            hanchan = self.archive.hanchan
+            players = set(hanchan.loc[hanchan['牌谱'].isin(self.archive.refs - known), '玩家昵称'].astype(str))
+            self.generation += 1
+            for player in players:
+                self.versions[player] = self.versions.get(player, 0) + 1
+            return players
+
+    def version(self, key):
+        player = key[0]  # FILTER_KEYS的第一项
+        return self.generation if player is None else self.versions.get(player, 0)
+
+    def etag(self, route, key):
+        digest = hashlib.sha1(repr((self.started, self.version(key), route, key)).encode('utf-8'))
+        return f'"{digest.hexdigest()[:20]}"'
+
+    def _compute(self, filters):
+        """返回 (综合统计, 小局统计, 半庄数据, 小局数据)，无数据时返回None"""
+        kyoku_df, hanchan_df = self.archive.select(**filters)
+        if kyoku_df.empty or hanchan_df.empty:
+            return None
+        hanchan_df, hanchan_stats, kyoku_stats = compute_statistics(kyoku_df, hanchan_df)
+        formatted_stats = pd.Series(hanchan_stats).apply(lambda x: round(x, 4) if isinstance(x, float) else x)
+        return formatted_stats, kyoku_stats, hanchan_df, kyoku_df
+
+    def statistics(self, filters, key):
+        """综合统计（Series），无数据时返回None"""
+        cache_key = ('stats', self.version(key), key)
+        cached = self.cache.get(('report', self.version(key), key)) or self.cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+        with self.lock:
+            result = self._compute(filters)
+        stats = result[0] if result else None
+        self.cache.put(cache_key, (stats,))
+        return stats
+
+    def report(self, filters, key):
+        """
+        综合统计、图表与html报告分段，返回 (综合统计, {按钮名: 图片base64}, 分段列表)，无数据时各项为None
+
+        置信区间与局况统计按config.toml的[analysis]计算（bootstrap_resamples为0、situation_cube为false时不计算），
+        与完整运行的报告一致。
+        """
+        cache_key = ('report', self.version(key), key)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        with self.lock:
+            cached = self.cache.get(cache_key)  # 等锁期间可能已由其他请求渲染
+            if cached is not None:
+                return cached
+            result = self._compute(filters)
+            if result is None:
+                cached = (None, None, None)
+            else:
+                formatted_stats, kyoku_stats, hanchan_df, kyoku_df = result
+                title = report_title(filters)
+                style, style_image = analyze_style(kyoku_stats, self.config)
+                if style is not None:
+                    formatted_stats['风格分析结果'] = style
+                images = render_charts(kyoku_df, hanchan_df, self.config, title)
+                analysis_config = self.config.get('analysis', {})
+                intervals = None
+                resamples = analysis_config.get('bootstrap_resamples', RESAMPLES)
+                if resamples:
+                    intervals = bootstrap_intervals(kyoku_df, hanchan_df, resamples,
+                                                    analysis_config.get('confidence', CONFIDENCE))
+                sections = report_sections(formatted_stats, intervals)
+                if analysis_config.get('situation_cube', True):
+                    sections += situation_sections(SituationCube.from_kyoku(kyoku_df))
+                cached = (formatted_stats, report_images(images, style_image), sections)
+            self.cache.put(cache_key, cached)
+            return cached
+
+    def report_html(self, filters, key):
+        stats, images, sections = self.report(filters, key)
+        if stats is None:
+            return None
+        return render_html_report(report_title(filters), images, sections)
+
+    def index_html(self, min_games=10, limit=100):
+        """首页：筛选表单与对局数最多的玩家列表"""
+        with self.lock:
+            board = self.archive.seat_table().leaderboard(min_games) if len(self.archive.refs) else pd.DataFrame()
+        rows = []
+        for name, row in board.head(limit).iterrows():
+            link = '/report?' + urlencode({'player': name})
+            rows.append(f'<tr><td><a href="{html.escape(link)}">{html.escape(str(name))}</a></td>'
+                        f'<td>{row["对局数"]}</td><td>{row["平均顺位"]:.3f}</td>'
+                        f'<td>{html.escape(str(row["最新段位"]))}</td><td>{row["最新rate"]:.0f}</td></tr>')
+        wind_options = ''.join(f'<option>{wind}</option>' for wind in WINDS)
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>天凤牌谱统计报告</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; background-color: #f8f9fa; }}
+        form, table {{ background: #ffffff; padding: 20px; border-radius: 15px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); margin-bottom: 20px; }}
+        input, select {{ margin: 4px 12px 4px 4px; }}
+        td, th {{ padding: 4px 12px; text-align: left; }}
+    </style>
+</head>
+<body>
+    <h2>天凤牌谱统计报告</h2>
+    <p>已缓存 {len(self.archive.refs)} 个牌谱</p>
+    <form action="/report" method="get">
+        玩家<input name="player">
+        牌桌<input name="table" placeholder="四鳳南喰赤">
+        起始时间<input name="after" placeholder="2024-06">
+        截止时间<input name="before">
+        玩家位置<select name="seat"><option></option><option>0</option><option>1</option><option>2</option><option>3</option></select>
+        场风<select name="wind"><option></option>{wind_options}</select>
+        亲家<select name="dealer"><option></option><option value="1">是</option><option value="0">否</option></select>
+        <button type="submit">生成报告</button>
+    </form>
+    <table>
+        <tr><th>玩家</th><th>对局数</th><th>平均顺位</th><th>段位</th><th>rate</th></tr>
+        {''.join(rows)}
+    </table>
+</body>
+</html>"""
+
+
+def report_title(filters):
+    """报告标题：玩家昵称加上其余筛选条件"""
+    parts = [filters.get('player', '全部玩家')]
+    if 'table' in filters:
+        parts.append(filters['table'])
+    if 'after' in filters or 'before' in filters:
+        after, before = (filters.get(key, '').removesuffix(' 00:00:00') for key in ('after', 'before'))
+        parts.append(f"{after}~{before}")
+    if 'seat' in filters:
+        parts.append(f"位置{filters['seat']}")
+    if 'wind' in filters:
+        parts.append(f"{filters['wind']}场")
+    if 'dealer' in filters:
+        parts.append('亲家' if filters['dealer'] else '子家')
+    return ' '.join(parts)
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    /             首页
+    /report?...   统计报告（html网页生成的模板）
+    /stats?...    综合统计（JSON）
+    响应带ETag，浏览器带If-None-Match再次请求同一条件时直接返回304
+    """
+
+    service = None  # 由serve设置
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path not in ('/', '/report', '/stats'):
+            self._send(404, '页面不存在'.encode('utf-8'), 'text/plain; charset=utf-8')
+            return
+        try:
+            filters, key = parse_filters(url.query)
+        except ValueError as e:
+            self._send(400, f'参数错误: {e}'.encode('utf-8'), 'text/plain; charset=utf-8')
+            return
+
+        etag = self.service.etag(url.path, key)
+        if etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        if url.path == '/':
+            body, content_type = self.service.index_html(), 'text/html; charset=utf-8'
+        elif url.path == '/report':
+            body, content_type = self.service.report_html(filters, key), 'text/html; charset=utf-8'
+        else:
+            stats = self.service.statistics(filters, key)
+            body = None if stats is None else json.dumps(stats.to_dict(), ensure_ascii=False, default=str)
+            content_type = 'application/json; charset=utf-8'
+        if body is None:
+            self._send(404, '没有符合条件的数据'.encode('utf-8'), 'text/plain; charset=utf-8')
+            return
+        self._send(200, body.encode('utf-8'), content_type, etag)
+
+    def _send(self, status, body, content_type, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')  # 每次都向服务器确认，未变化时为304
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+
+def serve(service, host='127.0.0.1', port=8000):
+    """启动服务器，直到Ctrl+C"""
+    handler = type('Handler', (ReportHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"统计报告服务器已启动：http://{host}:{port}/  （Ctrl+C退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return server
+
+
+def main(argv=None):
+    config = load_config()
+    server_config = config.get('server', {})
+    parser = argparse.ArgumentParser(description='统计报告服务器')
+    parser.add_argument('--host', default=server_config.get('host', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=server_config.get('port', 8000))
+    parser.add_argument('--cache-size', type=int, default=server_config.get('cache_size', 32), help='缓存的报告数')
+    parser.add_argument('--no-browser', action='store_true', help='不自动打开浏览器')
+    args = parser.parse_args(argv)
+
+    archive = PaipuArchive.open('paipu_data', config)
+    service = ReportService(archive, config, args.cache_size)
+    if not args.no_browser:
+        player = config['filter']['players']
+        threading.Timer(1, webbrowser.open, [f"http://{args.host}:{args.port}/report?{urlencode({'player': player})}"]).start()
+    serve(service, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
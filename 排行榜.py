@@ -0,0 +1,161 @@
+"""全座位半庄数据：从全部牌谱中提取每个座位的结果，生成排行榜与对战记录"""
+
+import sys
+from pathlib import Path
+import pandas as pd  # pip install pandas
+from tqdm import tqdm  # pip install tqdm
+from 天凤牌谱数据统计 import (resource_path, decode_paipu, parse_ref_time, process_hanchan_results,
+                       calculate_pt_change, load_config)
+
+SEAT_COLUMNS = ['牌谱', '牌桌', '对局时间', '玩家昵称', '玩家位置', '玩家段位', '玩家rate',
+                'rank', 'score', 'delta', 'is_negative', 'pt变动']
+# paipu_data下不存放牌谱的子目录：缓存（顺位预测模型等）、运行记录，以及旧版性能测试的合成牌谱
+SKIP_DIRS = {'cache', 'profile', 'benchmark'}
+
+
+def paipu_files(directory):
+    """
+    目录中的全部牌谱文件（含牌谱仓库与各玩家子目录），跳过SKIP_DIRS中的非牌谱目录
+
+    同一牌谱在多个目录中出现时只返回一个（文件名即牌谱ID），返回 牌谱ID -> 文件路径。
+    """
+    path = Path(directory)
+    files = {}
+    for file_path in sorted(path.rglob('*.json')):
+        if SKIP_DIRS.intersection(file_path.relative_to(path).parts[:-1]):
+            continue
+        files.setdefault(file_path.stem, file_path)
+    return files
+
+
+def iter_seat_rows(paipu):
+    """产出一个牌谱中每个座位的半庄结果，顺序同SEAT_COLUMNS"""
+    names = paipu['name']
+    rule_disp = ("四" if len(names) == 4 else "三") + paipu['rule']['disp']
+    game_time = parse_ref_time(paipu['ref'])
+    for seat, result in enumerate(process_hanchan_results(paipu)):
+        row = {'牌桌': rule_disp, '玩家段位': paipu['dan'][seat], 'rank': result['rank']}
+        yield (paipu['ref'], rule_disp, game_time, names[seat], seat, paipu['dan'][seat], paipu['rate'][seat],
+               result['rank'], result['score'], result['delta'], result['is_negative'], calculate_pt_change(row))
+
+
+class SeatTable:
+    """
+    以(牌谱, 玩家位置)为键的全座位半庄表
+
+    按玩家昵称、对局时间排序，并建立昵称到行范围的索引，按玩家查询只需切片。
+    """
+
+    def __init__(self, frame):
+        frame = frame.drop_duplicates(['牌谱', '玩家位置'])
+        self.frame = frame.sort_values(['玩家昵称', '对局时间', '牌谱'], kind='stable').reset_index(drop=True)
+        names = self.frame['玩家昵称'].to_numpy()
+        starts = self.frame.index[self.frame['玩家昵称'].ne(self.frame['玩家昵称'].shift())].to_numpy()
+        stops = list(starts[1:]) + [len(self.frame)]
+        self.index = {names[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    @classmethod
+    def from_directory(cls, directory='paipu_data', config=None):
+        """
+        一次遍历目录（含牌谱仓库与各玩家子目录）下全部牌谱
+
+        同一牌谱在多个目录中出现时只读取一次（文件名即牌谱ID），缓存等非牌谱目录跳过；
+        传入config时按其[filter]中的牌桌级别与时间过滤，不按玩家过滤。
+        """
+        files = paipu_files(resource_path(directory))
+
+        rows = []
+        for file_path in tqdm(files.values(), desc='Processing'):
+            try:
+                with open(file_path, 'rb') as f:
+                    paipu = decode_paipu(f.read())
+                seat_rows = list(iter_seat_rows(paipu))
+            except Exception as e:
+                print(f"处理错误 {file_path}: {str(e)}")
+                continue
+            if config and not _match_filter(seat_rows[0], config):
+                continue
+            rows.extend(seat_rows)
+        return cls(pd.DataFrame.from_records(rows, columns=SEAT_COLUMNS))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def player(self, name):
+        """某玩家的全部半庄（按时间排序）"""
+        start, stop = self.index.get(name, (0, 0))
+        return self.frame.iloc[start:stop]
+
+    def rate_trajectory(self, name):
+        """某玩家每局开始时的rate，以对局时间为索引"""
+        games = self.player(name)
+        return pd.Series(games['玩家rate'].to_numpy(), index=pd.to_datetime(games['对局时间']), name=name)
+
+    def leaderboard(self, min_games=1):
+        """全部玩家的排行榜，按对局数、平均顺位排序"""
+        grouped = self.frame.groupby('玩家昵称', sort=False)
+        board = pd.DataFrame({
+            '对局数': grouped.size(),
+            '平均顺位': grouped['rank'].mean(),
+            '一位率': grouped['rank'].agg(lambda rank: (rank == 1).mean()),
+            '四位率': grouped['rank'].agg(lambda rank: (rank == 4).mean()),
+            '被飞率': grouped['is_negative'].mean(),
+            '总pt变动': grouped['pt变动'].sum(),
+            '起始rate': grouped['玩家rate'].first(),
+            '最新rate': grouped['玩家rate'].last(),
+            '最新段位': grouped['玩家段位'].last(),
+            '最后对局时间': grouped['对局时间'].last(),
+        })
+        board['rate变动'] = board['最新rate'] - board['起始rate']
+        board = board[board['对局数'] >= min_games]
+        return board.sort_values(['对局数', '平均顺位'], ascending=[False, True])
+
+    def head_to_head(self, name_a, name_b):
+        """两名玩家同桌对局的记录"""
+        games = self.player(name_a).merge(self.player(name_b), on='牌谱', suffixes=('_a', '_b'))
+        return pd.Series({
+            '同桌对局数': len(games),
+            f'{name_a}顺位在前': int((games['rank_a'] < games['rank_b']).sum()),
+            f'{name_b}顺位在前': int((games['rank_b'] < games['rank_a']).sum()),
+            f'{name_a}平均顺位': games['rank_a'].mean(),
+            f'{name_b}平均顺位': games['rank_b'].mean(),
+            '平均点差': (games['score_a'] - games['score_b']).mean(),
+        }, name=f'{name_a} vs {name_b}')
+
+    def opponents(self, name, min_games=1):
+        """某玩家对所有同桌过的玩家的对战记录"""
+        own = self.player(name)[['牌谱', 'rank', 'score']]
+        others = self.frame[self.frame['牌谱'].isin(own['牌谱']) & (self.frame['玩家昵称'] != name)]
+        games = others.merge(own, on='牌谱', suffixes=('', '_self'))
+        grouped = games.groupby('玩家昵称')
+        record = pd.DataFrame({
+            '同桌对局数': grouped.size(),
+            '顺位在前': grouped.apply(lambda g: (g['rank_self'] < g['rank']).sum(), include_groups=False),
+            '顺位在后': grouped.apply(lambda g: (g['rank_self'] > g['rank']).sum(), include_groups=False),
+            '自己平均顺位': grouped['rank_self'].mean(),
+            '对手平均顺位': grouped['rank'].mean(),
+            '平均点差': grouped.apply(lambda g: (g['score_self'] - g['score']).mean(), include_groups=False),
+        })
+        record = record[record['同桌对局数'] >= min_games]
+        return record.sort_values('同桌对局数', ascending=False)
+
+
+def _match_filter(row, config):
+    """按[filter]的牌桌级别与时间过滤（row为iter_seat_rows产出的元组）"""
+    levels = config['filter']['levels']
+    if levels and row[1] not in levels:
+        return False
+    game_time = pd.Timestamp(row[2]).to_pydatetime()
+    return config['filter']['timeafter'] <= game_time <= config['filter']['timebefore']
+
+
+if __name__ == "__main__":
+    config = load_config()
+    table = SeatTable.from_directory('paipu_data', config)
+    board = table.leaderboard(min_games=int(sys.argv[1]) if len(sys.argv) > 1 else 1)
+    board.to_csv(resource_path('排行榜.csv'), encoding='utf-8-sig')
+    print(board.head(30))
+    print(f"共 {len(board)} 名玩家，排行榜已保存到 排行榜.csv")
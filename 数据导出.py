@@ -0,0 +1,228 @@
+"""数据导出：把小局、半庄数据分块写出为CSV（可gzip/zstd压缩）、JSON Lines、Parquet或Excel，不生成整份输出的中间结果"""
+
+import datetime
+import gzip
+import io
+from pathlib import Path
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+from openpyxl import Workbook  # pip install openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+try:
+    import pyarrow as pa  # pip install pyarrow（导出Parquet时需要）
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import zstandard  # pip install zstandard（导出zstd压缩的CSV时需要）
+except ImportError:
+    zstandard = None
+
+CHUNK_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_576  # Excel每个工作表的行数上限（含表头）
+EXCEL_DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+EXCEL_SCALARS = (str, int, float, bool, np.number, np.bool_, datetime.date)  # 可直接写入单元格的类型
+COMPRESSION_SUFFIXES = {'': '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def iter_chunks(frame, chunk_rows=CHUNK_ROWS):
+    """按行切分DataFrame（切片不复制数据），空表时产出它本身以便写出表头"""
+    chunk_rows = max(int(chunk_rows), 1)
+    if frame.empty:
+        yield frame
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+def open_text(path, compression=''):
+    """以UTF-8文本方式打开写入文件，compression为''、'gzip'或'zstd'"""
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if compression == 'zstd':
+        raw = open(path, 'wb')
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(raw), encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def arrow_schema(frame):
+    """
+    推断整张表的Arrow schema
+
+    object列（如默听、立直先制）在某一块中可能全为None，按块推断会得到null类型而与其他块不符，
+    因此用各列第一个非空值所在的行一起推断。
+    """
+    positions = {0}
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            valid = frame[column].notna().to_numpy()
+            if valid.any():
+                positions.add(int(np.argmax(valid)))
+    return pa.Schema.from_pandas(frame.iloc[sorted(positions)], preserve_index=False)
+
+
+class CsvExport:
+    """分块写CSV，只在第一块写表头；index与DataFrame.to_csv相同"""
+
+    def __init__(self, path, compression='', index=True):
+        self.file = open_text(path, compression)
+        self.index = index
+        self.header = True
+
+    def write(self, chunk):
+        chunk.to_csv(self.file, header=self.header, index=self.index)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesExport:
+    """分块写JSON Lines，每行一条记录"""
+
+    def __init__(self, path, compression=''):
+        self.file = open_text(path, compression)
+
+    def write(self, chunk):
+        if len(chunk):
+            self.file.write(chunk.to_json(orient='records', lines=True, force_ascii=False, date_format='iso'))
+            self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExport:
+    """每块写为一个行组；schema未指定时用第一块推断"""
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema
+        self.writer = None
+
+    def write(self, chunk):
+        table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression='zstd')
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def excel_values(column):
+    """把一列转换为可写入Excel的Python值列表：缺失值为None，列表等对象转为字符串"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    if pd.api.types.is_datetime64_any_dtype(column.dtype):
+        values = column.astype(object).tolist()
+        return [None if value is pd.NaT else value.to_pydatetime() for value in values]
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+        # 可空整数、布尔等扩展类型的缺失值为pd.NA，openpyxl无法写入，转为None
+        return [None if value is None else (value if isinstance(value, EXCEL_SCALARS) else str(value))
+                for value in column.to_numpy(dtype=object, na_value=None).tolist()]
+    if column.dtype.kind in 'biu':
+        return column.tolist()
+    if column.dtype.kind == 'f':
+        return [None if value != value else value for value in column.tolist()]
+    return [None if value is None or value != value else (value if isinstance(value, EXCEL_SCALARS) else str(value))
+            for value in column.to_numpy(dtype=object).tolist()]
+
+
+class ExcelExport:
+    """
+    openpyxl只写模式的Excel导出：每行写入后立即序列化到临时文件，内存占用不随行数增长
+
+    一张表超过Excel行数上限时自动续写到"表名_2"、"表名_3"……；表头加粗并冻结，
+    列宽与日期列的格式在每张工作表上只设置一次（每列一个带格式的单元格反复使用），不逐个单元格设置。
+    """
+
+    def __init__(self, path, max_rows=EXCEL_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.workbook = Workbook(write_only=True)
+        self.sheets = []
+
+    def _new_sheet(self, name, columns, formats, widths):
+        number = sum(sheet == name or sheet.startswith(f'{name}_') for sheet in self.sheets)
+        title = name if number == 0 else f'{name}_{number + 1}'
+        sheet = self.workbook.create_sheet(title[:31])
+        self.sheets.append(title)
+        sheet.freeze_panes = 'A2'
+        for i, width in enumerate(widths, 1):
+            sheet.column_dimensions[get_column_letter(i)].width = width
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, str(column))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+        templates = {}
+        for i, number_format in formats.items():
+            templates[i] = WriteOnlyCell(sheet)
+            templates[i].number_format = number_format
+        return sheet, templates
+
+    def write_frame(self, name, frame, chunk_rows=CHUNK_ROWS):
+        """写入一张表（不含index），返回使用的工作表数"""
+        formats = {i: EXCEL_DATETIME_FORMAT for i, dtype in enumerate(frame.dtypes)
+                   if pd.api.types.is_datetime64_any_dtype(dtype)}
+        widths = [min(max(len(str(column)) * 2 + 2, 10), 40) for column in frame.columns]
+        sheet, templates = self._new_sheet(name, frame.columns, formats, widths)
+        sheets, rows = 1, 1
+        for chunk in iter_chunks(frame, chunk_rows):
+            for row in zip(*(excel_values(chunk[column]) for column in chunk.columns)):
+                if rows >= self.max_rows:
+                    sheet, templates = self._new_sheet(name, frame.columns, formats, widths)
+                    sheets, rows = sheets + 1, 1
+                if templates:
+                    row = list(row)
+                    for i, cell in templates.items():
+                        if row[i] is not None:
+                            cell.value = row[i]
+                            row[i] = cell
+                sheet.append(row)
+                rows += 1
+        return sheets
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+def export_frame(frame, path, fmt, compression='', chunk_rows=CHUNK_ROWS):
+    """
+    把DataFrame分块写到path（自动加扩展名），返回实际文件路径
+
+    fmt为'csv'、'json'（JSON Lines）或'parquet'；compression用于csv与json，为''、'gzip'或'zstd'，
+    zstd未安装时改用gzip。Parquet每chunk_rows行一个行组。
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f'不支持的压缩格式: {compression}')
+    if compression == 'zstd' and zstandard is None:
+        print("未安装zstandard，改用gzip压缩（pip install zstandard）")
+        compression = 'gzip'
+    path = Path(path)
+    if fmt == 'parquet':
+        if pq is None:
+            raise ImportError("导出Parquet需要pyarrow（pip install pyarrow）")
+        path = path.with_name(path.name + '.parquet')
+        exporter = ParquetExport(path, arrow_schema(frame))
+    elif fmt == 'json':
+        path = path.with_name(path.name + '.jsonl' + COMPRESSION_SUFFIXES[compression])
+        exporter = JsonLinesExport(path, compression)
+    elif fmt == 'csv':
+        path = path.with_name(path.name + '.csv' + COMPRESSION_SUFFIXES[compression])
+        exporter = CsvExport(path, compression)
+    else:
+        raise ValueError(f'不支持的导出格式: {fmt}')
+    try:
+        for chunk in iter_chunks(frame, chunk_rows):
+            exporter.write(chunk)
+    finally:
+        exporter.close()
+    return path
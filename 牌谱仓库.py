@@ -0,0 +1,158 @@
+"""牌谱仓库：所有玩家共用的牌谱存储，同一牌谱只保存一份，并按牌谱中的昵称建立玩家索引"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+STORE_DIR = Path('paipu_data') / 'store'
+INDEX_FILE = 'index.jsonl'
+
+
+class PaipuStore:
+    """
+    按牌谱ID存放牌谱：<root>/<牌谱ID的sha1前两位>/<牌谱ID>.json
+
+    index.jsonl每行记录一个牌谱ID与其中的玩家昵称（取自牌谱的name），只追加不改写；
+    读取时建立 昵称 -> 牌谱ID列表 的索引。add可在下载线程中调用。
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = Path(root)
+        self.names = {}  # 牌谱ID -> 昵称列表
+        self.players = {}  # 昵称 -> 牌谱ID列表（按加入顺序）
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        index_path = self.root / INDEX_FILE
+        if not index_path.exists():
+            return
+        with open(index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 空行或写入中断的行
+                self._index(entry['ref'], entry['name'])
+
+    def _index(self, ref, names):
+        if ref in self.names:
+            return
+        self.names[ref] = names
+        for name in dict.fromkeys(names):
+            self.players.setdefault(name, []).append(ref)
+
+    def __contains__(self, ref):
+        return ref in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def path(self, ref):
+        shard = hashlib.sha1(ref.encode('utf-8')).hexdigest()[:2]
+        return self.root / shard / f'{ref}.json'
+
+    def files(self, player):
+        """该玩家参与的全部牌谱文件"""
+        return [self.path(ref) for ref in self.players.get(player, [])]
+
+    def add(self, ref, content, names):
+        """保存牌谱原始字节并记入索引，返回文件路径；已有该牌谱时不重复保存"""
+        path = self.path(ref)
+        if ref in self.names:
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)  # 先写临时文件再改名，中断时不会留下不完整的牌谱
+        with self._lock:
+            if ref not in self.names:
+                with open(self.root / INDEX_FILE, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'ref': ref, 'name': list(names)}, ensure_ascii=False) + '\n')
+                self._index(ref, list(names))
+        return path
+
+    def import_files(self, files, move=True):
+        """把已有的牌谱文件（文件名为牌谱ID）加入仓库，move=True时删除原文件；返回新加入数"""
+        count = 0
+        for file_path in files:
+            file_path = Path(file_path)
+            ref = file_path.stem
+            if ref not in self:
+                try:
+                    with open(file_path, 'rb') as f:
+                        content = f.read()
+                    self.add(ref, content, json.loads(content).get('name', []))
+                except Exception as e:
+                    print(f"处理错误 {file_path}: {str(e)}")
+                    continue
+                count += 1
+            if move:
+                file_path.unlink()
+        return count
+
+    def rebuild(self):
+        """按仓库中的文件重新生成索引（索引文件丢失或损坏时使用），返回牌谱数"""
+        self.names, self.players = {}, {}
+        entries = []
+        for file_path in sorted(self.root.glob('*/*.json')):
+            try:
+                with open(file_path, 'rb') as f:
+                    names = json.loads(f.read()).get('name', [])
+            except Exception as e:
+                print(f"处理错误 {file_path}: {str(e)}")
+                continue
+            entries.append(json.dumps({'ref': file_path.stem, 'name': names}, ensure_ascii=False) + '\n')
+            self._index(file_path.stem, names)
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_path = self.root / f'{INDEX_FILE}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(entries)
+        os.replace(temp_path, self.root / INDEX_FILE)
+        return len(self.names)
+
+
+def migrate_directory(store, directory):
+    """把旧版按玩家保存的目录（paipu_data/<昵称>）中的牌谱移入仓库，返回新加入数"""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    files = sorted(directory.glob('*.json'))
+    if not files:
+        return 0
+    count = store.import_files(files)
+    print(f"已将 {directory} 中的 {len(files)} 个牌谱移入牌谱仓库（新增 {count} 个）")
+    return count
+
+
+def main(argv=None):
+    from 天凤牌谱数据统计 import resource_path, load_config
+    parser = argparse.ArgumentParser(description='牌谱仓库')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help='把按玩家保存的旧目录移入仓库')
+    migrate.add_argument('directories', nargs='*', help='默认为paipu_data/<config.toml中的玩家>')
+    subparsers.add_parser('rebuild', help='按仓库中的文件重新生成玩家索引')
+    players = subparsers.add_parser('players', help='列出牌谱最多的玩家')
+    players.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    store = PaipuStore(resource_path(STORE_DIR))
+    if args.command == 'migrate':
+        directories = args.directories or [f"paipu_data/{load_config()['filter']['players']}"]
+        for directory in directories:
+            migrate_directory(store, resource_path(directory))
+    elif args.command == 'rebuild':
+        print(f"索引已重建，共 {store.rebuild()} 个牌谱")
+    else:
+        ranking = sorted(store.players.items(), key=lambda item: -len(item[1]))[:args.top]
+        for name, refs in ranking:
+            print(f"{name}: {len(refs)}")
+    print(f"牌谱仓库共 {len(store)} 个牌谱，{len(store.players)} 名玩家")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""天凤牌谱回放：按实际顺序重演每个小局，维护各家34种牌的计数手牌"""
+
+import json
+import sys
+import time
+import concurrent.futures
+from collections import namedtuple
+from functools import lru_cache
+from pathlib import Path
+
+# 牌编码：11-19万 21-29筒 31-39索 41-47字 51/52/53赤五；转换为0-33的牌种序号
+TILE_KIND = [-1] * 54
+for _suit in range(3):
+    for _number in range(9):
+        TILE_KIND[(_suit + 1) * 10 + _number + 1] = _suit * 9 + _number
+for _number in range(7):
+    TILE_KIND[41 + _number] = 27 + _number
+TILE_KIND[51], TILE_KIND[52], TILE_KIND[53] = 4, 13, 22
+
+TSUMOGIRI = 60  # 出牌数组中的摸切
+KAN_PLACEHOLDER = 0  # 大明杠后出牌数组中的占位
+MELD_ACTIONS = {'c': '吃', 'p': '碰', 'm': '明杠', 'a': '暗杠', 'k': '加杠', 'f': '拔北'}
+
+# 回放中的一步。hands、melds、rivers、riichi是回放过程中原地更新的列表，需要保留时请自行复制
+#   kyoku: 小局序号  seat: 行动的玩家  turn: 该玩家的巡目（从1开始）
+#   action: '摸牌'/'打牌'/'立直'/'吃'/'碰'/'明杠'/'暗杠'/'加杠'/'拔北'，小局结束时为结果（'和了'、'流局'等）
+#   tile: 摸、打或鸣的牌（天凤编码），结束时为None
+#   hands: 各家34种牌的张数  melds: 各家副露数  rivers: 各家牌河（牌种序号）  riichi: 各家是否已立直
+ReplayState = namedtuple('ReplayState', ['kyoku', 'seat', 'turn', 'action', 'tile', 'hands', 'melds', 'rivers', 'riichi'])
+
+
+@lru_cache(maxsize=4096)
+def parse_meld(meld):
+    """
+    解析副露字符串，返回 (类型字母, 标记位置, 标记后的牌, 全部牌元组)
+
+    标记字母后的两位数字为鸣入或加杠的牌，标记位置表示牌的来源（碰、明杠）
+    """
+    for pos, char in enumerate(meld):
+        if char in MELD_ACTIONS:
+            digits = meld[:pos] + meld[pos + 1:]
+            tiles = tuple(int(digits[i:i + 2]) for i in range(0, len(digits), 2))
+            return char, pos, int(meld[pos + 1:pos + 3]), tiles
+    raise ValueError(f'无法解析的副露: {meld}')
+
+
+def _meld_source(seat, kind, pos, meld_len, players):
+    """根据标记位置计算被鸣牌的玩家：最前为上家，中间为对家，最后为下家"""
+    if kind == 'c' or pos == 0:
+        return (seat - 1) % players
+    if pos == meld_len - 3:
+        return (seat + 1) % players
+    return (seat + 2) % players
+
+
+def _kyoku_steps(draws, discards, players, seat, draw_index, discard_index, need_draw=True, strict=False):
+    """
+    只推进各家数组下标，按实际顺序产出 (玩家, 动作, 牌, 副露字符串)
+
+    同一张打牌可能对应多个待鸣的副露（例如下家吃与对家碰同种牌），此时按碰杠优先的顺序
+    对每个候选做一次试回放（strict=True），取第一个能把所有数组恰好走完的。
+    """
+    drawn = None
+    while True:
+        if need_draw:
+            i = draw_index[seat]
+            if i >= len(draws[seat]):
+                break
+            drawn = draws[seat][i]
+            if drawn.__class__ is str:
+                raise ValueError(f'玩家{seat}: 副露{drawn}没有对应的打牌')
+            draw_index[seat] = i + 1
+            yield seat, '摸牌', drawn, None
+
+        i = discard_index[seat]
+        if i >= len(discards[seat]):
+            break  # 自摸或九种九牌
+        action = discards[seat][i]
+        discard_index[seat] = i + 1
+
+        if action.__class__ is str and action[0] != 'r':
+            # 暗杠、加杠、拔北，之后摸岭上牌
+            kind, pos, tile, tiles = parse_meld(action)
+            yield seat, MELD_ACTIONS[kind], tile, action
+            need_draw = True
+            continue
+
+        if action.__class__ is str:
+            code = int(action[1:])
+            name = '立直'
+        else:
+            code = action
+            name = '打牌'
+        tile = drawn if code == TSUMOGIRI else code
+        drawn = None
+        yield seat, name, tile, None
+
+        # 鸣这张牌的候选：下一个摸牌项是以这张牌为鸣入牌、来源为当前玩家的副露
+        tile_kind = TILE_KIND[tile]
+        candidates = []
+        for offset in range(1, players):
+            other = (seat + offset) % players
+            j = draw_index[other]
+            if j < len(draws[other]) and draws[other][j].__class__ is str:
+                meld = draws[other][j]
+                kind, pos, called, tiles = parse_meld(meld)
+                if TILE_KIND[called] == tile_kind and _meld_source(other, kind, pos, len(meld), players) == seat:
+                    candidates.append((kind == 'c', other, kind, meld))
+        if not candidates:
+            seat = (seat + 1) % players
+            need_draw = True
+            continue
+
+        candidates.sort()
+        caller, kind, meld = candidates[0][1:]
+        if len(candidates) > 1:
+            for candidate in candidates:
+                if _claim_consistent(draws, discards, players, candidate[1], candidate[3], draw_index, discard_index):
+                    caller, kind, meld = candidate[1:]
+                    break
+
+        draw_index[caller] += 1
+        yield caller, MELD_ACTIONS[kind], tile, meld
+        seat = caller
+        if kind == 'm':
+            j = discard_index[seat]
+            if j < len(discards[seat]) and discards[seat][j] == KAN_PLACEHOLDER:
+                discard_index[seat] = j + 1
+            need_draw = True
+        else:
+            need_draw = False
+
+    if strict and (any(draw_index[s] < len(draws[s]) for s in range(players))
+                   or any(discard_index[s] < len(discards[s]) for s in range(players))):
+        raise ValueError('回放结束时仍有未处理的摸牌或出牌')
+
+
+def _claim_consistent(draws, discards, players, caller, meld, draw_index, discard_index):
+    """试回放：假设caller用meld鸣牌，检查之后的数组能否恰好走完"""
+    draw_index = draw_index[:]
+    discard_index = discard_index[:]
+    draw_index[caller] += 1
+    need_draw = 'm' in meld
+    if need_draw and discard_index[caller] < len(discards[caller]) and discards[caller][discard_index[caller]] == KAN_PLACEHOLDER:
+        discard_index[caller] += 1
+    try:
+        for _ in _kyoku_steps(draws, discards, players, caller, draw_index, discard_index, need_draw, strict=True):
+            pass
+    except ValueError:
+        return False
+    return True
+
+
+def iter_kyoku_states(game, players=4, kyoku=0):
+    """
+    按出牌顺序回放一个小局（天凤mjlog2json格式的game数组），逐步产出ReplayState
+
+    game[4..15]为各家配牌、摸牌、出牌数组；吃碰明杠在摸牌数组中，暗杠加杠与立直在出牌数组中。
+    """
+    hands = [[0] * 34 for _ in range(4)]
+    for seat in range(players):
+        hand = hands[seat]
+        for tile in game[4 + 3*seat]:
+            hand[TILE_KIND[tile]] += 1
+    melds = [0] * 4
+    rivers = [[] for _ in range(4)]
+    riichi = [False] * 4
+
+    draws = [game[5 + 3*seat] for seat in range(4)]
+    discards = [game[6 + 3*seat] for seat in range(4)]
+    dealer = game[0][0] % 4  # 三麻的局序号也按四人编号
+    try:
+        for seat, action, tile, meld in _kyoku_steps(draws, discards, players, dealer, [0] * 4, [0] * 4):
+            hand = hands[seat]
+            if action == '摸牌':
+                hand[TILE_KIND[tile]] += 1
+            elif meld is None:
+                # 打牌、立直
+                hand[TILE_KIND[tile]] -= 1
+                rivers[seat].append(TILE_KIND[tile])
+                if action == '立直':
+                    riichi[seat] = True
+                yield ReplayState(kyoku, seat, len(rivers[seat]), action, tile, hands, melds, rivers, riichi)
+                continue
+            else:
+                kind, pos, called, tiles = parse_meld(meld)
+                if kind in ('k', 'f'):
+                    hand[TILE_KIND[called]] -= 1
+                else:
+                    for t in tiles:
+                        hand[TILE_KIND[t]] -= 1
+                    if kind != 'a':
+                        hand[TILE_KIND[called]] += 1  # tiles包含鸣入的牌，它不在手中
+                    melds[seat] += 1
+            yield ReplayState(kyoku, seat, len(rivers[seat]) + 1, action, tile, hands, melds, rivers, riichi)
+    except ValueError as e:
+        raise ValueError(f'第{kyoku}局 {e}') from None
+
+    yield ReplayState(kyoku, None, None, game[16][0], None, hands, melds, rivers, riichi)
+
+
+def replay_paipu(paipu):
+    """惰性回放整场牌谱的所有小局"""
+    players = len(paipu['name'])
+    for kyoku, game in enumerate(paipu['log']):
+        yield from iter_kyoku_states(game, players, kyoku)
+
+
+def count_actions(paipu):
+    """示例归约函数：统计各类动作的次数"""
+    counts = {}
+    for state in replay_paipu(paipu):
+        counts[state.action] = counts.get(state.action, 0) + 1
+    return counts
+
+
+def _replay_file(args):
+    file_path, reducer, decoder = args
+    with open(file_path, 'rb') as f:
+        return reducer(decoder(f.read()))
+
+
+def replay_files(files, reducer=count_actions, processes=1, decoder=json.loads, chunksize=32):
+    """
+    对每个牌谱文件回放并用reducer归约，按文件顺序产出结果
+
+    生成器无法跨进程传递，多进程模式下reducer在子进程中消费回放结果，只返回可pickle的汇总。
+    reducer、decoder需为模块级函数；processes为1时在当前进程中运行，None时使用全部CPU。
+    """
+    tasks = ((file_path, reducer, decoder) for file_path in files)
+    if processes == 1:
+        yield from map(_replay_file, tasks)
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_replay_file, tasks, chunksize=chunksize)
+
+
+if __name__ == "__main__":
+    directory = Path(sys.argv[1] if len(sys.argv) > 1 else 'paipu_data')
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    files = sorted(directory.glob('*.json'))
+    start = time.perf_counter()
+    total = {}
+    for counts in replay_files(files, processes=processes):
+        for action, n in counts.items():
+            total[action] = total.get(action, 0) + n
+    elapsed = time.perf_counter() - start
+    print(f"回放 {len(files)} 个牌谱，{sum(total.values())} 步，用时 {elapsed:.2f} 秒"
+          f"（{len(files) / max(elapsed, 1e-9):.0f} 牌谱/秒）")
+    print(total)
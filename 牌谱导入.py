@@ -0,0 +1,417 @@
+"""mjlog导入：把天凤原始mjlog XML（可为gzip压缩或打包为zip）离线转换为mjlog2json格式的牌谱"""
+
+import argparse
+import collections
+import concurrent.futures
+import gzip
+import json
+import os
+import zipfile
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import unquote
+from tqdm import tqdm  # pip install tqdm
+
+DAN_NAMES = ['新人', '９級', '８級', '７級', '６級', '５級', '４級', '３級', '２級', '１級',
+             '初段', '二段', '三段', '四段', '五段', '六段', '七段', '八段', '九段', '十段', '天鳳']
+YAKU_NAMES = [
+    '門前清自摸和', '立直', '一発', '槍槓', '嶺上開花', '海底摸月', '河底撈魚', '平和', '断幺九', '一盃口',
+    '自風 東', '自風 南', '自風 西', '自風 北', '場風 東', '場風 南', '場風 西', '場風 北', '役牌 白', '役牌 發',
+    '役牌 中', '両立直', '七対子', '混全帯幺九', '一気通貫', '三色同順', '三色同刻', '三槓子', '対々和', '三暗刻',
+    '小三元', '混老頭', '二盃口', '純全帯幺九', '混一色', '清一色', '人和', '天和', '地和', '大三元',
+    '四暗刻', '四暗刻単騎', '字一色', '緑一色', '清老頭', '九蓮宝燈', '純正九蓮宝燈', '国士無双', '国士無双１３面', '大四喜',
+    '小四喜', '四槓子', 'ドラ', '裏ドラ', '赤ドラ',
+]
+LIMIT_NAMES = ['', '満貫', '跳満', '倍満', '三倍満', '役満']
+RYUUKYOKU_TYPES = {'yao9': '九種九牌', 'reach4': '四家立直', 'ron3': '三家和了', 'kan4': '四槓散了',
+                   'kaze4': '四風連打', 'nm': '流し満貫'}
+DRAW_TAGS = 'TUVW'  # 各家摸牌标签
+DISCARD_TAGS = 'DEFG'  # 各家打牌标签
+RED_FIVES = {16: 51, 52: 52, 88: 53}  # 赤五的牌ID
+MJLOG_SUFFIXES = ('.mjlog', '.xml')
+
+
+def tile_code(tile, aka=True):
+    """mjlog的牌ID(0-135)转换为mjlog2json的牌编码"""
+    if aka and tile in RED_FIVES:
+        return RED_FIVES[tile]
+    kind = tile // 4
+    if kind < 27:
+        return (kind // 9 + 1) * 10 + kind % 9 + 1
+    return 41 + kind - 27
+
+
+def rule_disp(game_type):
+    """GO标签的type转换为牌桌名（不含"四"、"三"），如 169 -> 鳳南喰赤"""
+    level = {0x00: '般', 0x80: '上', 0x20: '特', 0xA0: '鳳'}[game_type & 0xA0]
+    disp = level + ('南' if game_type & 0x08 else '東')
+    if not game_type & 0x04:
+        disp += '喰'
+    if not game_type & 0x02:
+        disp += '赤'
+    if game_type & 0x40:
+        disp += '速'
+    return disp
+
+
+def decode_meld(m):
+    """
+    解析N标签的m值，返回 (类型, 牌ID列表, 鸣入的牌, 来源相对位置)
+
+    类型：c吃 p碰 k加杠（鸣入的牌为加杠的牌） m大明杠 a暗杠 f拔北；相对位置1为下家、2为对家、3为上家
+    """
+    from_who = m & 3
+    if m & 0x4:
+        base, called = divmod(m >> 10, 3)
+        base = base // 7 * 9 + base % 7
+        tiles = [((m >> (3 + 2*i)) & 3) + 4 * (base + i) for i in range(3)]
+        return 'c', tiles, tiles[called], from_who
+    if m & 0x18:
+        unused = (m >> 5) & 3
+        base, called = divmod(m >> 9, 3)
+        tiles = [4*base + i for i in range(4) if i != unused]
+        if m & 0x8:
+            return 'p', tiles, tiles[called], from_who
+        return 'k', tiles + [4*base + unused], 4*base + unused, from_who
+    if m & 0x20:
+        return 'f', [m >> 8], m >> 8, 0
+    tile = m >> 8
+    tiles = [tile // 4 * 4 + i for i in range(4)]
+    return ('m' if from_who else 'a'), tiles, tile, from_who
+
+
+def _insert_marker(codes, marker, players, from_who):
+    """按鸣牌来源插入标记：上家的牌在最前，下家的牌在最后，对家的牌在第一张之后（三麻没有对家）"""
+    parts = [str(code) for code in codes]
+    if from_who == 3 or (players == 3 and from_who == 2):
+        index = 0
+    elif from_who == 1:
+        index = len(parts)
+    else:
+        index = 1
+    parts.insert(index, marker)
+    return ''.join(parts)
+
+
+class _KyokuBuilder:
+    """按标签顺序累积一个小局的mjlog2json数组"""
+
+    def __init__(self, attrs, players, aka):
+        seed = [int(x) for x in attrs['seed'].split(',')]
+        dealer = int(attrs['oya'])
+        kyoku = seed[0]
+        if players == 3 and kyoku % 4 != dealer:
+            kyoku = kyoku // 3 * 4 + dealer  # 三麻的局序号统一为东1-3为0-2、南1-3为4-6
+        scores = [int(x) * 100 for x in attrs['ten'].split(',')]
+        self.players = players
+        self.aka = aka
+        self.dealer = dealer
+        self.honba = seed[1]
+        self.head = [[kyoku, seed[1], seed[2]], (scores + [0] * 4)[:4], [tile_code(seed[5], aka)], []]
+        self.hands = []
+        for seat in range(4):
+            tiles = sorted(int(x) for x in attrs.get(f'hai{seat}', '').split(',') if x) if seat < players else []
+            self.hands.append([tile_code(tile, aka) for tile in tiles])
+        self.draws = [[] for _ in range(4)]
+        self.discards = [[] for _ in range(4)]
+        self.last_draw = [None] * 4
+        self.reach = [False] * 4
+        self.pons = [{} for _ in range(4)]  # 牌种 -> 碰的字符串，加杠时使用
+        self.result = []
+
+    def draw(self, seat, tile):
+        self.draws[seat].append(tile_code(tile, self.aka))
+        self.last_draw[seat] = tile
+
+    def discard(self, seat, tile):
+        code = 60 if tile == self.last_draw[seat] else tile_code(tile, self.aka)
+        if self.reach[seat]:
+            code = f'r{code}'
+            self.reach[seat] = False
+        self.discards[seat].append(code)
+        self.last_draw[seat] = None
+
+    def meld(self, seat, m):
+        kind, tiles, called, from_who = decode_meld(m)
+        code = lambda tile: tile_code(tile, self.aka)
+        if kind == 'c':
+            others = [code(tile) for tile in tiles if tile != called]
+            self.draws[seat].append(f'c{code(called)}{others[0]}{others[1]}')
+            self.last_draw[seat] = None
+        elif kind == 'p':
+            others = [code(tile) for tile in tiles if tile != called]
+            meld = _insert_marker(others, f'p{code(called)}', self.players, from_who)
+            self.pons[seat][called // 4] = meld
+            self.draws[seat].append(meld)
+            self.last_draw[seat] = None
+        elif kind == 'm':
+            others = [code(tile) for tile in tiles if tile != called]
+            self.draws[seat].append(_insert_marker(others, f'm{code(called)}', self.players, from_who))
+            self.discards[seat].append(0)  # 大明杠在出牌数组中占位
+            self.last_draw[seat] = None
+        elif kind == 'k':
+            pon = self.pons[seat].pop(called // 4, None)
+            if pon is None:
+                pon = 'p' + ''.join(str(code(tile)) for tile in tiles[:3])
+            self.discards[seat].append(pon.replace('p', f'k{code(called)}', 1))
+        elif kind == 'a':
+            codes = [str(code(tile)) for tile in tiles]
+            self.discards[seat].append(''.join(codes[:3]) + 'a' + codes[3])
+        else:
+            self.discards[seat].append(f'f{code(called)}')
+
+    def agari(self, attrs):
+        who, from_who = int(attrs['who']), int(attrs['fromWho'])
+        deltas = _deltas(attrs['sc'])
+        if 'doraHaiUra' in attrs:
+            self.head[3] = [tile_code(int(x), self.aka) for x in attrs['doraHaiUra'].split(',')]
+        if not self.result:
+            self.result = ['和了']
+        pao = int(attrs.get('paoWho', who))
+        self.result += [deltas, [who, from_who, pao, self._agari_text(attrs, who, from_who, deltas)] + _yaku_list(attrs)]
+
+    def _agari_text(self, attrs, who, from_who, deltas):
+        fu, points, limit = (int(x) for x in attrs['ten'].split(','))
+        yaku = [int(x) for x in attrs.get('yaku', '').split(',') if x]
+        han = sum(yaku[1::2])
+        head = LIMIT_NAMES[limit] if limit else f'{fu}符{han}飜'
+        if who != from_who:
+            return f'{head}{points}点'
+        payments = [-deltas[seat] - 100 * self.honba for seat in range(self.players) if seat != who]
+        if who == self.dealer:
+            return f'{head}{max(payments)}点∀'
+        dealer_payment = -deltas[self.dealer] - 100 * self.honba
+        return f'{head}{min(payments)}-{dealer_payment}点'
+
+    def ryuukyoku(self, attrs):
+        kind = attrs.get('type')
+        deltas = _deltas(attrs['sc'])
+        if kind == 'nm':
+            self.result = [RYUUKYOKU_TYPES[kind], deltas]
+        elif kind:
+            self.result = [RYUUKYOKU_TYPES[kind]]
+        else:
+            tenpai = sum(f'hai{seat}' in attrs for seat in range(self.players))
+            if tenpai == self.players:
+                self.result = ['全員聴牌']
+            elif tenpai == 0:
+                self.result = ['全員不聴']
+            else:
+                self.result = ['流局', deltas]
+
+    def build(self):
+        game = list(self.head)
+        for seat in range(4):
+            game += [self.hands[seat], self.draws[seat], self.discards[seat]]
+        game.append(self.result)
+        return game
+
+
+def _deltas(sc):
+    values = sc.split(',')
+    return ([int(float(x)) * 100 for x in values[1::2]] + [0] * 4)[:4]
+
+
+def _yaku_list(attrs):
+    yaku = [int(x) for x in attrs.get('yaku', '').split(',') if x]
+    names = [f'{YAKU_NAMES[yaku[i]]}({yaku[i + 1]}飜)' for i in range(0, len(yaku), 2) if yaku[i + 1]]
+    names += [f'{YAKU_NAMES[int(x)]}(役満)' for x in attrs.get('yakuman', '').split(',') if x]
+    return names
+
+
+def _final_scores(owari):
+    # owari为 终局点数（百点单位）, pt 交替排列，点数与INIT的ten一样换算为完整点数
+    values = owari.split(',')
+    return [float(x) if i % 2 else int(x) * 100 for i, x in enumerate(values)]
+
+
+def convert_mjlog(source, ref=''):
+    """
+    把一个mjlog XML转换为mjlog2json格式的dict
+
+    source: XML的bytes（gzip压缩的也可）或文件对象；ref: 牌谱ID（XML中不含，一般取自文件名）
+    用iterparse逐个标签处理，不建立整棵XML树。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        if source[:2] == b'\x1f\x8b':
+            source = gzip.decompress(source)
+        source = BytesIO(source)
+
+    players, aka, disp, lobby = 4, True, '', 0
+    names, dans, rates, sx = [], [], [], []
+    sc = []
+    log = []
+    kyoku = None
+    root = None
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            continue
+        tag = element.tag
+        attrs = element.attrib
+        if tag[0] in DRAW_TAGS and tag[1:].isdigit():
+            kyoku.draw(DRAW_TAGS.index(tag[0]), int(tag[1:]))
+        elif tag[0] in DISCARD_TAGS and tag[1:].isdigit():
+            kyoku.discard(DISCARD_TAGS.index(tag[0]), int(tag[1:]))
+        elif tag == 'N':
+            kyoku.meld(int(attrs['who']), int(attrs['m']))
+        elif tag == 'REACH':
+            if attrs.get('step') == '1':
+                kyoku.reach[int(attrs['who'])] = True
+        elif tag == 'DORA':
+            kyoku.head[2].append(tile_code(int(attrs['hai']), aka))
+        elif tag == 'INIT':
+            if kyoku is not None:
+                log.append(kyoku.build())
+            kyoku = _KyokuBuilder(attrs, players, aka)
+        elif tag in ('AGARI', 'RYUUKYOKU'):
+            kyoku.agari(attrs) if tag == 'AGARI' else kyoku.ryuukyoku(attrs)
+            if 'owari' in attrs:
+                sc = _final_scores(attrs['owari'])
+        elif tag == 'GO':
+            game_type = int(attrs['type'])
+            players = 3 if game_type & 0x10 else 4
+            aka = not game_type & 0x02
+            disp = rule_disp(game_type)
+            lobby = int(attrs.get('lobby', 0))
+        elif tag == 'UN' and 'dan' in attrs and not names:
+            names = [unquote(attrs.get(f'n{seat}', '')) for seat in range(players)]
+            dans = [DAN_NAMES[int(x)] for x in attrs['dan'].split(',')[:players]]
+            rates = [float(x) for x in attrs['rate'].split(',')[:players]]
+            sx = attrs.get('sx', '').split(',')[:players]
+        if element is not root:
+            root.clear()
+    if kyoku is not None:
+        log.append(kyoku.build())
+    if not log:
+        raise ValueError('没有小局数据')
+
+    return {
+        'title': ['', ''],
+        'name': names,
+        'rule': {'disp': disp, 'aka53': int(aka), 'aka52': int(aka), 'aka51': int(aka)},
+        'ratingc': 'PF4' if players == 4 else 'PF3',
+        'lobby': lobby,
+        'dan': dans,
+        'rate': rates,
+        'sx': sx,
+        'sc': sc[:2 * players],
+        'log': log,
+        'ref': ref,
+    }
+
+
+def log_id(name):
+    """mjlog文件名（可带.gz）去掉后缀即牌谱ID，不是mjlog文件时返回None"""
+    name = Path(name).name
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for suffix in MJLOG_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+def iter_sources(paths):
+    """逐个产出 (牌谱ID, 原始字节)；paths可为mjlog文件、zip包或目录（递归查找）"""
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.rglob('*')) if path.is_dir() else [path]
+        for file_path in files:
+            if not file_path.is_file():
+                continue
+            if file_path.suffix == '.zip':
+                with zipfile.ZipFile(file_path) as bundle:
+                    for info in bundle.infolist():
+                        ref = log_id(info.filename)
+                        if ref and not info.is_dir():
+                            yield ref, bundle.read(info)
+            else:
+                ref = log_id(file_path.name)
+                if ref:
+                    yield ref, file_path.read_bytes()
+
+
+def _convert_file(task):
+    ref, raw, output_dir = task
+    try:
+        paipu = convert_mjlog(raw, ref)
+        with open(Path(output_dir) / f'{ref}.json', 'w', encoding='utf-8') as f:
+            json.dump(paipu, f, ensure_ascii=False, separators=(',', ':'))
+    except Exception as e:
+        return ref, str(e) or type(e).__name__
+    return ref, None
+
+
+def _bounded_map(executor, func, tasks, window):
+    """同executor.map按顺序返回结果，但最多只有window个任务在途，不会一次读入全部输入"""
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(executor.submit(func, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def import_mjlog(paths, output_dir='paipu_data/mjlog', processes=None):
+    """
+    把mjlog文件转换为JSON保存到output_dir（文件名为牌谱ID），已转换过的跳过
+
+    processes为1时在当前进程中转换，None时使用全部CPU。返回新转换的文件路径列表。
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    existing = {file_path.stem for file_path in output_dir.glob('*.json')}
+    tasks = ((ref, raw, output_dir) for ref, raw in iter_sources(paths) if ref not in existing)
+
+    written, failures = [], 0
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        results = map(_convert_file, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+        results = _bounded_map(executor, _convert_file, tasks, processes * 64)
+    try:
+        for ref, error in tqdm(results, desc='Converting'):
+            if error:
+                failures += 1
+                print(f"转换失败 {ref}: {error}")
+            else:
+                written.append(output_dir / f'{ref}.json')
+    finally:
+        if executor:
+            executor.shutdown()
+    print(f"转换完成：新增 {len(written)} 个，失败 {failures} 个，已存在 {len(existing)} 个")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把天凤mjlog XML（.mjlog/.xml，可gzip压缩或打包为zip）转换为JSON牌谱')
+    parser.add_argument('paths', nargs='+', help='mjlog文件、zip包或目录')
+    parser.add_argument('--output', default='paipu_data/mjlog', help='JSON牌谱保存目录')
+    parser.add_argument('--processes', type=int, default=None, help='进程数，默认使用全部CPU')
+    parser.add_argument('--store', action='store_true', help='转换后移入牌谱仓库（所有玩家共用）')
+    parser.add_argument('--archive', action='store_true', help='转换后加入牌谱查询的缓存')
+    args = parser.parse_args(argv)
+
+    from 天凤牌谱数据统计 import resource_path, load_config
+    written = import_mjlog(args.paths, resource_path(args.output), args.processes)
+    if args.store and written:
+        from 牌谱仓库 import PaipuStore, STORE_DIR
+        store = PaipuStore(resource_path(STORE_DIR))
+        print(f"移入牌谱仓库 {store.import_files(written)} 个")
+        written = [store.path(file_path.stem) for file_path in written]
+    if args.archive and written:
+        from 牌谱查询 import PaipuArchive
+        archive = PaipuArchive.load()
+        if archive.update(files=written, config=load_config()):
+            archive.save()
+        print(f"缓存共 {len(archive.refs)} 个牌谱")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""牌谱查询：缓存全部座位的小局、半庄数据并建立索引，按玩家、牌桌、时间、座位等条件快速统计"""
+
+import argparse
+import time
+from pathlib import Path
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+from tqdm import tqdm  # pip install tqdm
+from 天凤牌谱数据统计 import (resource_path, decode_paipu, process_hanchan_results, iter_kyoku_rows,
+                       load_seat_hand_metrics, compute_statistics, load_config)
+from 列式存储 import KyokuStore
+from 排行榜 import SEAT_COLUMNS, SeatTable, iter_seat_rows, paipu_files
+
+ARCHIVE_VERSION = 1
+CACHE_PATH = Path('paipu_data') / 'cache' / f'archive_v{ARCHIVE_VERSION}.pkl'
+WINDS = ['東', '南', '西', '北']
+
+
+class TableIndex:
+    """
+    一张按(玩家昵称, 对局时间)排序的表的索引
+
+    玩家昵称 -> 行范围；时间在玩家范围内二分查找（不指定玩家时用全表时间排序）；
+    其余列为 取值 -> 有序行号数组，多个条件取交集；条件为列表时取其中任一取值。
+    """
+
+    def __init__(self, frame, columns):
+        self.times = pd.to_datetime(frame['对局时间'].astype(str)).to_numpy()
+        names = frame['玩家昵称'].astype(str).to_numpy()
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]]) if len(names) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(names)]
+        self.players = {names[start]: (start, stop) for start, stop in zip(starts, stops)}
+        self.time_order = np.argsort(self.times, kind='stable')
+        self.sorted_times = self.times[self.time_order]
+        self.values = {}
+        for column in columns:
+            codes, uniques = pd.factorize(frame[column])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.values[column] = {uniques[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))}
+
+    def select(self, player=None, after=None, before=None, **equals):
+        """返回满足条件的行号（升序）"""
+        after = np.datetime64(pd.Timestamp(after)) if after is not None else None
+        before = np.datetime64(pd.Timestamp(before)) if before is not None else None
+        if player is not None:
+            start, stop = self.players.get(player, (0, 0))
+            times = self.times[start:stop]
+            low = start + (np.searchsorted(times, after, 'left') if after is not None else 0)
+            high = start + (np.searchsorted(times, before, 'right') if before is not None else len(times))
+            positions = np.arange(low, high)
+        else:
+            low = np.searchsorted(self.sorted_times, after, 'left') if after is not None else 0
+            high = np.searchsorted(self.sorted_times, before, 'right') if before is not None else len(self.sorted_times)
+            positions = np.sort(self.time_order[low:high])
+        for column, value in equals.items():
+            if value is None:
+                continue
+            index = self.values[column]
+            if isinstance(value, (list, tuple, set)):
+                rows = np.sort(np.concatenate([positions[:0]] + [index.get(v, positions[:0]) for v in value]))
+            else:
+                rows = index.get(value, positions[:0])
+            positions = np.intersect1d(positions, rows, assume_unique=True)
+        return positions
+
+
+def _sort_by_player(frame):
+    """按玩家昵称、对局时间、牌谱ID稳定排序（同一牌谱内小局保持原顺序）"""
+    names = pd.factorize(frame['玩家昵称'].astype(str), sort=True)[0]
+    times = pd.to_datetime(frame['对局时间'].astype(str)).to_numpy()
+    refs = pd.factorize(frame['牌谱'].astype(str), sort=True)[0]
+    return frame.take(np.lexsort((refs, times, names))).reset_index(drop=True)
+
+
+def parse_log(paipu, config=None):
+    """解析一个牌谱的全部座位，返回 (小局KyokuStore, 半庄行列表)"""
+    store = KyokuStore(capacity=64)
+    hanchan_results = process_hanchan_results(paipu)
+    seat_rows = list(iter_seat_rows(paipu))
+    # 回放一次得到全部座位的手牌指标
+    metrics = load_seat_hand_metrics(paipu, range(len(seat_rows)), config or {})
+    for seat, seat_row in enumerate(seat_rows):
+        file_index = store.add_file(seat_row[:7])  # 前7项即KYOKU_INFO_COLUMNS
+        for row in iter_kyoku_rows(paipu, seat, hanchan_results, metrics[seat]):
+            store.append(file_index, row)
+    return store, seat_rows
+
+
+class PaipuArchive:
+    """
+    全座位小局、半庄数据的本地缓存与查询
+
+    小局表为KyokuStore.to_frame(compat=False)的紧凑格式，另加场风、亲家两列；
+    半庄表同排行榜.SEAT_COLUMNS。缓存文件记录已解析的牌谱ID，update只解析新牌谱。
+    """
+
+    def __init__(self, kyoku_df=None, hanchan_df=None, refs=()):
+        self.refs = set(refs)
+        self.kyoku = kyoku_df if kyoku_df is not None else pd.DataFrame()
+        self.hanchan = hanchan_df if hanchan_df is not None else pd.DataFrame(columns=SEAT_COLUMNS)
+        self._build_indexes()
+
+    def _build_indexes(self):
+        if self.kyoku.empty:
+            self.kyoku_index = self.hanchan_index = None
+            return
+        self.kyoku_index = TableIndex(self.kyoku, ['牌桌', '玩家位置', '场风', '亲家'])
+        self.hanchan_index = TableIndex(self.hanchan, ['牌桌', '玩家位置'])
+
+    @classmethod
+    def load(cls, path=None):
+        """读取缓存文件，不存在或版本不符时返回空的PaipuArchive"""
+        path = Path(path) if path else resource_path(CACHE_PATH)
+        if not path.exists():
+            return cls()
+        data = pd.read_pickle(path)
+        if data.get('version') != ARCHIVE_VERSION:
+            print(f"缓存版本不符，重新解析: {path}")
+            return cls()
+        return cls(data['kyoku'], data['hanchan'], data['refs'])
+
+    def save(self, path=None):
+        path = Path(path) if path else resource_path(CACHE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.to_pickle({'version': ARCHIVE_VERSION, 'refs': self.refs, 'kyoku': self.kyoku, 'hanchan': self.hanchan}, path)
+
+    def update(self, directory='paipu_data', config=None, files=None):
+        """
+        解析目录（含牌谱仓库与各玩家子目录，跳过缓存等非牌谱目录）中尚未缓存的牌谱，返回新增牌谱数
+
+        files可直接指定要加入的牌谱文件；文件名即牌谱ID，已缓存的跳过。
+        """
+        if files is None:
+            files = paipu_files(resource_path(directory)).values()
+        new_files = {}
+        for file_path in files:
+            file_path = Path(file_path)
+            if file_path.stem not in self.refs:
+                new_files.setdefault(file_path.stem, file_path)
+        if not new_files:
+            return 0
+
+        kyoku_frames, seat_rows = [], []
+        for ref, file_path in tqdm(new_files.items(), desc='Processing'):
+            try:
+                with open(file_path, 'rb') as f:
+                    store, rows = parse_log(decode_paipu(f.read()), config)
+            except Exception as e:
+                print(f"处理错误 {file_path}: {str(e)}")
+                continue
+            kyoku_frames.append(store)
+            seat_rows.extend(rows)
+            self.refs.add(ref)
+        if not kyoku_frames:
+            return 0
+
+        new_kyoku = _merge_stores(kyoku_frames)
+        new_kyoku['场风'] = pd.Categorical.from_codes(new_kyoku['局数'].to_numpy() // 4, WINDS)
+        new_kyoku['亲家'] = new_kyoku['局数'].to_numpy() % 4 == new_kyoku['玩家位置'].to_numpy()
+        new_hanchan = pd.DataFrame.from_records(seat_rows, columns=SEAT_COLUMNS)
+
+        kyoku = pd.concat([self.kyoku, new_kyoku], ignore_index=True) if not self.kyoku.empty else new_kyoku
+        hanchan = pd.concat([self.hanchan, new_hanchan], ignore_index=True) if not self.hanchan.empty else new_hanchan
+        for column in ['牌谱', '牌桌', '对局时间', '玩家昵称', '玩家段位']:
+            kyoku[column] = kyoku[column].astype(str).astype('category')
+        self.kyoku = _sort_by_player(kyoku)
+        self.hanchan = _sort_by_player(hanchan)
+        self._build_indexes()
+        return len(kyoku_frames)
+
+    @classmethod
+    def open(cls, directory='paipu_data', config=None, path=None):
+        """读取缓存并加入新牌谱，有新增时写回缓存"""
+        archive = cls.load(path)
+        if archive.update(directory, config):
+            archive.save(path)
+        return archive
+
+    def select(self, player=None, table=None, after=None, before=None, seat=None, wind=None, dealer=None):
+        """
+        按条件取出 (小局数据, 半庄数据)
+
+        table: 牌桌（如"四鳳南喰赤"，或多个牌桌的列表）  after/before: 时间范围  seat: 玩家位置0-3
+        wind: 场风"東"/"南"/"西"  dealer: 是否为亲家；场风与亲家只作用于小局数据
+        """
+        if self.kyoku_index is None:
+            return self.kyoku, self.hanchan
+        kyoku_rows = self.kyoku_index.select(player, after, before, 牌桌=table, 玩家位置=seat, 场风=wind, 亲家=dealer)
+        hanchan_rows = self.hanchan_index.select(player, after, before, 牌桌=table, 玩家位置=seat)
+        return self.kyoku.take(kyoku_rows), self.hanchan.take(hanchan_rows)
+
+    def statistics(self, **filters):
+        """按select的条件计算generate_statistics中的综合统计指标，无数据时返回空Series"""
+        kyoku_df, hanchan_df = self.select(**filters)
+        if kyoku_df.empty or hanchan_df.empty:
+            return pd.Series(dtype=object)
+        _, stats, _ = compute_statistics(kyoku_df, hanchan_df)
+        return pd.Series(stats).apply(lambda x: round(x, 4) if isinstance(x, float) else x)
+
+    def seat_table(self):
+        """以半庄表生成排行榜.SeatTable"""
+        return SeatTable(self.hanchan)
+
+
+def config_filters(config):
+    """config.toml的[filter]对应的PaipuArchive.select参数"""
+    return {
+        'player': config['filter']['players'],
+        'table': config['filter']['levels'] or None,
+        'after': config['filter']['timeafter'],
+        'before': config['filter']['timebefore'],
+    }
+
+
+def _merge_stores(stores):
+    """把多个牌谱的KyokuStore合并为一个紧凑DataFrame"""
+    merged = KyokuStore(capacity=max(sum(len(store) for store in stores), 1))
+    for store in stores:
+        offset = len(merged.files)
+        merged.files.extend(store.files)
+        for name, column in store.columns.items():
+            merged.columns[name][merged.size:merged.size + len(store)] = column[:len(store)]
+        merged.columns['file'][merged.size:merged.size + len(store)] += offset
+        merged.size += len(store)
+    return merged.to_frame(compat=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='牌谱查询')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('update', help='解析paipu_data中新增的牌谱并写入缓存')
+    query = subparsers.add_parser('query', help='按条件统计')
+    query.add_argument('--player', help='玩家昵称')
+    query.add_argument('--table', help='牌桌，如 四鳳南喰赤')
+    query.add_argument('--after', help='起始时间，如 2024-06')
+    query.add_argument('--before', help='截止时间')
+    query.add_argument('--seat', type=int, help='玩家位置0-3')
+    query.add_argument('--wind', choices=WINDS, help='场风')
+    query.add_argument('--dealer', action=argparse.BooleanOptionalAction, default=None, help='是否为亲家')
+    args = parser.parse_args(argv)
+
+    archive = PaipuArchive.open('paipu_data', load_config())
+    if args.command == 'update':
+        print(f"缓存共 {len(archive.refs)} 个牌谱，{len(archive.kyoku)} 条小局数据")
+        return
+    start = time.perf_counter()
+    stats = archive.statistics(player=args.player, table=args.table, after=args.after, before=args.before,
+                               seat=args.seat, wind=args.wind, dealer=args.dealer)
+    print(stats.to_string() if not stats.empty else "没有符合条件的数据")
+    print(f"查询用时 {(time.perf_counter() - start) * 1000:.1f} 毫秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+天凤mjlog2json格式的合成牌谱生成器，用于性能测试
+
+模拟对局流程，手牌与牌山前后一致；立直只在听牌时宣言，自摸、荣和只在摸进或他家打出和了牌时发生
+（不检查役与振听，番数与点数随机）。
+"""
+
+import concurrent.futures
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from 向听计算 import winning_kinds
+from 牌谱回放 import TILE_KIND
+
+# 牌编码：11-19万 21-29筒 31-39索 41-47字 51/52/53赤五
+KINDS = [s * 10 + n for s in (1, 2, 3) for n in range(1, 10)] + list(range(41, 48))
+DAN = ['新人', '１級', '初段', '二段', '三段', '四段', '五段', '六段', '七段']
+RULES = {4: ['般東喰赤', '般南喰赤', '上南喰赤', '特南喰赤', '鳳南喰赤'], 3: ['般南喰赤', '上南喰赤', '鳳南喰赤']}
+
+
+def _red(kind):
+    return {15: 51, 25: 52, 35: 53}[kind]
+
+
+def _kind(tile):
+    return {51: 15, 52: 25, 53: 35}.get(tile, tile)
+
+
+def _counts(tiles):
+    counts = [0] * 34
+    for tile in tiles:
+        counts[TILE_KIND[tile]] += 1
+    return counts
+
+
+def _isolated(hand):
+    """最孤立的牌：同种张数与同门相邻（两格以内）的牌越少越孤立，字牌只看同种张数"""
+    counts = _counts(hand)
+    values = []
+    for tile in hand:
+        kind = TILE_KIND[tile]
+        value = 3 * (counts[kind] - 1)
+        if kind < 27:
+            for step, weight in ((-2, 1), (-1, 2), (1, 2), (2, 1)):
+                if 0 <= kind % 9 + step < 9 and counts[kind + step]:
+                    value += weight
+        values.append(value)
+    lowest = min(values)
+    return [tile for tile, value in zip(hand, values) if value == lowest]
+
+
+def build_wall(rng, players):
+    wall = []
+    for kind in KINDS:
+        if players == 3 and 12 <= kind <= 18:
+            continue
+        for i in range(4):
+            wall.append(_red(kind) if kind in (15, 25, 35) and i == 0 else kind)
+    rng.shuffle(wall)
+    return wall
+
+
+def _kyoku(rng, players, kyoku, honba, kyotaku, scores):
+    """模拟一个小局，返回(小局数组, 各家点数变化, 庄家是否连庄)"""
+    wall = build_wall(rng, players)
+    dora = [wall.pop()]
+    ura = [wall.pop()]
+    dealer = kyoku % players
+    hands = [[wall.pop() for _ in range(13)] for _ in range(players)]
+    haipai = [sorted(h, key=_kind) for h in hands]
+    draws = [[] for _ in range(players)]
+    discards = [[] for _ in range(players)]
+    riichi = [False] * players
+    menzen = [True] * players
+    melds = [0] * players  # 副露与暗杠数
+    waits = [[] for _ in range(players)]  # 打牌后手牌的和了牌种，未听牌为空；副露、杠后到下次打牌前为空
+    pons = [[] for _ in range(players)]  # 碰的牌种与字符串，用于加杠
+    turn = dealer
+    drawn = None
+    need_draw = True
+    result = None
+    deltas = [0] * 4
+    sticks = kyotaku
+
+    def others(seat):
+        return [(seat + i) % players for i in range(1, players)]
+
+    while True:
+        if need_draw:
+            if len(wall) <= 14:
+                # 荒牌流局
+                tenpai = [bool(waits[s]) for s in range(players)]
+                n = sum(tenpai)
+                if n == 0:
+                    result = ['全員不聴']
+                elif n == players:
+                    result = ['全員聴牌']
+                else:
+                    total = 3000 if players == 4 else 2000
+                    for s in range(players):
+                        deltas[s] = total // n if tenpai[s] else -total // (players - n)
+                    result = ['流局', deltas[:]]
+                renchan = tenpai[dealer]
+                break
+            drawn = wall.pop()
+            draws[turn].append(drawn)
+            hands[turn].append(drawn)
+        need_draw = True
+
+        # 自摸和了：摸进和了牌（副露手可能无役，按一定概率放弃）
+        if drawn is not None and TILE_KIND[drawn] in waits[turn] and (menzen[turn] or rng.random() < 0.8):
+            han = rng.choice([1, 2, 3, 4, 5]) + (1 if riichi[turn] else 0)
+            base = {1: 1000, 2: 2000, 3: 3900, 4: 7700, 5: 8000, 6: 12000}[min(han, 6)]
+            if turn == dealer:
+                base = base * 3 // 2
+            pay = base // (players - 1) // 100 * 100 + 100 * honba
+            for s in range(players):
+                deltas[s] = -pay if s != turn else 0
+            deltas[turn] = pay * (players - 1) + sticks * 1000
+            result = ['和了', deltas[:], [turn, turn, turn, f'{han}飜{base}点', f'門前清自摸和(1飜)']]
+            renchan = turn == dealer
+            break
+
+        # 暗杠
+        counts = {}
+        for t in hands[turn]:
+            counts[_kind(t)] = counts.get(_kind(t), 0) + 1
+        quad = [k for k, c in counts.items() if c == 4]
+        if quad and not riichi[turn] and rng.random() < 0.5 and len(wall) > 15:
+            k = quad[0]
+            tiles = [t for t in hands[turn] if _kind(t) == k]
+            for t in tiles:
+                hands[turn].remove(t)
+            discards[turn].append(''.join(str(t) for t in tiles[:3]) + 'a' + str(tiles[3]))
+            melds[turn] += 1
+            waits[turn] = []
+            continue
+        # 加杠
+        kakan = [p for p in pons[turn] if any(_kind(t) == p[0] for t in hands[turn])]
+        if kakan and rng.random() < 0.5 and len(wall) > 15:
+            k, pon_str = kakan[0]
+            tile = next(t for t in hands[turn] if _kind(t) == k)
+            hands[turn].remove(tile)
+            pons[turn].remove(kakan[0])
+            discards[turn].append(pon_str.replace('p', 'k' + str(tile)))
+            waits[turn] = []
+            continue
+
+        # 打牌
+        if riichi[turn]:
+            tile = drawn
+            action = 60
+            hands[turn].remove(tile)
+        else:
+            if drawn is not None and waits[turn] and rng.random() < 0.85:
+                tile = drawn  # 听牌时多半摸切保持听牌
+            elif rng.random() < 0.95:
+                candidates = _isolated(hands[turn])
+                tile = drawn if drawn in candidates else rng.choice(candidates)
+            else:
+                tile = rng.choice(hands[turn])
+            action = 60 if tile == drawn and drawn is not None else tile
+            hands[turn].remove(tile)
+            waits[turn] = winning_kinds(_counts(hands[turn]), melds[turn])
+            # 门清听牌、点数够且还能再摸牌时多半立直，否则默听
+            if waits[turn] and menzen[turn] and scores[turn] >= 1000 and len(wall) >= 18 and rng.random() < 0.75:
+                riichi[turn] = True
+                action = f'r{action}'
+        discards[turn].append(action)
+        if isinstance(action, str):
+            sticks += 1
+
+        # 荣和：打出的牌是他家的和了牌（按下家起的顺序只取一家）
+        ron = [s for s in others(turn) if TILE_KIND[tile] in waits[s] and (menzen[s] or rng.random() < 0.8)]
+        if ron:
+            winner = ron[0]
+            han = rng.choice([1, 2, 3, 4, 5]) + (1 if riichi[winner] else 0)
+            point = {1: 1000, 2: 2000, 3: 3900, 4: 7700, 5: 8000, 6: 12000}[min(han, 6)]
+            if winner == dealer:
+                point = point * 3 // 2 // 100 * 100
+            point += 300 * honba
+            deltas[turn] = -point
+            deltas[winner] = point + sticks * 1000
+            result = ['和了', deltas[:], [winner, turn, winner, f'{han}飜{point}点', '立直(1飜)' if riichi[winner] else '役牌 白(1飜)']]
+            renchan = winner == dealer
+            break
+
+        # 副露：碰（任意家）或吃（下家）
+        k = _kind(tile)
+        caller = None
+        kan = False
+        for s in others(turn):
+            if riichi[s]:
+                continue
+            same = [t for t in hands[s] if _kind(t) == k]
+            if len(same) == 3 and rng.random() < 0.5 and len(wall) > 15:
+                # 大明杠：出牌数组记0占位，之后摸岭上牌
+                rel = (s - turn) % players
+                own = [str(t) for t in same]
+                pos = 0 if rel == 1 else (3 if rel == players - 1 else 1)
+                own.insert(pos, 'm' + str(tile))
+                for t in same:
+                    hands[s].remove(t)
+                draws[s].append(''.join(own))
+                discards[s].append(0)
+                menzen[s] = False
+                melds[s] += 1
+                waits[s] = []
+                caller = s
+                kan = True
+                break
+            if len(same) >= 2 and rng.random() < 0.35:
+                rel = (s - turn) % players  # 1=下家打出(来自上家) 2=对家 3=上家打出(来自下家)
+                pair = [str(t) for t in same[:2]]
+                pos = 0 if rel == 1 else (2 if rel == players - 1 else 1)
+                parts = pair[:]
+                parts.insert(pos, 'p' + str(tile))
+                call = ''.join(parts)
+                for t in same[:2]:
+                    hands[s].remove(t)
+                pons[s].append((k, call))
+                caller = s
+                break
+        if caller is None and players == 4 and k < 40:
+            s = (turn + 1) % 4
+            if not riichi[s] and rng.random() < 0.25:
+                kinds = {_kind(t): t for t in hands[s]}
+                for a, b in ((k + 1, k + 2), (k - 1, k + 1), (k - 2, k - 1)):
+                    if a in kinds and b in kinds and a // 10 == k // 10 and b // 10 == k // 10 and a % 10 and b % 10:
+                        call = f'c{tile}{kinds[a]}{kinds[b]}'
+                        hands[s].remove(kinds[a])
+                        hands[s].remove(kinds[b])
+                        caller = s
+                        break
+        if caller is not None and kan:
+            turn = caller
+            drawn = None
+            continue
+        if caller is not None:
+            draws[caller].append(call)
+            menzen[caller] = False
+            melds[caller] += 1
+            waits[caller] = []
+            turn = caller
+            drawn = None
+            need_draw = False
+            continue
+        turn = (turn + 1) % players
+
+    # 立直棒从点数中扣除（牌谱中结果点数不含立直棒支出）
+    # 三麻的局序号与四麻相同按场风编号（东1-3为0-2，南1-3为4-6）
+    kyoku_no = kyoku if players == 4 else kyoku // 3 * 4 + kyoku % 3
+    kyoku_arr = [[kyoku_no, honba, kyotaku], scores[:], dora, ura]
+    for s in range(4):
+        if s < players:
+            kyoku_arr += [haipai[s], draws[s], discards[s]]
+        else:
+            kyoku_arr += [[], [], []]
+    kyoku_arr.append(result)
+    new_sticks = sticks if result[0] != '和了' else 0
+    change = [deltas[s] - (1000 if riichi[s] else 0) for s in range(players)]
+    if players == 3:
+        change.append(0)
+    return kyoku_arr, change, renchan, new_sticks, result[0] == '和了'
+
+
+def generate_paipu(rng, players=4, ref_time='2024010112', idx=0, player=None):
+    """
+    生成一个完整半庄/东风战的mjlog2json结构
+
+    player不为空时该玩家坐在第idx % players个座位，其余玩家从player0-player39中随机选取
+    """
+    rule = rng.choice(RULES[players])
+    rounds = (4 if '東' in rule else 8) if players == 4 else (3 if '東' in rule else 6)
+    start = 25000 if players == 4 else 35000
+    scores = [start] * players + ([0] if players == 3 else [])
+    log = []
+    kyoku = honba = sticks = 0
+    while kyoku < rounds and len(log) < 30:
+        arr, change, renchan, sticks, agari = _kyoku(rng, players, kyoku, honba, sticks, scores[:])
+        log.append(arr)
+        scores = [scores[s] + change[s] for s in range(len(scores))]
+        if any(scores[s] < 0 for s in range(players)):
+            break
+        if renchan:
+            honba += 1
+        else:
+            kyoku += 1
+            honba = 0 if agari else honba + 1
+    scores = scores[:players]
+    scores[0] += sticks * 1000
+    pool = [f'player{n}' for n in range(40) if f'player{n}' != player]
+    names = rng.sample(pool, players)
+    if player:
+        names[idx % players] = player
+    order = sorted(range(players), key=lambda s: (-scores[s], s))
+    uma = [45, 5, -15, -35] if players == 4 else [45, 0, -45]
+    sc = []
+    for s in range(players):
+        sc += [scores[s], round((scores[s] - 30000) / 1000 + uma[order.index(s)], 1)]
+    return {
+        'title': ['', ''],
+        'name': names,
+        'rule': {'disp': rule, 'aka': 1},
+        'ratingc': 'PF4' if players == 4 else 'PF3',
+        'lobby': 0,
+        'dan': [rng.choice(DAN) for _ in range(players)],
+        'rate': [round(rng.uniform(1500, 2200), 2) for _ in range(players)],
+        'sx': ['M'] * players,
+        'sc': sc,
+        'log': log,
+        'ref': f'{ref_time}gm-00a9-0000-{idx:08x}',
+    }
+
+
+def _write_log(task):
+    path, seed, players, ref_time, idx, player = task
+    rng = random.Random(seed * 1_000_003 + idx)  # 每个牌谱独立的随机数，可单独重新生成
+    paipu = generate_paipu(rng, players, ref_time, idx, player)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(paipu, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def generate_logs(directory, count, seed=0, player='player1', three_player_every=4, start=datetime(2024, 1, 1),
+                  processes=None):
+    """
+    在directory中生成count个牌谱文件（文件名为牌谱ID），返回文件路径列表
+
+    每three_player_every个牌谱中有一个三麻（0为全部四麻），对局时间从start起每个牌谱间隔一小时；
+    player出现在每个牌谱中。目录中已有的同名文件不重新生成，同样的参数得到同样的牌谱。
+    每个牌谱要逐巡判断听牌，processes为1时在当前进程中生成，None时使用全部CPU。
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths, tasks = [], []
+    for i in range(count):
+        players = 3 if three_player_every and i % three_player_every == 0 else 4
+        ref_time = (start + timedelta(hours=i)).strftime('%Y%m%d%H')
+        path = directory / f'{ref_time}gm-00a9-0000-{i:08x}.json'
+        paths.append(path)
+        if not path.exists():
+            tasks.append((path, seed, players, ref_time, i, player))
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(tasks) < 100:
+        for task in tasks:
+            _write_log(task)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(_write_log, tasks, chunksize=64))
+    return paths
@@ -0,0 +1,198 @@
+"""监视模式：持续读取牌谱.txt中新增的URL与投放目录中的牌谱文件，只解析新牌谱并增量更新统计报告"""
+
+import argparse
+import threading
+import time
+import traceback
+from pathlib import Path
+from 天凤牌谱数据统计 import resource_path, extract_log_id, download_urls, generate_statistics, load_config
+from 牌谱查询 import PaipuArchive, config_filters
+from 牌谱仓库 import PaipuStore, STORE_DIR
+from 列式存储 import compat_frame
+from 报告服务器 import ReportService, serve
+
+
+class UrlFileTail:
+    """
+    记录URL文件的读取位置，每次只返回新增的行
+
+    末尾未写完（没有换行）的行留到下次读取；文件超过settle秒未修改时视为已写完。
+    文件变短（被清空或替换）时从头读取。
+    """
+
+    def __init__(self, path, settle=2.0):
+        self.path = Path(path)
+        self.settle = settle
+        self.offset = 0
+
+    def read_new(self):
+        if not self.path.exists():
+            return []
+        stat = self.path.stat()
+        if stat.st_size < self.offset:
+            self.offset = 0
+        if stat.st_size == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data) and time.time() - stat.st_mtime >= self.settle:
+            end = len(data)
+        self.offset += end
+        text = data[:end].decode('utf-8', errors='replace')
+        return [line.strip().lstrip('\ufeff') for line in text.splitlines() if line.strip().lstrip('\ufeff')]
+
+
+class DropDirectory:
+    """投放目录：返回新出现或有改动的牌谱JSON，settle秒内修改过的文件（可能仍在写入）下次再取"""
+
+    def __init__(self, path, settle=2.0):
+        self.path = Path(path)
+        self.settle = settle
+        self.seen = {}  # 文件名 -> (大小, 修改时间)
+
+    def read_new(self):
+        if not self.path.is_dir():
+            return []
+        now = time.time()
+        files = []
+        for file_path in sorted(self.path.glob('*.json')):
+            stat = file_path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.seen.get(file_path.name) == signature or now - stat.st_mtime < self.settle:
+                continue
+            self.seen[file_path.name] = signature
+            files.append(file_path)
+        return files
+
+
+class PaipuWatcher:
+    """
+    轮询URL文件与投放目录，短时间内连续出现的新牌谱合并为一批处理
+
+    一批在debounce秒内没有新的牌谱、或距第一个牌谱出现已超过max_wait秒时处理：
+    下载新URL（保存到牌谱仓库），只解析新牌谱加入缓存，目标玩家受影响时重新生成其统计报告。
+    """
+
+    def __init__(self, config, service, url_file, drop_dir=None, interval=1.0, debounce=3.0, max_wait=30.0):
+        self.config = config
+        self.service = service
+        self.store = PaipuStore(resource_path(STORE_DIR))
+        self.urls = UrlFileTail(url_file, settle=debounce)
+        self.drop = DropDirectory(drop_dir, settle=debounce) if drop_dir else None
+        self.interval = interval
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.pending_urls = []
+        self.pending_files = []
+        self.first_event = self.last_event = None
+
+    def poll(self):
+        """读取新增的URL与文件，返回本次新增数"""
+        urls = self.urls.read_new()
+        files = self.drop.read_new() if self.drop else []
+        if urls or files:
+            now = time.monotonic()
+            self.first_event = self.first_event or now
+            self.last_event = now
+            self.pending_urls.extend(urls)
+            self.pending_files.extend(files)
+        return len(urls) + len(files)
+
+    def due(self):
+        if self.first_event is None:
+            return False
+        now = time.monotonic()
+        return now - self.last_event >= self.debounce or now - self.first_event >= self.max_wait
+
+    def flush(self):
+        """处理当前一批，返回新牌谱涉及的玩家昵称集合"""
+        urls, files = self.pending_urls, self.pending_files
+        self.pending_urls, self.pending_files = [], []
+        self.first_event = self.last_event = None
+
+        target_player = self.config['filter']['players']
+        refs = self.service.archive.refs
+        urls = list(dict.fromkeys(url for url in urls if extract_log_id(url) not in refs))
+        if urls:
+            saved, failure_count = download_urls(urls, None, self.config['download'].get('download_threads', 5),
+                                                 self.config['download'].get('retries', 2), self.store)
+            files = files + saved
+            print(f"新增URL {len(urls)} 个，下载成功 {len(saved)} 个，失败 {failure_count} 个")
+        if not files:
+            return set()
+
+        players = self.service.refresh(files)
+        print(f"{time.strftime('%H:%M:%S')} 新增牌谱 {len(files)} 个，涉及 {len(players)} 名玩家")
+        if target_player in players:
+            self.write_report()
+        return players
+
+    def write_report(self):
+        """
+        按config.toml的条件从缓存取出目标玩家的数据，生成与完整运行相同的统计报告
+
+        缓存中的小局表为紧凑格式，先转换为完整运行的列和取值（场次、四家点数等），原始数据导出与完整运行一致。
+        """
+        start = time.perf_counter()
+        with self.service.lock:
+            kyoku_df, hanchan_df = self.service.archive.select(**config_filters(self.config))
+        if kyoku_df.empty or hanchan_df.empty:
+            print("未找到符合条件的牌谱数据")
+            return
+        kyoku_df = compat_frame(kyoku_df).reset_index(drop=True)
+        hanchan_df = hanchan_df.reset_index(drop=True)
+        try:
+            generate_statistics(kyoku_df, hanchan_df, self.config)
+        except Exception as e:
+            # 监视继续运行，但保留完整的出错位置
+            traceback.print_exc()
+            print(f"生成统计报告失败：{str(e)}")
+            return
+        print(f"统计报告已更新，用时 {time.perf_counter() - start:.1f} 秒")
+
+    def run(self, once=False):
+        """开始监视，直到Ctrl+C；once=True时只处理一次当前已有的内容"""
+        print(f"开始监视 {self.urls.path}" + (f" 与 {self.drop.path}" if self.drop else "") + "（Ctrl+C退出）")
+        try:
+            while True:
+                self.poll()
+                if once:
+                    return self.flush()
+                if self.due():
+                    self.flush()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            if self.pending_urls or self.pending_files:
+                self.flush()
+
+
+def main(argv=None):
+    config = load_config()
+    watch_config = config.get('watch', {})
+    server_config = config.get('server', {})
+    parser = argparse.ArgumentParser(description='监视牌谱.txt与投放目录，增量更新统计报告')
+    parser.add_argument('--drop', default=watch_config.get('drop_dir', ''), help='投放牌谱JSON的目录')
+    parser.add_argument('--interval', type=float, default=watch_config.get('interval', 1.0), help='轮询间隔（秒）')
+    parser.add_argument('--debounce', type=float, default=watch_config.get('debounce', 3.0),
+                        help='连续新增的牌谱在此秒数内合并为一批')
+    parser.add_argument('--max-wait', type=float, default=watch_config.get('max_wait', 30.0),
+                        help='一批最多等待的秒数')
+    parser.add_argument('--serve', action='store_true', help='同时启动报告服务器')
+    parser.add_argument('--once', action='store_true', help='处理一次已有内容后退出')
+    args = parser.parse_args(argv)
+
+    archive = PaipuArchive.open('paipu_data', config)
+    service = ReportService(archive, config, server_config.get('cache_size', 32))
+    if args.serve:
+        threading.Thread(target=serve, args=(service, server_config.get('host', '127.0.0.1'),
+                                             server_config.get('port', 8000)), daemon=True).start()
+    watcher = PaipuWatcher(config, service, resource_path(config['filter']['paipu_txt']),
+                           resource_path(args.drop) if args.drop else None,
+                           args.interval, args.debounce, args.max_wait)
+    watcher.run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
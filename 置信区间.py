@@ -0,0 +1,171 @@
+"""置信区间：按半庄重抽样的bootstrap，为综合统计的各项指标计算置信区间"""
+
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+
+RESAMPLES = 10000
+CONFIDENCE = 0.95
+BATCH_BYTES = 32 * 1024 * 1024  # 每批重抽样次数矩阵的大小上限
+
+# 小局指标：指标名 -> (取值, 条件)，与compute_statistics一致，即条件成立（且取值非空）的小局中取值的平均
+# 取值、条件为列名、列名元组（各列同时成立）或函数；条件为None时为全部小局
+KYOKU_METRICS = {
+    '和了率': ('和了', None),
+    '放铳率': ('放铳', None),
+    '副露率': ('副露', None),
+    '立直率': ('立直', None),
+    '默听率': ('默听', '和了'),
+    '和牌时立直率': ('立直', '和了'),
+    '和牌时副露率': ('副露', '和了'),
+    '和牌自摸率': ('自摸', '和了'),
+    '平均和了打点': ('和了打点', '和了'),
+    '平均和了巡目': ('和了巡目', '和了'),
+    '立直先制率': ('立直先制', '立直'),
+    '追立率': ('追立', '立直'),
+    '立直后和牌率': ('和了', '立直'),
+    '立直后自摸率': ('自摸', '立直'),
+    '立直后放铳率': ('放铳', '立直'),
+    '立直后放铳打点': ('放铳打点', '立直'),
+    '立直后流局率': ('流局', '立直'),
+    '立直和牌打点': ('和了打点', '立直'),
+    '立直和牌巡目': ('和了巡目', '立直'),
+    '平均立直巡目': ('立直巡目', '立直'),
+    '平均副露巡目': ('副露巡目', '副露'),
+    '副露后和牌率': ('和了', '副露'),
+    '副露后放铳打点': ('放铳打点', '副露'),
+    '副露后放铳率': ('放铳', '副露'),
+    '副露后流局率': ('流局', '副露'),
+    '副露和牌打点': ('和了打点', '副露'),
+    '副露和牌巡目': ('和了巡目', '副露'),
+    '平均放铳打点': (lambda df: df['放铳打点'].abs(), '放铳'),
+    '平均放铳巡目': ('放铳巡目', '放铳'),
+    '放铳时立直率': ('立直', '放铳'),
+    '放铳时副露率': ('副露', '放铳'),
+    '放铳时门清率': (lambda df: ~df['立直'] & ~df['副露'], '放铳'),
+    '流局率': ('流局', None),
+    '流局听牌率': ('流局时听牌', '流局'),
+    '流局平均得点': ('流局时得点', '流局'),
+    '立直流局时听牌率': ('流局时听牌', ('流局', '立直')),
+    '副露流局时听牌率': ('流局时听牌', ('流局', '副露')),
+    '门清流局时听牌率': ('流局时听牌', lambda df: df['流局'] & ~df['立直'] & ~df['副露']),
+    '平均配牌向听': ('配牌向听', None),
+    '平均听牌巡目': ('听牌巡目', None),
+    '副露时平均向听': ('副露时向听', '副露'),
+    '立直平均待牌数': ('立直待牌数', '立直'),
+    '局收支': ('收支', None),
+}
+# 半庄指标：指标名 -> 取值，为各半庄取值的平均
+HANCHAN_METRICS = {
+    '平均顺位': 'rank',
+    '一位率': lambda df: df['rank'] == 1,
+    '二位率': lambda df: df['rank'] == 2,
+    '三位率': lambda df: df['rank'] == 3,
+    '四位率': lambda df: df['rank'] == 4,
+    '连对率': lambda df: df['rank'] <= 2,
+    '被飞率': 'is_negative',
+}
+# 合计指标：指标名 -> (表, 列)，为取值之和
+# 总rate变动是相邻半庄rate之差的和（即首末rate之差），重抽样没有意义，不计算
+SUM_METRICS = {
+    '总pt变动': ('hanchan', 'pt变动'),
+    '总收支': ('kyoku', '收支'),
+}
+
+
+def _column(frame, spec):
+    """按指标定义取出一列，返回浮点数组（缺失值为NaN）"""
+    if callable(spec):
+        values = spec(frame)
+    else:
+        values = frame[spec]
+    return pd.Series(values).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _condition(frame, spec):
+    if spec is None:
+        return np.ones(len(frame), dtype=bool)
+    if isinstance(spec, tuple):
+        mask = np.ones(len(frame), dtype=bool)
+        for name in spec:
+            mask &= _column(frame, name) == 1
+        return mask
+    return _column(frame, spec) == 1
+
+
+def hanchan_totals(final_kyoku_df, final_hanchan_df):
+    """
+    把各指标预先汇总到半庄：返回 (指标名列表, 分子矩阵, 分母矩阵, 是否为合计)
+
+    矩阵为 半庄数 x 指标数；比率与平均类指标为 分子之和 / 分母之和，合计类指标只用分子。
+    """
+    hanchan_count = len(final_hanchan_df)
+    codes = pd.Index(final_hanchan_df['牌谱']).get_indexer(final_kyoku_df['牌谱'])
+    in_hanchan = codes >= 0
+    names, numerators, denominators, sums = [], [], [], []
+
+    def add(name, codes, values, mask, is_sum=False):
+        mask = mask & ~np.isnan(values)
+        names.append(name)
+        numerators.append(np.bincount(codes[mask], weights=values[mask], minlength=hanchan_count))
+        denominators.append(np.bincount(codes[mask], minlength=hanchan_count).astype(float))
+        sums.append(is_sum)
+
+    hanchan_codes = np.arange(hanchan_count)
+    every_hanchan = np.ones(hanchan_count, dtype=bool)
+    for name, spec in HANCHAN_METRICS.items():
+        add(name, hanchan_codes, _column(final_hanchan_df, spec), every_hanchan)
+    for name, (value, condition) in KYOKU_METRICS.items():
+        add(name, codes, _column(final_kyoku_df, value), _condition(final_kyoku_df, condition) & in_hanchan)
+    for name, (table, column) in SUM_METRICS.items():
+        if table == 'hanchan':
+            add(name, hanchan_codes, _column(final_hanchan_df, column), every_hanchan, True)
+        else:
+            add(name, codes, _column(final_kyoku_df, column), in_hanchan, True)
+    return names, np.column_stack(numerators), np.column_stack(denominators), np.array(sums)
+
+
+def bootstrap_intervals(final_kyoku_df, final_hanchan_df, resamples=RESAMPLES, confidence=CONFIDENCE, seed=0):
+    """
+    按半庄有放回重抽样resamples次，返回各指标的百分位置信区间（DataFrame，列为 置信下限、置信上限）
+
+    同一半庄的小局一起抽取，保留半庄内小局之间的相关性。每次重抽样只记录各半庄被抽中的次数，
+    统计量为 次数矩阵 @ 半庄汇总矩阵，分批计算；final_hanchan_df需含pt变动（compute_statistics的结果）。
+    """
+    columns = ['置信下限', '置信上限']
+    hanchan_count = len(final_hanchan_df)
+    if hanchan_count < 2 or resamples <= 0:
+        return pd.DataFrame(columns=columns, dtype=float)
+    names, numerator, denominator, sums = hanchan_totals(final_kyoku_df, final_hanchan_df)
+    totals = np.hstack([numerator, denominator[:, ~sums]]).astype(np.float32)
+    metric_count = len(names)
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, min(resamples, BATCH_BYTES // (hanchan_count * 4)))
+    estimates = np.empty((resamples, metric_count))
+    for start in range(0, resamples, batch):
+        size = min(batch, resamples - start)
+        # 逐行bincount得到 size x 半庄数 的抽中次数矩阵（每行的计数数组可留在缓存中，比整批一次bincount快）
+        picks = rng.integers(0, hanchan_count, size=(size, hanchan_count), dtype=np.int32)
+        counts = np.empty((size, hanchan_count), dtype=np.float32)
+        for i, row in enumerate(picks):
+            counts[i] = np.bincount(row, minlength=hanchan_count)
+        resampled = (counts @ totals).astype(float)
+        values = resampled[:, :metric_count]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values[:, ~sums] /= resampled[:, metric_count:]
+        estimates[start:start + size] = values
+
+    alpha = (1 - confidence) / 2
+    estimates[~np.isfinite(estimates)] = np.nan
+    valid = ~np.isnan(estimates).all(axis=0)
+    bounds = np.full((metric_count, 2), np.nan)
+    if valid.any():
+        bounds[valid] = np.nanquantile(estimates[:, valid], [alpha, 1 - alpha], axis=0).T
+    return pd.DataFrame(bounds, index=names, columns=columns)
+
+
+def format_interval(low, high, digits=4):
+    """html报告中的区间文字，缺失时为空"""
+    if pd.isna(low) or pd.isna(high):
+        return ''
+    return f'{round(float(low), digits)} ~ {round(float(high), digits)}'
@@ -0,0 +1,139 @@
+"""运行记录：分阶段统计耗时、计数与内存峰值，保存为JSON并在运行结束时打印摘要"""
+
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+_NULL = nullcontext()
+
+
+class RunProfile:
+    """
+    分阶段计时与计数
+
+    span按嵌套路径（如"分析牌谱/解码JSON"）累计调用次数、耗时与CPU时间，只应在主线程中使用；
+    count累计计数器，可在下载线程中调用。未启用时两者都不做任何事。
+    memory=True时用tracemalloc记录每个阶段相对开始时的内存峰值（会明显变慢）；
+    cprofile=True时span(..., profile=True)的阶段另存一份cProfile统计。
+    """
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, enabled=False, memory=False, cprofile=False, output_dir='paipu_data/profile'):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.cprofile = enabled and cprofile
+        self.output_dir = Path(output_dir)
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.profile_files = []
+        self._stack = []  # 每层为 [路径, 子阶段中观察到的内存峰值, 开始时的内存]
+        self._lock = threading.Lock()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name, profile=False):
+        """计时一个阶段：with profile.span('解码JSON'): ..."""
+        if not self.enabled:
+            return _NULL
+        return self._span(name, profile)
+
+    @contextmanager
+    def _span(self, name, profile):
+        path = f"{self._stack[-1][0]}/{name}" if self._stack else name
+        frame = [path, 0, 0]
+        entry = self.spans.setdefault(path, {'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0})  # 按开始顺序排列
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # reset_peak会清掉外层阶段的峰值，先记下来
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame[2] = current
+        self._stack.append(frame)
+        profiler = cProfile.Profile() if profile and self.cprofile else None
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            self._stack.pop()
+            entry['calls'] += 1
+            entry['seconds'] += elapsed
+            entry['cpu_seconds'] += cpu
+            if self.memory:
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                entry['peak_bytes'] = max(entry.get('peak_bytes', 0), peak - frame[2])
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], peak)
+            if profiler:
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                profile_path = self.output_dir / f"{self.started_at:%Y%m%d_%H%M%S}_{path.replace('/', '_')}.prof"
+                profiler.dump_stats(profile_path)
+                self.profile_files.append(str(profile_path))
+
+    def count(self, name, n=1):
+        """累加计数器"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self):
+        return {
+            'time': self.started_at.isoformat(timespec='seconds'),
+            'total_seconds': round(time.perf_counter() - self.started, 6),
+            'spans': {path: {key: round(value, 6) if isinstance(value, float) else value for key, value in entry.items()}
+                      for path, entry in self.spans.items()},
+            'counters': dict(self.counters),
+            'cprofile': self.profile_files,
+        }
+
+    def save(self, path=None):
+        """保存为JSON，返回文件路径"""
+        path = Path(path) if path else self.output_dir / f"{self.started_at:%Y%m%d_%H%M%S}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def summary(self):
+        """打印各阶段耗时（按开始顺序、按层级缩进）与计数器"""
+        total = time.perf_counter() - self.started
+        print(f"\n运行记录（总用时 {total:.2f} 秒）:")
+        for path, entry in self.spans.items():
+            depth = path.count('/')
+            name = '  ' * depth + path.rsplit('/', 1)[-1]
+            line = f"  {name:<24} {entry['seconds']:>9.3f} 秒 {entry['seconds'] / total:>6.1%}  ×{entry['calls']}"
+            if 'peak_bytes' in entry:
+                line += f"  峰值 {entry['peak_bytes'] / 2**20:.1f} MB"
+            print(line)
+        for name, value in self.counters.items():
+            print(f"  {name}: {value}")
+
+    def finish(self):
+        """运行结束：保存并打印摘要（未启用时不做任何事）"""
+        if not self.enabled:
+            return None
+        path = self.save()
+        self.summary()
+        print(f"运行记录已保存到 {path}")
+        return path
+
+
+# 全局运行记录，由主程序按config.toml的[profile]启用
+PROFILE = RunProfile()
@@ -0,0 +1,190 @@
+"""顺位预测：由小局开局时的点数状况估计各终局顺位的概率与期望pt，得到每个小局的期望pt变动"""
+
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+import numpy as np  # pip install numpy
+import pandas as pd  # pip install pandas
+from 局况统计 import kyoku_states, neighbour_gaps, GAP_EDGES
+
+MODEL_VERSION = 1
+MODEL_PATH = Path('paipu_data') / 'cache' / 'placement_model.json'
+MAX_REMAINING = 7  # 剩余局数超过该值（不会出现）或进入延长战时分别按7、0计
+PRIOR_WEIGHT = 10  # 样本少的格向同一 (人数, 剩余局数, 开局顺位) 的分布收缩，相当于该数量的虚拟样本
+# 状态维度：人数(三麻/四麻)、剩余局数、开局顺位、落后上一名的点差区间、领先下一名的点差区间（最后一档为没有该名次）
+STATE_SHAPE = (2, MAX_REMAINING + 1, 4, len(GAP_EDGES) + 2, len(GAP_EDGES) + 2)
+
+
+def _gap_bins(gaps):
+    bins = np.searchsorted(GAP_EDGES, gaps, side='right')
+    return np.where(np.isinf(gaps), len(GAP_EDGES) + 1, bins)
+
+
+def state_codes(final_kyoku_df, states=None):
+    """
+    各小局开局时的状态编号与人数，返回 (状态编号, 人数)；states为已算好的局况统计.kyoku_states结果
+
+    剩余局数按牌桌（東風战/東南战）与局数计算，不含本场；西入、南入等延长战按剩余0局计。
+    """
+    kyoku, honba, scores = kyoku_states(final_kyoku_df) if states is None else states
+    seats = final_kyoku_df['玩家位置'].to_numpy(dtype=np.int64)
+    rank, behind, ahead = neighbour_gaps(scores, seats)
+    # 牌桌种类很少，先对去重后的牌桌判断
+    table_codes, tables = pd.factorize(final_kyoku_df['牌桌'].astype(str))
+    players = np.array([3 if table.startswith('三') else 4 for table in tables], dtype=np.int64)[table_codes]
+    rounds = np.array([1 if '東' in table else 2 for table in tables], dtype=np.int64)[table_codes]
+    position = kyoku // 4 * players + kyoku % 4
+    remaining = np.clip(rounds * players - 1 - position, 0, MAX_REMAINING)
+    codes = np.ravel_multi_index((players - 3, remaining, rank - 1, _gap_bins(behind), _gap_bins(ahead)), STATE_SHAPE)
+    return codes, players
+
+
+def final_ranks(final_kyoku_df, final_hanchan_df):
+    """各小局所在半庄中该座位的终局顺位（按牌谱与玩家位置对应），找不到时为0"""
+    seat_count = 4
+    refs = pd.Index(final_hanchan_df['牌谱'].astype(str).unique())
+    hanchan_keys = refs.get_indexer(final_hanchan_df['牌谱'].astype(str)) * seat_count \
+        + final_hanchan_df['玩家位置'].to_numpy(dtype=np.int64)
+    kyoku_refs = refs.get_indexer(final_kyoku_df['牌谱'].astype(str))
+    kyoku_keys = np.where(kyoku_refs >= 0, kyoku_refs * seat_count + final_kyoku_df['玩家位置'].to_numpy(dtype=np.int64), -1)
+    position = pd.Index(hanchan_keys).get_indexer(kyoku_keys)
+    ranks = final_hanchan_df['rank'].to_numpy(dtype=np.int64)
+    return np.where((position >= 0) & (kyoku_keys >= 0), ranks[position], 0)
+
+
+def pt_table(final_kyoku_df, pt_rule):
+    """按calculate_pt_change的规则得到各小局终局为1-4位时的pt（同一牌桌与段位只计算一次），返回 小局数 x 4"""
+    keys = final_kyoku_df['牌桌'].astype(str) + '\t' + final_kyoku_df['玩家段位'].astype(str)
+    codes, uniques = pd.factorize(keys)
+    table = np.array([[pt_rule({'牌桌': table, '玩家段位': dan, 'rank': rank}) for rank in range(1, 5)]
+                      for table, dan in (key.split('\t') for key in uniques)], dtype=float).reshape(-1, 4)
+    return table[codes]
+
+
+class PlacementModel:
+    """
+    顺位预测模型：按开局状态统计的终局顺位频数表（STATE_SHAPE x 4）
+
+    fit可用任意多个座位的小局数据（如牌谱查询缓存中的全部座位），probabilities以状态编号查表，不逐行计算。
+    """
+
+    def __init__(self, counts=None):
+        self.counts = np.zeros(STATE_SHAPE + (4,), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self._update_probabilities()
+
+    def _update_probabilities(self):
+        """频数少的格向粗分组（人数、剩余局数、开局顺位）的分布收缩；粗分组也没有样本时各顺位等概率"""
+        counts = self.counts.astype(float)
+        coarse = counts.sum(axis=(3, 4), keepdims=True)
+        uniform = np.zeros_like(coarse)
+        uniform[0, ..., :3] = 1 / 3
+        uniform[1, ..., :4] = 1 / 4
+        coarse_total = coarse.sum(axis=-1, keepdims=True)
+        prior = np.where(coarse_total > 0, coarse / np.maximum(coarse_total, 1), uniform)
+        total = counts.sum(axis=-1, keepdims=True)
+        self.probability_table = ((counts + PRIOR_WEIGHT * prior) / (total + PRIOR_WEIGHT)).reshape(-1, 4)
+
+    def fit(self, final_kyoku_df, final_hanchan_df):
+        """按小局开局状态与对应半庄的终局顺位累计频数，返回使用的小局数"""
+        codes, _ = state_codes(final_kyoku_df)
+        ranks = final_ranks(final_kyoku_df, final_hanchan_df)
+        valid = ranks > 0
+        cells = codes[valid] * 4 + ranks[valid] - 1
+        self.counts = np.bincount(cells, minlength=self.counts.size).reshape(self.counts.shape)
+        self._update_probabilities()
+        return int(valid.sum())
+
+    def probabilities(self, final_kyoku_df, states=None):
+        """各小局开局时终局为1-4位的概率，返回 小局数 x 4"""
+        codes, _ = state_codes(final_kyoku_df, states)
+        return self.probability_table[codes]
+
+    def expected_pt(self, final_kyoku_df, pt_rule):
+        """各小局开局时的期望pt"""
+        return (self.probabilities(final_kyoku_df) * pt_table(final_kyoku_df, pt_rule)).sum(axis=1)
+
+    def expected_pt_changes(self, final_kyoku_df, final_hanchan_df, pt_rule):
+        """
+        各小局的期望pt变动：下一局开局时的期望pt减去本局开局时的期望pt
+
+        半庄最后一局用终局顺位的实际pt代替下一局的期望pt，因此一个半庄各局之和为 实际pt - 首局期望pt。
+        小局按半庄、局数、本场排序后计算，返回值与final_kyoku_df的行顺序一致；找不到终局顺位的半庄最后一局为NaN。
+        """
+        if final_kyoku_df.empty:
+            return pd.Series(dtype=float, index=final_kyoku_df.index)
+        states = kyoku_states(final_kyoku_df)
+        points = pt_table(final_kyoku_df, pt_rule)
+        expected = (self.probabilities(final_kyoku_df, states) * points).sum(axis=1)
+        ranks = final_ranks(final_kyoku_df, final_hanchan_df)
+        actual = np.where(ranks > 0, points[np.arange(len(points)), np.maximum(ranks, 1) - 1], np.nan)
+
+        kyoku, honba, _ = states
+        hanchan = pd.factorize(final_kyoku_df['牌谱'].astype(str))[0] * 4 + final_kyoku_df['玩家位置'].to_numpy(dtype=np.int64)
+        order = np.lexsort((honba, kyoku, hanchan))
+        following = np.empty(len(order))
+        following[:-1] = expected[order[1:]]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = hanchan[order[1:]] != hanchan[order[:-1]]
+        following[last] = actual[order][last]
+        changes = np.empty(len(order))
+        changes[order] = following - expected[order]
+        return pd.Series(changes, index=final_kyoku_df.index)
+
+    def save_model(self, path, **extra):
+        """保存频数表（JSON）"""
+        params = {
+            'version': MODEL_VERSION,
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'shape': list(self.counts.shape),
+            'counts': self.counts.ravel().tolist(),
+        }
+        params.update(extra)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False)
+
+    @classmethod
+    def load_model(cls, path):
+        """加载save_model保存的频数表"""
+        with open(path, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+        if params.get('version') != MODEL_VERSION or tuple(params.get('shape', ())) != STATE_SHAPE + (4,):
+            raise ValueError(f"不支持的顺位预测模型版本: {params.get('version')}")
+        return cls(np.array(params['counts'], dtype=np.int64).reshape(params['shape']))
+
+
+def load_or_fit(path, final_kyoku_df, final_hanchan_df):
+    """path的模型文件存在时加载，否则用传入的小局、半庄数据拟合"""
+    if path and Path(path).exists():
+        try:
+            return PlacementModel.load_model(path)
+        except ValueError as e:
+            print(f"顺位预测模型加载失败，改用当前牌谱拟合：{str(e)}")
+    model = PlacementModel()
+    model.fit(final_kyoku_df, final_hanchan_df)
+    return model
+
+
+def main(argv=None):
+    from 天凤牌谱数据统计 import resource_path, load_config
+    from 牌谱查询 import PaipuArchive
+    parser = argparse.ArgumentParser(description='用牌谱查询缓存中全部牌谱的全部座位拟合顺位预测模型')
+    parser.add_argument('--output', default=str(MODEL_PATH), help='模型文件')
+    parser.add_argument('--table', nargs='*', help='只用这些牌桌的牌谱，如 四鳳南喰赤')
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    archive = PaipuArchive.open(config=config)
+    kyoku_df, hanchan_df = archive.select(table=args.table or None)
+    if kyoku_df.empty:
+        print("缓存中没有牌谱，请先下载牌谱或运行 牌谱查询.py update")
+        return
+    model = PlacementModel()
+    samples = model.fit(kyoku_df, hanchan_df)
+    model.save_model(resource_path(args.output), n_samples=samples, tables=args.table or [])
+    print(f"已用 {hanchan_df['牌谱'].nunique()} 个牌谱的 {samples} 个小局拟合顺位预测模型：{args.output}")
+
+
+if __name__ == "__main__":
+    main()